@@ -0,0 +1,189 @@
+import asyncio
+import json
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from api.sql_alchemy_models import (
+    DATABASE_URL, get_cached_recommendations, get_recommendation_inputs, parse_recommendations, recommendation_chain,
+    recommendation_fingerprint, set_sqlite_pragmas, store_recommendations
+)
+
+# The API reads through aiosqlite so a worker is not blocked while SQLite does I/O.
+# The scrapers keep using the sync engine and helpers in sql_alchemy_models.
+ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=10, max_overflow=20, connect_args={"timeout": 30})
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+else:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=10, max_overflow=20, pool_pre_ping=True)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+async def run_query(session, function, *args, **kwargs):
+    """
+    Run one of the sync helpers from sql_alchemy_models on an async session.
+    Args:
+        session (AsyncSession): The request's async session.
+        function: A helper that accepts a session keyword, e.g. get_season_averages.
+        *args, **kwargs: Arguments for the helper.
+    Returns:
+        Whatever the helper returns.
+    """
+    return await session.run_sync(lambda sync_session: function(*args, session=sync_session, **kwargs))
+
+
+class RecommendationError(Exception):
+    """ The model call failed or gave no answer; the endpoints answer 502 """
+
+
+class Generation:
+    """
+    One model call for a fingerprint, shared by every request for it while it runs: blocking
+    requests await task, streaming ones follow() the answer's summary text as the model writes it.
+    """
+
+    def __init__(self, inputs, fingerprint, chain=None):
+        # The summary so far, in the pieces it grew by
+        self.chunks = []
+        self.summary = ""
+        self.finished = False
+        self.changed = asyncio.Condition()
+        self.task = asyncio.ensure_future(self.run(inputs, fingerprint, chain))
+
+    async def run(self, inputs, fingerprint, chain):
+        try:
+            return await generate_recommendations(inputs["player_name"], inputs, fingerprint, chain, on_partial=self.add_partial)
+        finally:
+            async with self.changed:
+                self.finished = True
+                self.changed.notify_all()
+
+    async def add_partial(self, answer):
+        """ Take the answer parsed so far and keep what it added to the summary """
+        summary = (answer.get("summary") or "") if isinstance(answer, dict) else ""
+        if len(summary) <= len(self.summary) or not summary.startswith(self.summary):
+            return
+        async with self.changed:
+            self.chunks.append(summary[len(self.summary):])
+            self.summary = summary
+            self.changed.notify_all()
+
+    async def follow(self):
+        """
+        Yields:
+            str: The summary text as it grows, from the start, until the call ends.
+                 Await task afterwards for the result (or the error).
+        """
+        sent = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.chunks) > sent or self.finished)
+                chunks, finished = self.chunks[sent:], self.finished
+            sent += len(chunks)
+            for chunk in chunks:
+                yield chunk
+            if finished:
+                return
+
+
+# Recommendation fingerprint -> the Generation in progress, so concurrent requests share one LLM call
+recommendations_in_flight = {}
+
+
+def start_generation(inputs, fingerprint):
+    """ The Generation in flight for fingerprint, started if there is none """
+    generation = recommendations_in_flight.get(fingerprint)
+    if generation is None:
+        generation = Generation(inputs, fingerprint)
+        recommendations_in_flight[fingerprint] = generation
+        generation.task.add_done_callback(lambda _: recommendations_in_flight.pop(fingerprint, None))
+    return generation
+
+
+async def get_ai_recommendations_async(player_name):
+    """
+    get_ai_recommendations without holding a worker thread for the LLM round-trip.
+    A stored answer for the same prompt inputs is returned straight away, and concurrent
+    requests for the same inputs (streaming ones too) wait on a single model call.
+    Returns:
+        dict: The recommendations, or None if no player matches player_name (and nothing is generated).
+    """
+    async with AsyncSessionLocal() as session:
+        inputs = await run_query(session, get_recommendation_inputs, player_name)
+        if inputs is None:
+            return None
+        fingerprint = recommendation_fingerprint(inputs)
+        result = await run_query(session, get_cached_recommendations, fingerprint)
+    if result is not None:
+        return result
+    # A client disconnecting must not cancel the call the other requests are waiting on
+    return await asyncio.shield(start_generation(inputs, fingerprint).task)
+
+
+async def generate_recommendations(player_name, inputs, fingerprint, chain=None, on_partial=None):
+    """
+    Ask the model and store the parsed answer under its fingerprint.
+    Raises RecommendationError, and stores nothing, when the call fails or returns no answer.
+    Args:
+        chain (Runnable, optional): Stand-in for recommendation_chain(), e.g. a fake model.
+        on_partial (optional): Coroutine function called with the answer parsed so far each time it grows.
+    """
+    answer = None
+    try:
+        # recommendation_chain streams the whole answer parsed so far each time, so the last one is complete
+        async for answer in (chain or recommendation_chain()).astream(inputs):
+            if on_partial is not None:
+                await on_partial(answer)
+    except Exception as e:
+        raise RecommendationError(f"the model call failed: {e}") from e
+    if answer is None:
+        # Nothing to store: an empty answer would be served for these inputs from then on
+        raise RecommendationError("the model returned no answer")
+    result = parse_recommendations(answer, inputs["drills"])
+    # The prompt inputs were read in their own session, so no connection was held during the call
+    async with AsyncSessionLocal() as session:
+        await run_query(session, store_recommendations, fingerprint, player_name, result)
+    return result
+
+
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_ai_recommendations(player_name):
+    """
+    get_ai_recommendations_async as Server-Sent Events: a "token" event per piece of the performance
+    summary as the model writes it, then a "recommendations" event with the same payload the blocking endpoint
+    returns. A stored answer for the same inputs is sent as a single token event; an answer being
+    generated for another request is followed rather than requested again.
+    Yields:
+        str: Encoded events.
+    """
+    # Sent before any work so the client gets its first byte without waiting on the database
+    yield ": generating\n\n"
+    async with AsyncSessionLocal() as session:
+        inputs = await run_query(session, get_recommendation_inputs, player_name)
+        if inputs is None:
+            # The endpoint answers 404 before streaming; this is for a player removed since
+            yield server_sent_event("error", {"detail": "Player not found"})
+            return
+        fingerprint = recommendation_fingerprint(inputs)
+        result = await run_query(session, get_cached_recommendations, fingerprint)
+    if result is not None:
+        yield server_sent_event("token", result["recommendations"])
+        yield server_sent_event("recommendations", result)
+        return
+
+    # Joins the call another request started for the same inputs, from its first chunk
+    generation = start_generation(inputs, fingerprint)
+    try:
+        async for chunk in generation.follow():
+            yield server_sent_event("token", chunk)
+        result = await asyncio.shield(generation.task)
+    except Exception as e:
+        yield server_sent_event("error", {"detail": str(e)})
+        return
+    yield server_sent_event("recommendations", result)
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+from api.async_db import run_query
+from api.sql_alchemy_models import get_data_version
+
+# The read endpoints only change when the scrapers ingest a game or a roster, and every
+# ingest bumps data_version (see api.migrations). Responses are cached per data version,
+# so an ingest invalidates everything at once without the scraper talking to the API.
+# Anything else (the drills) is picked up when its entry expires, and ETags follow the body.
+
+
+class LRUCache:
+    """
+    In-process backend: least recently used entries are evicted past maxsize and entries
+    expire after ttl seconds. Any object with the same get/set methods (e.g. a wrapper
+    around Redis, to share the cache between uvicorn workers) can be used instead.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+def normalize_name(player_name):
+    """ "  gregory  SPURLOCK" and "Gregory Spurlock" share a cache entry """
+    return " ".join(str(player_name or "").lower().split())
+
+
+class ResponseCache:
+    """
+    Serialized JSON responses keyed by endpoint, request parameters and data version,
+    with ETags so clients that already have the current payload get a 304.
+    """
+
+    def __init__(self, backend=None, version_check_interval=2.0):
+        """
+        Args:
+            backend (optional): Storage with get(key) and set(key, value). Defaults to an LRUCache.
+            version_check_interval (float): Seconds to reuse the last data version read before
+                                            reading it again, so a cache hit rarely needs the database.
+        """
+        self.backend = backend if backend is not None else LRUCache()
+        self.version_check_interval = version_check_interval
+        self.version = None
+        self.version_checked = 0.0
+
+    async def data_version(self, session):
+        now = time.monotonic()
+        if self.version is None or now - self.version_checked > self.version_check_interval:
+            self.version = await run_query(session, get_data_version)
+            self.version_checked = now
+        return self.version
+
+    async def respond(self, request, session, key, load):
+        """
+        Serve a read endpoint through the cache.
+        Args:
+            request (Request): The incoming request, for its If-None-Match header.
+            session (AsyncSession): The request's session, used to read the data version.
+            key (tuple): The endpoint and its normalized parameters.
+            load: Coroutine function producing the payload on a miss. An HTTPException it
+                  raises (e.g. a 404) is passed through and not cached.
+        Returns:
+            Response: The JSON payload, or an empty 304 when the client already has this body.
+        """
+        version = await self.data_version(session)
+        digest = hashlib.sha1(json.dumps([version, *key], default=str).encode()).hexdigest()
+        body = self.backend.get(digest)
+        if body is None:
+            body = json.dumps(jsonable_encoder(await load())).encode()
+            self.backend.set(digest, body)
+        # Of the body rather than the key, so data that changes without a version bump (the drills)
+        # gets a new ETag once its cache entry expires
+        etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(etag, request.headers.get("if-none-match", "")):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def etag_matches(etag, if_none_match):
+    """ Whether an If-None-Match header lists etag (weak comparison, as for GET and HEAD) or is "*" """
+    tokens = [token.strip() for token in if_none_match.split(",")]
+    return "*" in tokens or etag.removeprefix("W/") in [token.removeprefix("W/") for token in tokens]
+
+
+response_cache = ResponseCache()
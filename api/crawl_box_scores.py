@@ -0,0 +1,158 @@
+"""
+Scrape the box scores of every scheduled game that has not been ingested yet, concurrently
+over one pooled HTTP client, with one shared browser as the fallback (see api.fetch).
+
+    python -m api.crawl_box_scores --concurrency 4
+    python -m api.crawl_box_scores --game-id 3 --game-id 4
+    python -m api.crawl_box_scores --base-url http://127.0.0.1:8765    # benchmarks.fixture_server
+    python -m api.crawl_box_scores --backend browser
+
+The games and their pages come from schedule.box_score_link; rows are written to the database
+the API reads (BBTRACKER_DATABASE_URL) in one transaction, and recommendations are pre-generated
+once at the end.
+"""
+import argparse
+import asyncio
+import sqlite3
+import time
+from urllib.parse import urljoin
+
+from api.fetch import open_fetcher
+from api.page_cache import open_page_cache
+from api.pregenerate_recommendations import pregenerate_recommendations
+from api.ingest import box_score_hash
+from api.scrape_box_score import DATABASE_PATH, box_score_ready, parse_box_score, save_box_scores
+from api.sql_alchemy_models import create_schema
+
+BASE_URL = 'https://athletics.claflin.edu'
+
+
+def scheduled_games(db_path=DATABASE_PATH, game_ids=None, include_ingested=False):
+    """
+    (game_id, box_score_link, box_score_hash) for the games to scrape: the given game_ids that
+    have a box score link, or else every game with a box score link and no box_score rows yet
+    (or with them too, when include_ingested).
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    if game_ids:
+        c.execute(f'''
+            SELECT game_id, box_score_link, box_score_hash FROM schedule
+            WHERE box_score_link IS NOT NULL AND box_score_link != ''
+              AND game_id IN ({', '.join('?' * len(game_ids))})
+            ORDER BY game_id
+        ''', list(game_ids))
+    else:
+        c.execute(f'''
+            SELECT game_id, box_score_link, box_score_hash FROM schedule
+            WHERE box_score_link IS NOT NULL AND box_score_link != ''
+              {'' if include_ingested else 'AND game_id NOT IN (SELECT game_id FROM box_score)'}
+            ORDER BY game_id
+        ''')
+    games = c.fetchall()
+    conn.close()
+    return games
+
+
+async def crawl_game(game_id, link, stored_hash, fetcher, semaphore, base_url=BASE_URL):
+    """
+    Fetch and parse one game. A page that parses to the box score already stored (stored_hash)
+    is reported "unchanged" and not returned for storing.
+    Returns:
+        tuple: {"game_id", "status" ("ok", "unchanged" or "failed"), "via" ("http" or "browser"),
+               "rows", "fetch_seconds", "parse_seconds", "error"}, and the parsed tables to store or None.
+    """
+    url = urljoin(base_url, link)
+    result = {"game_id": game_id, "status": "ok", "via": None, "rows": 0, "fetch_seconds": 0.0, "parse_seconds": 0.0, "error": None}
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            content = await fetcher.fetch(url, ready=box_score_ready)
+        except Exception as e:
+            result.update(status="failed", error=str(e))
+            return result, None
+        finally:
+            result["fetch_seconds"] = time.perf_counter() - start
+            result["via"] = fetcher.served_by.get(url)
+    start = time.perf_counter()
+    tables = None
+    try:
+        tables = parse_box_score(content)
+        result["rows"] = sum(len(rows) for _, rows in tables)
+        if box_score_hash(tables) == stored_hash:
+            result["status"] = "unchanged"
+            tables = None
+    except Exception as e:
+        result.update(status="failed", error=str(e))
+    result["parse_seconds"] = time.perf_counter() - start
+    return result, tables
+
+
+async def crawl_box_scores(games, concurrency=4, base_url=BASE_URL, db_path=DATABASE_PATH, pregenerate=True, verbose=True, fetcher=None, backend='auto', cache=None):
+    """
+    Scrape games concurrently, then store every changed one in a single transaction.
+    Args:
+        games (list): (game_id, box_score_link, box_score_hash) tuples, e.g. from scheduled_games().
+        concurrency (int): Games in flight at once.
+        base_url (str): Site the box score links are relative to.
+        pregenerate (bool): Pre-generate recommendations once all the games are in.
+        fetcher (Fetcher, optional): Shared with the caller, e.g. the one that fetched the schedule.
+        backend (str): Backend of the Fetcher opened when none is given ("auto", "http" or "browser").
+        cache (PageCache, optional): Page cache of the Fetcher opened when none is given.
+    Returns:
+        list: One crawl_game result per game.
+    """
+    if not games:
+        return []
+    if fetcher is None:
+        async with open_fetcher(backend, concurrency, cache) as fetcher:
+            return await crawl_box_scores(games, concurrency, base_url, db_path, pregenerate, verbose, fetcher)
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    crawled = await asyncio.gather(*(crawl_game(game_id, link, stored_hash, fetcher, semaphore, base_url) for game_id, link, stored_hash in games))
+    results = [result for result, _ in crawled]
+    changed = [(result["game_id"], tables) for result, tables in crawled if tables is not None]
+
+    store_start = time.perf_counter()
+    stats = {"rows": 0}
+    try:
+        stats = save_box_scores(changed, db_path)
+    except Exception as e:
+        for result, tables in crawled:
+            if tables is not None:
+                result.update(status="failed", error=f"not stored: {e}")
+    store_seconds = time.perf_counter() - store_start
+    elapsed = time.perf_counter() - start
+
+    if verbose:
+        print(f"{'game':>6}{'status':>11}{'via':>9}{'rows':>6}{'fetch s':>10}{'parse s':>10}")
+        for result in results:
+            print(f"{result['game_id']:>6}{result['status']:>11}{result['via'] or '-':>9}{result['rows']:>6}{result['fetch_seconds']:>10.2f}{result['parse_seconds']:>10.2f}  {result['error'] or ''}")
+        failed = sum(result["status"] == "failed" for result in results)
+        serial = sum(result["fetch_seconds"] + result["parse_seconds"] for result in results)
+        print(f"stored {stats['rows']} rows of {len(changed)} games in {store_seconds:.2f}s")
+        print(f"{len(results)} games ({failed} failed) in {elapsed:.2f}s; {serial:.2f}s of fetching and parsing at concurrency {concurrency}")
+
+    if pregenerate and any(result["status"] == "ok" for result in results):
+        await pregenerate_recommendations()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4, help="Pages fetching at once")
+    parser.add_argument("--backend", choices=["auto", "http", "browser"], default="auto", help="auto: HTTP, with the browser as fallback")
+    parser.add_argument("--game-id", type=int, action="append", help="Scrape this game (repeatable); default: every game not ingested yet")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the page cache (see api.page_cache)")
+    parser.add_argument("--no-pregenerate", action="store_true", help="Skip pre-generating recommendations afterwards")
+    args = parser.parse_args()
+
+    create_schema()
+    games = scheduled_games(game_ids=args.game_id)
+    cache = None if args.no_cache else open_page_cache()
+    asyncio.run(crawl_box_scores(games, args.concurrency, args.base_url, pregenerate=not args.no_pregenerate, backend=args.backend, cache=cache))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Page fetching for the scrapers. The Sidearm pages are server-rendered, so a plain HTTP GET
+usually returns everything the parsers read; headless Chromium is only started for a page
+whose HTML turns out not to be ready without JavaScript, or when a screenshot is wanted.
+With a PageCache (see api.page_cache) pages are revalidated rather than downloaded again.
+
+    async with open_fetcher(concurrency=4, cache=open_page_cache()) as fetcher:
+        content = await fetcher.fetch(url, ready=box_score_ready)
+"""
+import asyncio
+import os
+from urllib.parse import urlparse
+
+import httpx
+
+from api.page_cache import open_page_cache
+
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36 bbtracker'
+
+# Only the HTML is parsed, so browser pages are not made to download these
+SKIPPED_RESOURCES = {'image', 'media', 'font', 'stylesheet'}
+
+
+class HttpFetcher:
+    """ GETs over one pooled httpx client, so requests to the site reuse keep-alive connections """
+
+    def __init__(self, concurrency=4, timeout=30.0):
+        self.client = httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT},
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            timeout=timeout,
+            follow_redirects=True,
+        )
+
+    async def fetch(self, url, cached=None):
+        """
+        Args:
+            url (str): The page.
+            cached (dict, optional): A PageCache entry for url, to revalidate instead of downloading.
+        Returns:
+            httpx.Response: 304 Not Modified when the cached page is still current.
+        """
+        headers = {}
+        if cached and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+        response = await self.client.get(url, headers=headers)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class BrowserFetcher:
+    """
+    One headless Chromium with a pool of concurrency pages. Playwright is imported and the
+    browser launched on the first fetch, so a run that never needs it never pays for it.
+    """
+
+    def __init__(self, concurrency=4):
+        self.concurrency = concurrency
+        self.playwright = None
+        self.browser = None
+        self.pages = None
+        self.lock = asyncio.Lock()
+
+    async def start(self):
+        from playwright.async_api import async_playwright
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(headless=True)
+        context = await self.browser.new_context(user_agent=USER_AGENT)
+        await context.route('**/*', lambda route: route.abort() if route.request.resource_type in SKIPPED_RESOURCES else route.continue_())
+        self.pages = asyncio.Queue()
+        for _ in range(self.concurrency):
+            self.pages.put_nowait(await context.new_page())
+
+    async def fetch(self, url, screenshot=None):
+        """
+        Args:
+            screenshot (str, optional): Also save a full-page screenshot to this path.
+        """
+        async with self.lock:
+            if self.browser is None:
+                await self.start()
+        page = await self.pages.get()
+        try:
+            await page.goto(url, wait_until='domcontentloaded')
+            if screenshot:
+                await page.screenshot(path=screenshot, full_page=True)
+            return await page.content()
+        finally:
+            self.pages.put_nowait(page)
+
+    async def close(self):
+        if self.browser is not None:
+            await self.browser.close()
+            await self.playwright.stop()
+
+
+class Fetcher:
+    """
+    Fetch over HTTP and fall back to the browser when the response fails or, given a ready check,
+    does not contain what the caller is going to parse.
+    Args:
+        backend (str): "auto" (HTTP, browser as fallback), "http" or "browser".
+        concurrency (int): Connections, and browser pages, open at once.
+        cache (PageCache, optional): Store fetched pages and revalidate them on later runs. Closed with the fetcher.
+    """
+
+    def __init__(self, backend='auto', concurrency=4, cache=None):
+        self.backend = backend
+        self.http = HttpFetcher(concurrency) if backend in ('auto', 'http') else None
+        self.browser = BrowserFetcher(concurrency) if backend in ('auto', 'browser') else None
+        self.cache = cache
+        # url -> what served it ("http", "cache" or "browser"), for reporting
+        self.served_by = {}
+
+    async def fetch(self, url, ready=None, screenshot=None):
+        """
+        Args:
+            url (str): The page.
+            ready (optional): Predicate on the HTML; False sends the page to the browser.
+            screenshot (str, optional): Save a screenshot too; needs the browser.
+        Returns:
+            str: The page's HTML.
+        """
+        if screenshot and self.browser is None:
+            raise ValueError("Screenshots need the browser backend")
+        cached = self.cache.latest(url) if self.cache is not None and not screenshot else None
+        if cached and self.cache.fresh(cached):
+            self.served_by[url] = 'cache'
+            return self.cache.read(cached)
+        if self.http is not None and not screenshot:
+            try:
+                response = await self.http.fetch(url, cached)
+                if response.status_code == 304:
+                    # Still current: record that it was seen today, with the validators the site sent
+                    content = self.cache.read(cached)
+                    self.cache.store(url, content, response.headers.get('ETag', cached['etag']), response.headers.get('Last-Modified', cached['last_modified']))
+                    self.served_by[url] = 'cache'
+                    return content
+                content = response.text
+                if ready is None or ready(content):
+                    if self.cache is not None:
+                        self.cache.store(url, content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                    self.served_by[url] = 'http'
+                    return content
+                if self.browser is None:
+                    raise ValueError(f"{url} is not ready without JavaScript")
+            except httpx.HTTPError:
+                if self.browser is None:
+                    raise
+        content = await self.browser.fetch(url, screenshot=screenshot)
+        if self.cache is not None:
+            self.cache.store(url, content)
+        self.served_by[url] = 'browser'
+        return content
+
+    async def close(self):
+        for fetcher in (self.http, self.browser):
+            if fetcher is not None:
+                await fetcher.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+def fixture_path(directory, url):
+    """ Where a page is saved under a fixtures directory: its URL path, as an .html file """
+    return os.path.join(directory, urlparse(url).path.strip('/') + '.html')
+
+
+class FixtureFetcher:
+    """
+    Serves saved pages (see fixture_path, and benchmarks.fixture_server --save) in place of the
+    site, for dry runs. Has the Fetcher interface; screenshots are not taken.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.served_by = {}
+
+    async def fetch(self, url, ready=None, screenshot=None):
+        path = fixture_path(self.directory, url)
+        try:
+            with open(path, encoding='utf-8') as f:
+                content = f.read()
+        except FileNotFoundError:
+            raise ValueError(f"No fixture for {url} at {path}")
+        self.served_by[url] = 'fixture'
+        return content
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+def open_fetcher(backend='auto', concurrency=4, cache=None):
+    """ A Fetcher to use as an async context manager, closing its client, browser and cache on exit """
+    return Fetcher(backend, concurrency, cache)
+
+
+async def fetch_page(url, ready=None, screenshot=None, backend='auto'):
+    """ Fetch a single page with a Fetcher of its own, through the default page cache """
+    async with open_fetcher(backend, concurrency=1, cache=open_page_cache()) as fetcher:
+        return await fetcher.fetch(url, ready=ready, screenshot=screenshot)
@@ -0,0 +1,101 @@
+"""
+Bulk box score ingest: any number of parsed games written in one transaction on one connection,
+with executemany and an upsert on the box_score primary key, so re-ingesting a corrected box
+score updates its rows in place instead of failing on them.
+
+    conn = connect()
+    stats = ingest_box_scores(conn, [(game_id, parse_box_score(content)), ...])
+
+Snapshots are not touched here; see api.scrape_box_score.save_box_scores.
+"""
+import hashlib
+import json
+import sqlite3
+
+from api.migrations import link_players, split_made_attempted
+from api.sql_alchemy_models import DATABASE_PATH
+
+# A box_score row as written: the key, the page's columns, then fg, pt3, ft and orb_drb as integer made/attempted pairs
+KEY_COLUMNS = ['game_id', 'team_name', 'player_number']
+PAGE_COLUMNS = ['player', 'gs', 'min', 'fg', 'pt3', 'ft', 'orb_drb', 'reb', 'pf', 'a', 'trn', 'blk', 'stl', 'pts']
+SPLIT_COLUMNS = ['fgm', 'fga', 'pt3m', 'pt3a', 'ftm', 'fta', 'orb', 'drb']
+BOX_SCORE_COLUMNS = KEY_COLUMNS + PAGE_COLUMNS + SPLIT_COLUMNS
+
+UPSERT_BOX_SCORE = f'''
+    INSERT INTO box_score ({', '.join(BOX_SCORE_COLUMNS)})
+    VALUES ({', '.join('?' * len(BOX_SCORE_COLUMNS))})
+    ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE SET
+        {', '.join(f'{column} = excluded.{column}' for column in PAGE_COLUMNS + SPLIT_COLUMNS)}
+'''
+
+
+def connect(db_path=DATABASE_PATH):
+    """ A connection to keep for a whole run of ingests """
+    conn = sqlite3.connect(db_path)
+    # Wait for the API's readers rather than failing the transaction
+    conn.execute('PRAGMA busy_timeout = 5000')
+    return conn
+
+
+def box_score_hash(tables):
+    """ Hash of a parsed box score, stored in schedule.box_score_hash to skip re-ingesting an unchanged page """
+    return hashlib.sha1(json.dumps(tables).encode()).hexdigest()
+
+
+def box_score_rows(game_id, tables):
+    """
+    Args:
+        game_id (int): The game.
+        tables (list): (team name, rows) as returned by parse_box_score, rows from player_number to pts.
+    Returns:
+        list: Tuples in BOX_SCORE_COLUMNS order.
+    """
+    return [
+        (game_id, team_name, *row, *[value for column in row[4:8] for value in split_made_attempted(column)])
+        for team_name, rows in tables
+        for row in rows
+    ]
+
+
+def ingest_box_scores(conn, games):
+    """
+    Upsert the box scores of several games in one transaction; nothing is written if any of it fails.
+    Rows a corrected box score no longer has (a player taken off it) are deleted, the games'
+    box_score_hash is updated and the rows are linked to the roster.
+    Args:
+        conn (sqlite3.Connection): See connect().
+        games (list): (game_id, tables) pairs, tables as returned by parse_box_score.
+    Returns:
+        dict: Numbers of "games" and "rows" written, rows "removed", and the game_ids that had
+              rows already ("replaced").
+    """
+    games = list(games)
+    if not games:
+        return {"games": 0, "rows": 0, "removed": 0, "replaced": []}
+    rows = [row for game_id, tables in games for row in box_score_rows(game_id, tables)]
+    game_ids = json.dumps([game_id for game_id, _ in games])
+    keys = json.dumps([row[:len(KEY_COLUMNS)] for row in rows])
+    with conn:
+        c = conn.cursor()
+        c.execute('SELECT DISTINCT game_id FROM box_score WHERE game_id IN (SELECT value FROM json_each(?))', [game_ids])
+        replaced = sorted(game_id for game_id, in c.fetchall())
+        # Compared in SQL so the key columns' affinity applies: a schema made by create_all stores
+        # player_number as an integer, which the parsed "0" would never equal in Python
+        c.execute(f'''
+            DELETE FROM box_score
+            WHERE game_id IN (SELECT value FROM json_each(?))
+              AND ({', '.join(KEY_COLUMNS)}) NOT IN (
+                  SELECT {', '.join(f"json_extract(value, '$[{index}]')" for index in range(len(KEY_COLUMNS)))} FROM json_each(?)
+              )
+        ''', [game_ids, keys])
+        removed = c.rowcount
+        c.executemany(UPSERT_BOX_SCORE, rows)
+        c.executemany('UPDATE schedule SET box_score_hash = ? WHERE game_id = ?', [(box_score_hash(tables), game_id) for game_id, tables in games])
+        # Relinking rebuilds player_search, so it is done once for the batch
+        link_players(c, games[0][0] if len(games) == 1 else None)
+    return {
+        "games": len(games),
+        "rows": len(rows),
+        "removed": removed,
+        "replaced": replaced,
+    }
@@ -1,9 +1,27 @@
 from fastapi import FastAPI, HTTPException
 from api.sql_alchemy_models import *
-from fastapi import FastAPI, HTTPException, Body
+from api.async_db import AsyncSessionLocal, RecommendationError, get_ai_recommendations_async, run_query, stream_ai_recommendations
+from api.cache import normalize_name, response_cache
+from fastapi import FastAPI, HTTPException, Body, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import conint
 from datetime import datetime
-app = FastAPI()
+import asyncio
+from contextlib import asynccontextmanager
+
+@asynccontextmanager
+async def lifespan(app):
+    """ Create and migrate the schema once at startup; importing the models no longer does it """
+    await asyncio.to_thread(init_database)
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+async def get_session():
+    """ One async session per request, closed once the response has been sent """
+    async with AsyncSessionLocal() as session:
+        yield session
 
 origins = [
     "http://localhost",
@@ -21,11 +39,11 @@ app.add_middleware(
 )
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"Hello": "World"}
 
 @app.get("/items/{item_id}")
-def read_item(item_id: int, q: str = None):
+async def read_item(item_id: int, q: str = None):
     """
     Retrieve an item by its ID and an optional query string.
     Args:
@@ -39,155 +57,222 @@ def read_item(item_id: int, q: str = None):
 
 
 @app.post("/player")
-def read_player(data: dict = Body(...)):
+async def read_player(request: Request, data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
-    print(player_name)
-    player = get_player(player_name)
-    if player is None:
-        raise HTTPException(status_code=404, detail="Player not found")
-    return player
+    async def load():
+        player = await run_query(session, get_player, player_name)
+        if player is None:
+            raise HTTPException(status_code=404, detail="Player not found")
+        return player
+    return await response_cache.respond(request, session, ("player", normalize_name(player_name)), load)
 
 @app.post("/player/box_scores")
-def read_box_scores(data: dict = Body(...)):
+async def read_box_scores(data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
-    box_scores = get_box_score_by_player(player_name)
+    box_scores = await run_query(session, get_box_score_by_player, player_name)
     if not box_scores:
         raise HTTPException(status_code=404, detail="Box scores not found")
     return box_scores
 
 @app.post("/player/last_x_games")
-def read_last_x_games(data: dict = Body(...)):
+async def read_last_x_games(data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
     x = data.get("x", 5)
-    last_games = get_last_x_games(player_name, x)
+    last_games = await run_query(session, get_last_x_games, player_name, x)
     if not last_games:
         raise HTTPException(status_code=404, detail="Games not found")
     return last_games
 
 @app.post("/player/rolling_averages")
-def read_rolling_averages(data: dict = Body(...)):
-    player_name = data.get("player_name")
-    x = data.get("x", 5)
-    rolling_averages = get_rolling_averages(player_name, x)
-    if rolling_averages is None:
-        raise HTTPException(status_code=404, detail="Averages not found")
-    return rolling_averages
+async def read_rolling_averages(request: Request, player_name: str = Body(None), windows: list[conint(ge=1)] | None = Body(None), x: int = Body(5, ge=1), session=Depends(get_session)):
+    # Validated like rolling_series, and de-duplicated and sorted so equivalent requests share a cache entry
+    windows = sorted(set(windows)) if windows else None
+    async def load():
+        if windows:
+            rolling_averages = await run_query(session, get_rolling_averages_for_windows, player_name, windows)
+            if not rolling_averages:
+                raise HTTPException(status_code=404, detail="Averages not found")
+            return rolling_averages
+        rolling_averages = await run_query(session, get_rolling_averages, player_name, x)
+        if rolling_averages is None:
+            raise HTTPException(status_code=404, detail="Averages not found")
+        return rolling_averages
+    return await response_cache.respond(request, session, ("rolling_averages", normalize_name(player_name), windows, x), load)
+
+@app.post("/player/rolling_series")
+async def read_rolling_series(player_name: str = Body(None), x: int = Body(5, ge=1), session=Depends(get_session)):
+    # Same {"player_name", "x"} body as the other endpoints; x < 1 would make an invalid window frame
+    series = await run_query(session, get_rolling_series, player_name, x)
+    if not series:
+        raise HTTPException(status_code=404, detail="Games not found")
+    return series
 
 @app.post("/player/season_averages")
-def read_season_averages(data: dict = Body(...)):
+async def read_season_averages(request: Request, data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
-    season_averages = get_season_averages(player_name)
-    if season_averages is None:
-        raise HTTPException(status_code=404, detail="Averages not found")
-    return season_averages
+    async def load():
+        season_averages = await run_query(session, get_season_averages, player_name)
+        if season_averages is None:
+            raise HTTPException(status_code=404, detail="Averages not found")
+        return season_averages
+    return await response_cache.respond(request, session, ("season_averages", normalize_name(player_name)), load)
 
 @app.post("/player/best_scoring_game")
-def read_best_scoring_game(data: dict = Body(...)):
+async def read_best_scoring_game(data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
-    best_game = get_best_scoring_game(player_name)
+    best_game = await run_query(session, get_best_scoring_game, player_name)
     if best_game is None:
         raise HTTPException(status_code=404, detail="Best scoring game not found")
     return best_game
 
 @app.post("/player/worst_scoring_game")
-def read_worst_scoring_game(data: dict = Body(...)):
+async def read_worst_scoring_game(data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
-    worst_game = get_worst_scoring_game(player_name)
+    worst_game = await run_query(session, get_worst_scoring_game, player_name)
     if worst_game is None:
         raise HTTPException(status_code=404, detail="Worst scoring game not found")
     return worst_game
 
 @app.post("/player/get_games")
-def read_games(data: dict = Body(...)):
+async def read_games(request: Request, data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
-    games = get_games_played(player_name)
-    if not games:
-        raise HTTPException(status_code=404, detail="Games not found")
-    return games
+    async def load():
+        games = await run_query(session, get_games_played, player_name)
+        if not games:
+            raise HTTPException(status_code=404, detail="Games not found")
+        return games
+    return await response_cache.respond(request, session, ("get_games", normalize_name(player_name)), load)
 
 @app.post("/player/get_schedule")
-def read_games(data: dict = Body(...)):
+async def read_games(request: Request, data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
-    games = schedule_with_box_score(player_name)
-    if not games:
-        raise HTTPException(status_code=404, detail="Games not found")
-    return games
+    async def load():
+        games = await run_query(session, schedule_with_box_score, player_name)
+        if not games:
+            raise HTTPException(status_code=404, detail="Games not found")
+        return games
+    return await response_cache.respond(request, session, ("get_schedule", normalize_name(player_name)), load)
 
 @app.post("/player/high_turnover_games")
-def read_high_turnover_games(data: dict = Body(...)):
+async def read_high_turnover_games(data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
     threshold = data.get("threshold", 3)
-    high_turnover_games = get_high_turnover_games(player_name, threshold)
+    high_turnover_games = await run_query(session, get_high_turnover_games, player_name, threshold)
     if not high_turnover_games:
         raise HTTPException(status_code=404, detail="High turnover games not found")
     return high_turnover_games
 
 @app.post("/player/high_3pt_games")
-def read_high_3pt_games(data: dict = Body(...)):
+async def read_high_3pt_games(data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
     threshold = data.get("threshold", 0.4)
-    high_3pt_games = get_high_3pt_games(player_name, threshold)
+    high_3pt_games = await run_query(session, get_high_3pt_games, player_name, threshold)
     if not high_3pt_games:
         raise HTTPException(status_code=404, detail="High 3-point games not found")
     return high_3pt_games
 
 @app.post("/player/training_recommendations")
-def read_training_recommendations(data: dict = Body(...)):
+async def read_training_recommendations(data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
-    recommendations = generate_training_recommendations(player_name)
+    recommendations = await run_query(session, generate_training_recommendations, player_name)
     if not recommendations:
         raise HTTPException(status_code=404, detail="Training recommendations not found")
     return recommendations
 
 @app.post("/player/training_recommendations_gpt")
-def read_training_recommendations(data: dict = Body(...)):
+async def read_training_recommendations(data: dict = Body(...)):
+    # No request session: get_ai_recommendations_async opens its own, so none is held during the model call
     player_name = data.get("player_name")
-    recommendations = get_ai_recommendations(player_name)
+    try:
+        recommendations = await get_ai_recommendations_async(player_name)
+    except RecommendationError as e:
+        raise HTTPException(status_code=502, detail=str(e))
     if not recommendations:
         raise HTTPException(status_code=404, detail="Training recommendations not found")
     return recommendations
 
+@app.post("/player/training_recommendations_gpt/stream")
+async def stream_training_recommendations(data: dict = Body(...)):
+    """
+    Streaming variant of /player/training_recommendations_gpt, as Server-Sent Events:
+    "token" events carry the performance summary text as it is generated and a final "recommendations"
+    event carries {"recommendations", "recommended_drills", "drills"}. An "error" event ends a failed stream.
+    """
+    player_name = data.get("player_name")
+    # Resolved up front so an unknown player gets a 404 rather than a 200 stream, and no model call
+    async with AsyncSessionLocal() as session:
+        player = await run_query(session, resolve_player, player_name)
+    if player is None:
+        raise HTTPException(status_code=404, detail="Player not found")
+    return StreamingResponse(
+        stream_ai_recommendations(player),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/players")
-def read_players():
-    players = get_all_players()
-    if not players:
-        raise HTTPException(status_code=404, detail="Players not found")
-    return players
+async def read_players(request: Request, session=Depends(get_session)):
+    async def load():
+        players = await run_query(session, get_all_players)
+        if not players:
+            raise HTTPException(status_code=404, detail="Players not found")
+        return players
+    return await response_cache.respond(request, session, ("players",), load)
+
+@app.post("/players/season_averages")
+async def read_players_season_averages(request: Request, data: dict = Body(...), session=Depends(get_session)):
+    """
+    Season averages for several players at once.
+    Args:
+        data (dict): {"player_names": [...]} or {"player_names": "all"} for the whole roster.
+    Returns:
+        dict: Player name -> averages (null for names without data).
+    """
+    player_names = data.get("player_names", "all")
+    if player_names != "all" and not isinstance(player_names, list):
+        raise HTTPException(status_code=422, detail='player_names must be a list of names or "all"')
+    async def load():
+        season_averages = await run_query(session, get_season_averages_for_players, player_names)
+        if not season_averages:
+            raise HTTPException(status_code=404, detail="Averages not found")
+        return season_averages
+    return await response_cache.respond(request, session, ("players/season_averages", player_names if player_names == "all" else [normalize_name(name) for name in player_names]), load)
 
 
 @app.get("/drills")
-def read_drills():
-    drills = get_drills()
-    if not drills:
-        raise HTTPException(status_code=404, detail="Drills not found")
-    return drills
+async def read_drills(request: Request, session=Depends(get_session)):
+    async def load():
+        drills = await run_query(session, get_drills)
+        if not drills:
+            raise HTTPException(status_code=404, detail="Drills not found")
+        return drills
+    return await response_cache.respond(request, session, ("drills",), load)
 
 @app.post("/player/drill_schedule")
-def read_drill_schedule(data: dict = Body(...)):
+async def read_drill_schedule(data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
     selected_date_str = data.get("date")
     hour = data.get("hour")
     selected_date = datetime.fromisoformat(selected_date_str.replace("Z", "+00:00")).date()
-    print(type(selected_date))
-    drills = get_schedule_by_player_for_day(player_name,selected_date,hour)
+    drills = await run_query(session, get_schedule_by_player_for_day, player_name,selected_date,hour)
     # if not drills:
     #     raise HTTPException(status_code=404, detail="Drill schedule not found")
     return drills
 
 @app.put("/player/drill_schedule")
-def update_drill_schedule(data: dict = Body(...)):
+async def update_drill_schedule(data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
     drill = data.get("drill")
     date=data.get("date")
     hour: int = data.get("hour")
-    add_drill_to_player_schedule(player_name,drill,date,hour)
+    await run_query(session, add_drill_to_player_schedule, player_name,drill,date,hour)
     return {"status":"success"}
 
 @app.delete("/player/drill_schedule")
-def update_drill_schedule(data: dict = Body(...)):
+async def update_drill_schedule(data: dict = Body(...), session=Depends(get_session)):
     player_name = data.get("player_name")
     drill = data.get("drill")
     date=data.get("date")
     hour: int = data.get("hour")
-    remove_drill_from_player_schedule(player_name,drill,date,hour)
+    await run_query(session, remove_drill_from_player_schedule, player_name,drill,date,hour)
     return {"status":"success"}
\ No newline at end of file
@@ -0,0 +1,164 @@
+import sqlite3
+import sys
+
+# The box score pages report shooting and rebounding as "made-attempted" text
+# ("5-12"). Each of those columns is also stored as a pair of integer columns
+# so aggregates can run in SQL instead of re-parsing strings on every request.
+SPLIT_COLUMNS = {
+    'fg': ('fgm', 'fga'),
+    'pt3': ('pt3m', 'pt3a'),
+    'ft': ('ftm', 'fta'),
+    'orb_drb': ('orb', 'drb'),
+}
+
+
+def split_made_attempted(value):
+    """ Split a "made-attempted" box score string such as "5-12" into (5, 12) """
+    if not value or '-' not in value:
+        return 0, 0
+    made, attempted = value.split('-', 1)
+    return int(made or 0), int(attempted or 0)
+
+
+def get_columns(c, table):
+    c.execute(f'PRAGMA table_info({table})')
+    return {row[1] for row in c.fetchall()}
+
+
+def add_split_columns(c):
+    """ Add the integer made/attempted columns to box_score if they are missing """
+    existing = get_columns(c, 'box_score')
+    for made, attempted in SPLIT_COLUMNS.values():
+        for column in (made, attempted):
+            if column not in existing:
+                c.execute(f'ALTER TABLE box_score ADD COLUMN {column} INTEGER')
+
+
+def backfill_split_columns(c):
+    """ Fill the integer made/attempted columns from the text columns for rows that predate them """
+    for text_column, (made, attempted) in SPLIT_COLUMNS.items():
+        c.execute(f'''
+            UPDATE box_score SET
+                {made} = CAST(substr({text_column}, 1, instr({text_column}, '-') - 1) AS INTEGER),
+                {attempted} = CAST(substr({text_column}, instr({text_column}, '-') + 1) AS INTEGER)
+            WHERE {made} IS NULL AND instr({text_column}, '-') > 0
+        ''')
+        if c.rowcount > 0:
+            print(f"Backfilled {c.rowcount} rows: {text_column} -> {made}, {attempted}")
+
+
+# Bumped whenever ingest changes what the API would return; the response cache keys on it
+BUMP_DATA_VERSION = 'UPDATE data_version SET version = version + 1'
+
+
+def add_data_version(c):
+    c.execute('CREATE TABLE IF NOT EXISTS data_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)')
+    c.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+
+
+def add_player_key(c):
+    """
+    Link box_score rows to the roster through a player_id column and index the lookups
+    the API does once a name has been resolved (see link_players).
+    Returns:
+        bool: Whether the column or player_search was missing, i.e. the rows still need linking.
+    """
+    has_column = 'player_id' in get_columns(c, 'box_score')
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'player_search'")
+    added = not has_column or c.fetchone() is None
+    if not has_column:
+        c.execute('ALTER TABLE box_score ADD COLUMN player_id INTEGER REFERENCES player (player_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS ix_box_score_player_id ON box_score (player_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS ix_box_score_player ON box_score (player)')
+    c.execute('CREATE INDEX IF NOT EXISTS ix_player_name_lower ON player (lower(name))')
+    # Trigram index over every player name, so a partial name resolves without scanning box_score
+    c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS player_search USING fts5(name, player_id UNINDEXED, tokenize='trigram')")
+    return added
+
+
+def link_players(c, game_id=None):
+    """
+    Point box_score.player_id at the roster entry with the same (case-insensitive) name and
+    rebuild player_search. Run after box scores are ingested and after the roster is re-scraped,
+    since save_roster adds and removes players. Bumps the data version.
+    Args:
+        c (sqlite3.Cursor): A cursor on the database.
+        game_id (int, optional): Only relink this game's rows. Relinks every row when None.
+    """
+    c.execute(f'''
+        UPDATE box_score SET player_id = (SELECT player_id FROM player WHERE lower(player.name) = lower(box_score.player))
+        {'WHERE game_id = ?' if game_id is not None else ''}
+    ''', [] if game_id is None else [game_id])
+    c.execute('DELETE FROM player_search')
+    c.execute('''
+        INSERT INTO player_search (name, player_id)
+        SELECT player, max(player_id) FROM box_score WHERE player IS NOT NULL AND player != 'TEAM' GROUP BY player
+        UNION ALL
+        SELECT name, player_id FROM player
+        WHERE player_id NOT IN (SELECT player_id FROM box_score WHERE player_id IS NOT NULL)
+    ''')
+    c.execute(BUMP_DATA_VERSION)
+
+
+def add_game_keys(c):
+    """
+    Give schedule rows a stable game_key (date and opponent, see api.scrape_schedule.game_key) so
+    a re-scrape updates them in place instead of recreating the table and renumbering game_id,
+    and a box_score_hash of the last ingested box score so an unchanged one is not rewritten.
+    """
+    existing = get_columns(c, 'schedule')
+    for column in ('game_key', 'box_score_hash'):
+        if column not in existing:
+            c.execute(f'ALTER TABLE schedule ADD COLUMN {column} TEXT')
+    # The old schedule scraper's fallback for dates without a time left them in 1900; put them
+    # in the season the way api.scrape_schedule.parse_game_date does, before they become keys
+    c.execute('''
+        UPDATE schedule SET date = (CASE WHEN CAST(substr(date, 6, 2) AS INTEGER) > 8 THEN '2024' ELSE '2025' END) || substr(date, 5)
+        WHERE date LIKE '1900-%'
+    ''')
+    c.execute("UPDATE schedule SET game_key = coalesce(date, '') || ' ' || coalesce(opponent, '') WHERE game_key IS NULL")
+    c.execute('CREATE UNIQUE INDEX IF NOT EXISTS ix_schedule_game_key ON schedule (game_key)')
+
+
+def prune_recommendation_cache(c):
+    """ Keep only each player's latest recommendations; older rows are for prompt inputs that have since changed """
+    c.execute('''
+        DELETE FROM recommendation_cache WHERE rowid NOT IN (
+            SELECT max(rowid) FROM recommendation_cache AS latest
+            WHERE created_at = (SELECT max(created_at) FROM recommendation_cache WHERE player IS latest.player)
+            GROUP BY player
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS ix_recommendation_cache_player ON recommendation_cache (player)')
+
+
+def upgrade(conn):
+    """
+    Bring an existing basketball_stats.db up to the current schema.
+    Every step is idempotent, so this is safe to run on every startup; once the schema is current it
+    writes nothing and leaves the data version alone, so it does not flush the API's response cache.
+    Args:
+        conn (sqlite3.Connection): An open connection to the database.
+    """
+    c = conn.cursor()
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('box_score', 'player', 'schedule', 'recommendation_cache')")
+    tables = {row[0] for row in c.fetchall()}
+    add_data_version(c)
+    if 'schedule' in tables:
+        add_game_keys(c)
+    if 'box_score' in tables:
+        add_split_columns(c)
+        backfill_split_columns(c)
+    if {'box_score', 'player'} <= tables and add_player_key(c):
+        # Ingest and save_roster link their own rows from then on
+        link_players(c)
+    if 'recommendation_cache' in tables:
+        prune_recommendation_cache(c)
+    conn.commit()
+
+
+if __name__ == '__main__':
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'basketball_stats.db'
+    conn = sqlite3.connect(db_path)
+    upgrade(conn)
+    conn.close()
@@ -0,0 +1,134 @@
+"""
+On-disk cache of fetched pages. Each page is stored gzipped once under the sha256 of its HTML
+(objects/ab/abcd....html.gz), and an index records which content every URL had on every day it
+was fetched, with the ETag and Last-Modified the site sent, so later fetches can revalidate
+(If-None-Match / If-Modified-Since) instead of downloading an unchanged page again.
+
+    cache = PageCache('page_cache')
+    async with open_fetcher(cache=cache) as fetcher:    # see api.fetch
+        ...
+
+A ReplayFetcher serves pages from the cache alone, e.g. to re-parse a season without the site:
+    python -m api.sync --replay
+"""
+import gzip
+import hashlib
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+# Where pages are cached unless told otherwise; set BBTRACKER_PAGE_CACHE= (empty) to not cache
+PAGE_CACHE_DIR = os.environ.get("BBTRACKER_PAGE_CACHE", "page_cache")
+
+
+class PageCache:
+    """
+    Args:
+        directory (str): Created if missing.
+        max_age (float): Seconds a cached page is used without revalidating it; 0 always revalidates.
+    """
+
+    def __init__(self, directory=PAGE_CACHE_DIR, max_age=0):
+        self.directory = directory
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.db'))
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS page (
+                url TEXT,
+                fetched_on DATE,
+                fetched_at DATETIME,
+                digest TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                PRIMARY KEY (url, fetched_on)
+            )
+        ''')
+        self.conn.commit()
+
+    def object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], f'{digest}.html.gz')
+
+    def latest(self, url, as_of=None):
+        """
+        Args:
+            url (str): The page.
+            as_of (str, optional): "YYYY-MM-DD": the last entry fetched on or before this day.
+        Returns:
+            dict: The index entry ("url", "fetched_on", "fetched_at", "digest", "etag", "last_modified"), or None.
+        """
+        cursor = self.conn.execute(f'''
+            SELECT url, fetched_on, fetched_at, digest, etag, last_modified FROM page
+            WHERE url = ? {'AND fetched_on <= ?' if as_of else ''}
+            ORDER BY fetched_on DESC LIMIT 1
+        ''', [url, as_of] if as_of else [url])
+        row = cursor.fetchone()
+        return dict(zip(['url', 'fetched_on', 'fetched_at', 'digest', 'etag', 'last_modified'], row)) if row else None
+
+    def fresh(self, entry):
+        """ Whether an entry is recent enough to use without asking the site """
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(entry['fetched_at'])
+        return age.total_seconds() < self.max_age
+
+    def read(self, entry):
+        with gzip.open(self.object_path(entry['digest']), 'rt', encoding='utf-8') as f:
+            return f.read()
+
+    def store(self, url, content, etag=None, last_modified=None):
+        """
+        Record that url had content today. The HTML is written only if no page had it before.
+        Returns:
+            dict: The new index entry.
+        """
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written under a temporary name first, so an interrupted run never leaves half a page
+            with gzip.open(f'{path}.tmp', 'wt', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(f'{path}.tmp', path)
+        now = datetime.now(timezone.utc)
+        entry = {'url': url, 'fetched_on': now.date().isoformat(), 'fetched_at': now.isoformat(), 'digest': digest, 'etag': etag, 'last_modified': last_modified}
+        self.conn.execute('''
+            INSERT OR REPLACE INTO page (url, fetched_on, fetched_at, digest, etag, last_modified)
+            VALUES (:url, :fetched_on, :fetched_at, :digest, :etag, :last_modified)
+        ''', entry)
+        self.conn.commit()
+        return entry
+
+    def close(self):
+        self.conn.close()
+
+
+def open_page_cache(max_age=0):
+    """ The PageCache at PAGE_CACHE_DIR, or None when caching is turned off """
+    return PageCache(PAGE_CACHE_DIR, max_age) if PAGE_CACHE_DIR else None
+
+
+class ReplayFetcher:
+    """
+    Serves pages from a PageCache only, as they were on a given day (the latest by default),
+    without any network or browser. Has the Fetcher interface; screenshots are not taken.
+    """
+
+    def __init__(self, cache, as_of=None):
+        self.cache = cache
+        self.as_of = as_of
+        self.served_by = {}
+
+    async def fetch(self, url, ready=None, screenshot=None):
+        entry = self.cache.latest(url, self.as_of)
+        if entry is None:
+            raise ValueError(f"{url} is not in the page cache{f' as of {self.as_of}' if self.as_of else ''}")
+        self.served_by[url] = 'cache'
+        return self.cache.read(entry)
+
+    async def close(self):
+        self.cache.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,29 @@
+"""
+HTML parsing for the scrapers. Pages are parsed with lxml when it is installed, and only the
+part a scraper reads (the box score section, the roster, the schedule list) is built into a tree:
+a Sidearm page is mostly navigation, scripts and ads around it.
+
+    soup = make_soup(content, 'section', {'id': 'box-score'})
+    box_score = soup.find('section', {'id': 'box-score'})
+"""
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    PARSER = 'lxml'
+except ImportError:
+    PARSER = 'html.parser'
+
+
+def make_soup(content, name=None, attrs=None, parser=PARSER):
+    """
+    Args:
+        content (str): The page.
+        name (str, optional): Only keep elements with this tag (and what is inside them).
+        attrs (dict, optional): ... and these attributes.
+        parser (str): BeautifulSoup tree builder.
+    Returns:
+        BeautifulSoup: The matching elements, or the whole page without name and attrs.
+    """
+    parse_only = SoupStrainer(name, attrs or {}) if name or attrs else None
+    return BeautifulSoup(content, parser, parse_only=parse_only)
@@ -0,0 +1,159 @@
+"""
+A staged pipeline: jobs (dicts) move through named stages connected by asyncio queues, each
+stage with workers of its own, so one page is being fetched while the previous one is parsed
+and the one before that loaded. Every stage records the jobs it handled, how long they took
+and its throughput.
+
+    pipeline = Pipeline([Stage('fetch', fetch, workers=4), Stage('parse', parse, thread=True), Stage('load', load, batch=50)])
+    jobs = await pipeline.run([{"kind": "schedule", "url": url}])
+    print_metrics(pipeline)
+
+A handler returns the job to pass it on, or None when the job is finished early (it may set
+job["status"]). Batch handlers get and return lists. An exception fails the job (or the batch)
+with job["status"] = "failed" and job["error"]. Handlers can submit() follow-up jobs.
+"""
+import asyncio
+import inspect
+import time
+
+
+class StageMetrics:
+    """ Jobs handled by a stage, time spent on them, and throughput over the stage's active span """
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.jobs = 0
+        self.failed = 0
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self.max_seconds = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, start, end, jobs, failed):
+        self.calls += 1
+        self.jobs += jobs
+        self.failed += failed
+        self.busy_seconds += end - start
+        self.max_seconds = max(self.max_seconds, end - start)
+        self.first_start = start if self.first_start is None else min(self.first_start, start)
+        self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+    def as_dict(self):
+        span = (self.last_end - self.first_start) if self.calls else 0.0
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "jobs": self.jobs,
+            "failed": self.failed,
+            "busy_seconds": self.busy_seconds,
+            "mean_ms": self.busy_seconds / self.calls * 1000 if self.calls else 0.0,
+            "max_ms": self.max_seconds * 1000,
+            "jobs_per_second": self.jobs / span if span else 0.0,
+        }
+
+
+class Stage:
+    """
+    Args:
+        name (str): Shown in the metrics and in a failed job's error.
+        handle: Function, or coroutine function, of a job (a list of jobs when batch > 1).
+        workers (int): Jobs handled at once.
+        batch (int): Hand the handler up to this many queued jobs at a time, e.g. to load them in one transaction.
+        thread (bool): Run a plain handler in a worker thread, so CPU-bound work such as parsing
+            does not hold up the event loop. Not for handlers that use a sqlite3 connection.
+    """
+
+    def __init__(self, name, handle, workers=1, batch=1, thread=False):
+        self.name = name
+        self.handle = handle
+        self.workers = workers
+        self.batch = batch
+        self.thread = thread
+        self.metrics = StageMetrics(name, workers)
+        self.queue = None
+
+    async def call(self, argument):
+        if inspect.iscoroutinefunction(self.handle):
+            return await self.handle(argument)
+        if self.thread:
+            return await asyncio.to_thread(self.handle, argument)
+        return self.handle(argument)
+
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = stages
+        self.pending = 0
+        self.finished = []
+        self.idle = None
+
+    def submit(self, job):
+        """ Start a job at the first stage; also for handlers adding follow-up jobs """
+        job.setdefault("status", "ok")
+        job.setdefault("error", None)
+        self.pending += 1
+        self.stages[0].queue.put_nowait(job)
+
+    def finish(self, job):
+        self.finished.append(job)
+        self.pending -= 1
+        if not self.pending:
+            self.idle.set()
+
+    async def run(self, jobs):
+        """
+        Args:
+            jobs (list): The jobs to start with.
+        Returns:
+            list: Every job, including follow-ups, in the order they finished.
+        """
+        self.idle = asyncio.Event()
+        for stage in self.stages:
+            stage.queue = asyncio.Queue()
+        for job in jobs:
+            self.submit(job)
+        workers = [asyncio.create_task(self.work(index)) for index, stage in enumerate(self.stages) for _ in range(stage.workers)]
+        try:
+            if self.pending:
+                await self.idle.wait()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return self.finished
+
+    async def work(self, index):
+        stage = self.stages[index]
+        following = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            jobs = [await stage.queue.get()]
+            while len(jobs) < stage.batch and not stage.queue.empty():
+                jobs.append(stage.queue.get_nowait())
+            start = time.perf_counter()
+            try:
+                if stage.batch > 1:
+                    passed = await stage.call(jobs) or []
+                else:
+                    passed = [job for job in [await stage.call(jobs[0])] if job is not None]
+                failed = []
+            except Exception as e:
+                passed = []
+                failed = jobs
+                for job in jobs:
+                    job.update(status="failed", error=f"{stage.name}: {e}")
+            stage.metrics.record(start, time.perf_counter(), len(jobs), len(failed))
+            passed_ids = {id(job) for job in passed}
+            for job in jobs:
+                if id(job) in passed_ids and following is not None:
+                    following.queue.put_nowait(job)
+                else:
+                    self.finish(job)
+
+
+def print_metrics(pipeline):
+    print(f"{'stage':<10}{'workers':>8}{'jobs':>6}{'failed':>8}{'busy s':>9}{'mean ms':>9}{'max ms':>9}{'jobs/s':>8}")
+    for stage in pipeline.stages:
+        metrics = stage.metrics.as_dict()
+        print(f"{metrics['stage']:<10}{metrics['workers']:>8}{metrics['jobs']:>6}{metrics['failed']:>8}{metrics['busy_seconds']:>9.2f}{metrics['mean_ms']:>9.1f}{metrics['max_ms']:>9.1f}{metrics['jobs_per_second']:>8.1f}")
@@ -0,0 +1,127 @@
+"""
+Generate the training recommendations for the whole roster ahead of time, so
+/player/training_recommendations_gpt serves a stored answer instead of waiting on the model.
+
+    python -m api.pregenerate_recommendations --concurrency 4
+    python -m api.pregenerate_recommendations --fake-llm --latency 0.5 --failure-rate 0.2
+
+Answers are stored under the fingerprint of their prompt inputs (see recommendation_fingerprint),
+which is exactly what the endpoint looks up. Players whose inputs have not changed since their
+last answer are skipped, so running this after every box score ingest only pays for what changed.
+Without OPENAI_API_KEY (and without --fake-llm) it prints a line and does nothing, which is
+what the scrapers' pre-generation step does on a machine without a key.
+The fake model's answers are stored like real ones, so point it at a copy of the database
+(BBTRACKER_DATABASE_URL=sqlite:////tmp/copy.db).
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from api.async_db import AsyncSessionLocal, generate_recommendations, run_query
+from api.sql_alchemy_models import get_all_players, get_cached_recommendations, get_recommendation_inputs, recommendation_fingerprint
+
+
+def fake_recommendation_chain(latency=0.0, failure_rate=0.0):
+    """
+    Stand-in for recommendation_chain() that answers with the parsed JSON it returns, without calling OpenAI,
+    for exercising the batch job (concurrency, retries, storage) locally.
+    Args:
+        latency (float): Seconds each call takes.
+        failure_rate (float): Fraction of calls that raise, to exercise the retries.
+    """
+    from langchain_core.runnables import RunnableLambda
+
+    async def answer(inputs):
+        await asyncio.sleep(latency)
+        if random.random() < failure_rate:
+            raise RuntimeError("fake model: simulated failure")
+        drills = [{"drill_id": drill["id"], "reps": drill["sets_reps"], "duration": "15 minutes", "rationale": "Fake model pick."} for drill in inputs["drills"][:3]]
+        return {"summary": f"Performance summary for {inputs['player_name']}.", "drills": drills}
+
+    return RunnableLambda(lambda inputs: asyncio.run(answer(inputs)), afunc=answer)
+
+
+async def with_retries(call, attempts=4, backoff=1.0):
+    """
+    Await call(), retrying failures with exponential backoff and jitter (backoff, 2 * backoff, ...,
+    each stretched by up to 2x so players that failed together do not retry together).
+    Raises the last error once attempts are used up.
+    """
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt * (1 + random.random()))
+
+
+async def pregenerate_player(player_name, semaphore, chain=None, attempts=4, backoff=1.0):
+    """
+    Generate and store one player's recommendations unless the stored answer is still current.
+    Returns:
+        dict: {"player", "status" ("generated", "cached" or "failed"), "seconds", "error"}
+    """
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as session:
+                inputs = await run_query(session, get_recommendation_inputs, player_name)
+                if inputs is None:
+                    raise ValueError("not found")
+                fingerprint = recommendation_fingerprint(inputs)
+                cached = await run_query(session, get_cached_recommendations, fingerprint)
+            if cached is not None:
+                status = "cached"
+            else:
+                await with_retries(lambda: generate_recommendations(inputs["player_name"], inputs, fingerprint, chain=chain), attempts, backoff)
+                status = "generated"
+            error = None
+        except Exception as e:
+            status, error = "failed", str(e)
+        return {"player": player_name, "status": status, "seconds": time.perf_counter() - start, "error": error}
+
+
+async def pregenerate_recommendations(concurrency=4, chain=None, attempts=4, backoff=1.0, verbose=True):
+    """
+    Run pregenerate_player for every player on the roster, at most concurrency at a time.
+    A player that still fails after its retries is reported and left for the endpoint to generate.
+    Without a chain and OPENAI_API_KEY nothing is generated, rather than every player failing
+    after its retries, so scrapes on a machine without a key do not wait on them.
+    Returns:
+        list: One pregenerate_player result per player.
+    """
+    if chain is None and not os.environ.get("OPENAI_API_KEY"):
+        if verbose:
+            print("OPENAI_API_KEY is not set; skipping recommendation pre-generation")
+        return []
+    async with AsyncSessionLocal() as session:
+        player_names = await run_query(session, get_all_players)
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(pregenerate_player(name, semaphore, chain, attempts, backoff) for name in player_names))
+    if verbose:
+        for result in results:
+            print(f"{result['player']:<30}{result['status']:<11}{result['seconds']:>8.2f}s  {result['error'] or ''}")
+        counts = {status: sum(result["status"] == status for result in results) for status in ("generated", "cached", "failed")}
+        print(f"{len(results)} players: {counts['generated']} generated, {counts['cached']} already current, {counts['failed']} failed")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4, help="Model calls in flight at once")
+    parser.add_argument("--attempts", type=int, default=4, help="Tries per player before giving up")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Seconds before the first retry")
+    parser.add_argument("--fake-llm", action="store_true", help="Answer with a local fake model instead of OpenAI")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per fake model call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of fake model calls that fail")
+    args = parser.parse_args()
+
+    chain = fake_recommendation_chain(args.latency, args.failure_rate) if args.fake_llm else None
+    asyncio.run(pregenerate_recommendations(args.concurrency, chain, args.attempts, args.backoff))
+
+
+if __name__ == '__main__':
+    main()
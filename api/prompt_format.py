@@ -0,0 +1,175 @@
+import functools
+import math
+
+from api.sql_alchemy_models import RECOMMENDATION_MODEL, RECOMMENDATION_PROMPT, RECOMMENDATION_TOKEN_BUDGET, player_totals_in_memory, season_averages
+
+# The recommendation prompt used to carry every input as a Python repr: each game as a dict
+# of 25 keys, and every drill with its description and variations. That grows with the season
+# and is mostly punctuation. These helpers render the same inputs as fixed-width tables and
+# short lines, and fold the oldest games into one line of averages once the prompt would go
+# over its token budget.
+
+# Keep at least this many games as rows, however small the budget
+MIN_DETAILED_GAMES = 5
+
+# (header, width, value) for each column of the per-game table
+GAME_COLUMNS = [
+    ("date", 10, lambda box, schedule: str(schedule["date"]) if schedule else ""),
+    ("opponent", 20, lambda box, schedule: (schedule["opponent"] or "")[:20] if schedule else ""),
+    ("h/a", 3, lambda box, schedule: ("H" if schedule["home"] else "A") if schedule else ""),
+    ("w/l", 3, lambda box, schedule: {True: "W", False: "L"}.get(schedule["win"], "") if schedule else ""),
+    ("gs", 2, lambda box, schedule: "*" if box["gs"] else ""),
+    ("min", 3, lambda box, schedule: box["min"]),
+    ("pts", 3, lambda box, schedule: box["pts"]),
+    ("fg", 5, lambda box, schedule: box["fg"]),
+    ("3pt", 5, lambda box, schedule: box["pt3"]),
+    ("ft", 5, lambda box, schedule: box["ft"]),
+    ("o-d", 5, lambda box, schedule: box["orb_drb"]),
+    ("reb", 3, lambda box, schedule: box["reb"]),
+    ("ast", 3, lambda box, schedule: box["a"]),
+    ("to", 3, lambda box, schedule: box["trn"]),
+    ("stl", 3, lambda box, schedule: box["stl"]),
+    ("blk", 3, lambda box, schedule: box["blk"]),
+    ("pf", 3, lambda box, schedule: box["pf"]),
+]
+
+
+@functools.cache
+def token_encoding(model):
+    """ tiktoken's encoding for model, or None when tiktoken or its encoding files are unavailable """
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
+def estimate_tokens(text, model=RECOMMENDATION_MODEL):
+    """ Token count of text for model; about 4 characters a token when tiktoken cannot be used """
+    encoding = token_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return "" if value is None else str(value)
+
+
+def format_averages(averages):
+    """ {"fg_pct": 45.2915, "reb": 3.0} -> "fg_pct 45.29 | reb 3" """
+    if not averages:
+        return "n/a"
+    return " | ".join(f"{name} {format_value(value)}" for name, value in averages.items())
+
+
+def format_row(cells, columns):
+    return " ".join(format_value(cell).ljust(width) if index < 2 else format_value(cell).rjust(width) for index, (cell, (_, width, _)) in enumerate(zip(cells, columns))).rstrip()
+
+
+def game_rows(played):
+    """ One fixed-width table row per (box score, schedule) pair """
+    return [format_row([value(box, schedule) for _, _, value in GAME_COLUMNS], GAME_COLUMNS) for box, schedule in played]
+
+
+def game_table_header():
+    return format_row([header for header, _, _ in GAME_COLUMNS], GAME_COLUMNS)
+
+
+def format_game(box, schedules):
+    """ A single game as one short line, e.g. for the best and worst scoring games """
+    if not box:
+        return "n/a"
+    schedule = schedules.get(box["game_id"])
+    label = f"{schedule['date']} vs {schedule['opponent']}" if schedule else f"game {box['game_id']}"
+    return f"{label}: {box['pts']} pts, {box['fg']} fg, {box['pt3']} 3pt, {box['ft']} ft, {box['reb']} reb, {box['a']} ast, {box['trn']} to"
+
+
+def format_game_list(box_scores, schedules, stat):
+    """ "2025-01-04 (4), 2025-02-12 (5)" for the high turnover / high 3-point lists """
+    if not box_scores:
+        return "none"
+    labels = []
+    for box in box_scores:
+        schedule = schedules.get(box["game_id"])
+        labels.append(f"{schedule['date'] if schedule else 'game ' + str(box['game_id'])} ({box[stat]})")
+    return ", ".join(labels)
+
+
+def format_drills(drills):
+    """ Only what the model picks a drill by: its id and name, what it improves and the sets/reps """
+    if not drills:
+        return "none"
+    return "\n".join(f"- #{drill['id']} {drill['name']} [{drill['category']}]: improves {', '.join(drill['improves'])}; {drill['sets_reps']}" for drill in drills)
+
+
+def format_player_data(player_data):
+    if not player_data:
+        return "n/a"
+    return ", ".join(f"{name} {value}" for name, value in player_data.items() if name != "image" and value)
+
+
+def summarize_games(played):
+    """ One line of averages standing in for the older games that did not fit """
+    first, last = played[0][1], played[-1][1]
+    span = f" ({first['date']} to {last['date']})" if first and last else ""
+    averages = season_averages(player_totals_in_memory([box for box, _ in played]))
+    return f"{len(played)} earlier games{span} averaged: {format_averages(averages)}"
+
+
+def compact_prompt_inputs(inputs, token_budget=RECOMMENDATION_TOKEN_BUDGET, model=RECOMMENDATION_MODEL):
+    """
+    Render get_recommendation_inputs for RECOMMENDATION_PROMPT within a token budget.
+    Every game is a row of one fixed-width table, oldest first; when the whole prompt would go
+    over token_budget, the oldest games (never the last MIN_DETAILED_GAMES) are replaced by
+    a line of their averages.
+    Args:
+        inputs (dict): The output of get_recommendation_inputs.
+        token_budget (int): Target size of the formatted prompt, in tokens of model.
+    Returns:
+        dict: The prompt variables, as strings.
+    """
+    played = [(game["BoxScore"], game["Schedule"]) for game in inputs["player_stats"]]
+    schedules = {box["game_id"]: schedule for box, schedule in played if schedule}
+    variables = {
+        "player_name": inputs["player_name"],
+        "player_data": format_player_data(inputs["player_data"]),
+        "season_averages": format_averages(inputs["season_averages"]),
+        "rolling_averages_5": format_averages(inputs["rolling_averages_5"]),
+        "rolling_averages_10": format_averages(inputs["rolling_averages_10"]),
+        "best_game": format_game(inputs["best_game"], schedules),
+        "worst_game": format_game(inputs["worst_game"], schedules),
+        "high_turnover_games": format_game_list(inputs["high_turnover_games"], schedules, "trn"),
+        "high_3pt_games": format_game_list(inputs["high_3pt_games"], schedules, "pt3"),
+        "drills": format_drills(inputs["drills"]),
+        "team_stats": format_averages(inputs["team_stats"]),
+        "team_rolling_averages_5": format_averages(inputs["team_rolling_averages_5"]),
+        "team_rolling_averages_10": format_averages(inputs["team_rolling_averages_10"]),
+        "player_stats": "",
+    }
+    rows = game_rows(played)
+    header = game_table_header()
+    used = estimate_tokens(RECOMMENDATION_PROMPT.format(**variables), model) + estimate_tokens(header, model)
+
+    # Newest games first, for as long as they fit next to the summary of the rest
+    costs = [estimate_tokens(row + "\n", model) for row in rows]
+    if used + sum(costs) > token_budget:
+        used += estimate_tokens(summarize_games(played) + "\n", model)
+    detailed = 0
+    for cost in reversed(costs):
+        if detailed >= MIN_DETAILED_GAMES and used + cost > token_budget:
+            break
+        used += cost
+        detailed += 1
+    lines = [header] + rows[len(rows) - detailed:]
+    if detailed < len(rows):
+        lines.insert(0, summarize_games(played[:len(rows) - detailed]))
+    variables["player_stats"] = "\n".join(lines) if rows else "none"
+    return variables
+
+
+def format_recommendation_prompt(inputs, token_budget=RECOMMENDATION_TOKEN_BUDGET):
+    """ The prompt text recommendation_chain() sends for inputs """
+    return RECOMMENDATION_PROMPT.format(**compact_prompt_inputs(inputs, token_budget))
@@ -1,12 +1,15 @@
 import asyncio
-from playwright.async_api import async_playwright
 from difflib import unified_diff
 import json
-from bs4 import BeautifulSoup
-import sqlite3
+from api.ingest import connect, ingest_box_scores
+from api.pregenerate_recommendations import pregenerate_recommendations
+from api.sql_alchemy_models import DATABASE_PATH, Session, create_schema, refresh_snapshots
+from api.fetch import fetch_page
+from api.parse_html import make_soup
+
  
 async def getTable(page):
-    soup = BeautifulSoup(page, 'html.parser')
+    soup = make_soup(page, 'table')
     tables = soup.find_all('table')
     all_tables_data = []
 
@@ -44,101 +47,106 @@ async def getTable(page):
             rows.append(row_data)
             # break  
     
-async def main(game_id=None, box_score_url=None):
-    async with async_playwright() as p:
-        #  p.firefox, p.webkit
-        for browser_type in [p.chromium]:
-            browser = await browser_type.launch(headless=True)
-            page = await browser.new_page()
-            url = 'https://athletics.claflin.edu/sports/mens-basketball/stats/2024-25/millersville-university/boxscore/3573'
-            url = box_score_url if box_score_url else url
-            await page.goto(url)
-            # await page.goto('#individual')
-            await page.wait_for_load_state('domcontentloaded')
-            # await page.screenshot(path=f'roster_page.png', full_page=True) 
-            content= await page.content()
-            
-            soup = BeautifulSoup(content, 'html.parser')
-            box_score = soup.find('section', {'id':'box-score'})
-            home_team = box_score.findAll('table', {'class':'overall-stats'})
-            # away_team = box_score.find('div', {'class':'team away'})
-            # home_stats_table = home_team.find('table', {'class':'sidearm-table'})
-            # print(await getTable(content))
-            rows = []
-            for table in home_team:
-                headers = [header.text.strip() for header in table.find('thead').find_all('th')]
-         
-                # print(headers)
-                
-                # first_row = [header.text.strip() for header in table.find('tbody').find_all('td')]
-                # print(json.dumps(first_row, indent=4))
-                caption = table.find('caption').text.strip() if table.find('caption') else None
-                if not caption :
-                    continue
-                team_name = caption.split(' ')[0]
-                print(f"Team name: {team_name}")
-                rows = []
-                rows.append(headers)
-                for row in table.find('tbody').find_all('tr'):
-                    cells = row.find_all('td')
-                    row_data = [cell.text.strip() for cell in cells]
-                    name = row_data[1].split(' ')[1:]
-                    name.reverse()
-                    row_data[1] = ' '.join(name).replace(' , ',' ') # Remove leading numbers from the player's name
-                    rows.append(row_data)
-                for row in rows:
-                    print(row)
-                conn = sqlite3.connect('basketball_stats.db')
-                c = conn.cursor()
+def validate_box_score(tables):
+    """ Raise ValueError if parsed box score tables are not fit to store """
+    if not tables:
+        raise ValueError("no box score tables")
+    for team_name, rows in tables:
+        if not rows:
+            raise ValueError(f"{team_name}: no players")
+        numbers = [row[0] for row in rows]
+        if any(len(row) != 15 for row in rows):
+            raise ValueError(f"{team_name}: rows without the 15 box score columns")
+        if not all(numbers) or len(set(numbers)) != len(numbers):
+            raise ValueError(f"{team_name}: missing or repeated player numbers")
 
-                # # Drop the table if it exists
-                # c.execute('DROP TABLE IF EXISTS box_score')
-                # # Create table if it doesn't exist
-                # c.execute('''
-                #     CREATE TABLE IF NOT EXISTS box_score (
-                #         game_id INTEGER ,
-                #         team_name TEXT,
-                #         player_number TEXT,
-                #         player TEXT,
-                #         gs TEXT,
-                #         min TEXT,
-                #         fg TEXT,
-                #         pt3 TEXT,
-                #         ft TEXT,
-                #         orb_drb TEXT,
-                #         reb TEXT,
-                #         pf TEXT,
-                #         a TEXT,
-                #         trn TEXT,
-                #         blk TEXT,
-                #         stl TEXT,
-                #         pts TEXT,
-                #         PRIMARY KEY (game_id, team_name, player_number)
-                #     )
-                # ''')
+def box_score_ready(content):
+    """ Whether a fetched page already has the tables parse_box_score reads """
+    return 'overall-stats' in content
 
-                # Insert data into the table
-                for row in rows[1:]:  # Skip the header row
-                    c.execute('''
-                        INSERT INTO box_score (
-                            game_id, team_name, player_number, player, gs, min, fg, pt3, ft, orb_drb, reb, pf, a, trn, blk, stl, pts
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', [game_id]+[team_name] + row)
+def parse_box_score(content):
+    """
+    Read the per-player tables of a box score page.
+    Returns:
+        list: (team name, rows) per team, each row the box_score columns from player_number to pts.
+    """
+    soup = make_soup(content, 'section', {'id':'box-score'})
+    box_score = soup.find('section', {'id':'box-score'})
+    tables = []
+    for table in box_score.findAll('table', {'class':'overall-stats'}):
+        caption = table.find('caption').text.strip() if table.find('caption') else None
+        if not caption :
+            continue
+        team_name = caption.split(' ')[0]
+        rows = []
+        for row in table.find('tbody').find_all('tr'):
+            cells = row.find_all('td')
+            row_data = [cell.text.strip() for cell in cells]
+            name = row_data[1].split(' ')[1:]
+            name.reverse()
+            row_data[1] = ' '.join(name).replace(' , ',' ') # Remove leading numbers from the player's name
+            rows.append(row_data)
+        tables.append((team_name, rows))
+    return tables
 
-                # Commit the transaction
-                conn.commit()
+def save_box_scores(games, db_path=DATABASE_PATH, conn=None):
+    """
+    Store several games' parsed box scores in one transaction (see api.ingest.ingest_box_scores)
+    and refresh the snapshots of everyone who played in them. The schema has to be current
+    (create_schema), as it is once the API, bbtracker-sync or the crawler has started.
+    Args:
+        games (list): (game_id, tables) pairs.
+        db_path (str): The database, when no connection is given.
+        conn (sqlite3.Connection, optional): An open connection to reuse.
+    Returns:
+        dict: The ingest_box_scores stats.
+    """
+    own_conn = conn is None
+    conn = connect(db_path) if own_conn else conn
+    try:
+        stats = ingest_box_scores(conn, games)
+    finally:
+        if own_conn:
+            conn.close()
 
-                # Close the connection
-                conn.close()
-                # break
-        
-            # print(home_team[0])
-            
-            
+    refresh_box_score_snapshots([game_id for game_id, _ in games], stats["replaced"])
+    return stats
+
+def refresh_box_score_snapshots(game_ids, replaced=()):
+    """
+    Recompute the season/rolling snapshots after ingesting game_ids: for one new game only its
+    players and teams, otherwise everyone. A replaced box score may have dropped a player, whose
+    snapshots only a full rebuild would correct.
+    """
+    if not game_ids:
+        return
+    with Session() as session:
+        refresh_snapshots(game_ids[0] if len(game_ids) == 1 and not replaced else None, session=session)
+
+def save_box_score(game_id, tables, db_path=DATABASE_PATH):
+    """
+    Store a game's parsed box score tables, link them to the roster and refresh the snapshots.
+    Rows already stored for the game are updated, so a corrected box score can be re-ingested.
+    """
+    return save_box_scores([(game_id, tables)], db_path)
+
+async def main(game_id=None, box_score_url=None, pregenerate=True):
+    url = 'https://athletics.claflin.edu/sports/mens-basketball/stats/2024-25/millersville-university/boxscore/3573'
+    url = box_score_url if box_score_url else url
+    content = await fetch_page(url, ready=box_score_ready)
+
+    tables = parse_box_score(content)
+    for team_name, rows in tables:
+        print(f"Team name: {team_name}")
+        for row in rows:
+            print(row)
+    # Ingest writes the integer split columns and relinks players, which need the migrated schema
+    create_schema()
+    save_box_score(game_id, tables)
 
-            # with open('roster.json', 'w') as f:
-            #     json.dump(roster, f, indent=4)
-            # print(json.dumps(roster, indent=4))
-            await browser.close()
+    # Ingest changed the prompt inputs, so have the new recommendations ready before anyone asks.
+    # Pass pregenerate=False when scraping several games and run it once at the end instead.
+    if pregenerate:
+        await pregenerate_recommendations()
 
 # asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,118 @@
+import sqlite3
+
+from api.migrations import link_players
+from api.parse_html import make_soup
+from api.sql_alchemy_models import DATABASE_PATH
+
+ROSTER_URL = 'https://athletics.claflin.edu/sports/mens-basketball/roster/2024-25'
+
+# The part of the roster page parse_roster reads
+ROSTER_SECTION = ('section', {'aria-label':"Men's Player Roster"})
+
+# The player columns a roster scrape fills in, in table order
+PLAYER_FIELDS = ['name', 'position', 'jersey_number', 'height', 'image', 'class', 'hometown', 'high_school']
+
+
+def roster_ready(content):
+    """ Whether a fetched page already has the player list parse_roster reads """
+    return 'sidearm-roster-player' in content
+
+
+def parse_roster(content):
+    """
+    Read the players off the roster page.
+    Returns:
+        dict: Player name -> dict of PLAYER_FIELDS.
+    """
+    soup = make_soup(content, *ROSTER_SECTION)
+    roster_list = soup.find(*ROSTER_SECTION).find_all('li')
+    roster = {}
+    for player in roster_list:
+
+        player_data = {}
+        name_tag = player.find('h3')
+        name  = name_tag.text.strip() if name_tag else None
+        if name:
+            player_data['name'] =' '.join(name.split())
+
+
+        position_tag = player.find('div', {"class": "sidearm-roster-player-position"})
+
+        jersey_number = player.find('span', {"class": "sidearm-roster-player-jersey-number"})
+
+        player_data['position'] = position_tag.find('span', {"class": "sidearm-roster-player-position-long-short","class": "text-bold"}).text.replace("\t","").replace("\n","").strip().split(" ")[0] if position_tag else None
+
+        player_data['jersey_number'] = jersey_number.text.strip() if jersey_number else None
+
+        height_tag = player.find('span', {"class": "sidearm-roster-player-height"})
+        player_data['height'] = height_tag.text.replace("\"","").strip() if height_tag else None
+
+        image_tag = player.find('img')
+        player_data['image'] = image_tag['data-src'] if image_tag and 'data-src' in image_tag.attrs else None
+
+        class_tag = player.find('span', {"class": "sidearm-roster-player-academic-year"})
+        player_data['class'] = class_tag.text.strip() if class_tag else None
+
+        hometown_tag = player.find('span', {"class": "sidearm-roster-player-hometown"})
+        player_data['hometown'] = hometown_tag.text.strip() if hometown_tag else None
+
+        high_school_tag = player.find('span', {"class": "sidearm-roster-player-highschool"})
+        player_data['high_school'] = high_school_tag.text.strip() if high_school_tag else None
+        roster.update({player_data['name']:player_data})
+    return roster
+
+
+def validate_roster(roster):
+    """ Raise ValueError if a parsed roster is not fit to merge into the player table """
+    if not roster:
+        raise ValueError("no players on the roster")
+    if any(not name for name in roster):
+        raise ValueError("players without a name")
+
+
+def save_roster(roster, db_path=DATABASE_PATH):
+    """
+    Merge a scraped roster into the player table, matched on the player's name: new players are
+    inserted, players whose details changed are updated in place (keeping their player_id, which
+    box_score rows and player_search refer to), and players no longer on the roster are deleted.
+    box_score.player_id is relinked and the data version bumped only when a row changed.
+    The schema has to be current already (api.sql_alchemy_models.create_schema); this does not migrate.
+    Args:
+        roster (dict): Output of parse_roster.
+        db_path (str, optional): Defaults to the BBTRACKER_DATABASE_URL database.
+    Returns:
+        dict: "new", "changed" and "removed" player_ids, and the number of "unchanged" players.
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(f'SELECT player_id, {", ".join(PLAYER_FIELDS)} FROM player')
+    existing = {values[0]: (player_id, values) for player_id, *values in c.fetchall()}
+    diff = {"new": [], "changed": [], "removed": [], "unchanged": 0}
+    for name, player_data in roster.items():
+        values = [player_data[field] for field in PLAYER_FIELDS]
+        if name not in existing:
+            c.execute(f'''
+                INSERT INTO player ({', '.join(PLAYER_FIELDS)})
+                VALUES ({', '.join('?' * len(PLAYER_FIELDS))})
+            ''', values)
+            diff["new"].append(c.lastrowid)
+            continue
+        player_id, stored_values = existing[name]
+        if stored_values != values:
+            c.execute(f'''
+                UPDATE player SET {', '.join(f'{field} = ?' for field in PLAYER_FIELDS)}
+                WHERE player_id = ?
+            ''', values + [player_id])
+            diff["changed"].append(player_id)
+        else:
+            diff["unchanged"] += 1
+    if roster:
+        diff["removed"] = sorted(player_id for name, (player_id, _) in existing.items() if name not in roster)
+        c.executemany('DELETE FROM player WHERE player_id = ?', [(player_id,) for player_id in diff["removed"]])
+    # Names (and so box_score.player_id and player_search) only move with new or departed players,
+    # but link_players is also what bumps the data version for an update
+    if diff["new"] or diff["changed"] or diff["removed"]:
+        link_players(c)
+    conn.commit()
+    conn.close()
+    return diff
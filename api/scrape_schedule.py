@@ -0,0 +1,179 @@
+import hashlib
+import json
+import re
+import sqlite3
+from datetime import datetime
+
+from api.migrations import BUMP_DATA_VERSION
+from api.parse_html import make_soup
+from api.sql_alchemy_models import DATABASE_PATH
+
+SCHEDULE_URL = 'https://athletics.claflin.edu/sports/mens-basketball/schedule/2024-25'
+
+# The schedule columns a scrape fills in, and that schedule_hash covers
+SCHEDULE_FIELDS = ['opponent', 'date', 'datetime', 'home', 'win', 'claflin_score', 'opponent_score', 'opp_logo', 'box_score_link']
+
+
+def parse_game_date(date_str):
+    """ "Nov 9 (Sat) 5:00 p.m." / "Nov 9 (Sat) TBA" -> datetime, in the 2024-25 season; None if unreadable """
+    date_str = date_str.replace('\n', ' ')
+    date_str = date_str.replace("p.m","PM").replace("a.m", "AM").replace(".", "")
+    for date_format in ('%b %d (%a) %I:%M %p', '%b %d (%a) TBA', '%b %d (%a)'):
+        try:
+            game_datetime = datetime.strptime(date_str, date_format)
+        except ValueError:
+            continue
+        return game_datetime.replace(year = 2024 if game_datetime.month > 8 else 2025)
+    print(f"Error parsing date: {date_str}")
+    return None
+
+
+def schedule_ready(content):
+    """ Whether a fetched page already has the game list parse_schedule reads """
+    return 'sidearm-schedule-game' in content
+
+
+def parse_schedule(content):
+    """
+    Read the games off the schedule page.
+    Returns:
+        list: A dict per game with the schedule columns that were on the page.
+    """
+    soup = make_soup(content, 'ul', {'class':"sidearm-schedule-games-container"})
+    schedule_list = soup.find('ul', {'class':"sidearm-schedule-games-container"}).find_all('li', {'class':'sidearm-schedule-game'})
+    games = []
+    for game in schedule_list:
+        game_data = {}
+        opponent = game.find('div', {'class':'sidearm-schedule-game-opponent-name'})
+        date = game.find('div', {'class':'sidearm-schedule-game-opponent-date'})
+        home = game.find('span', {'class':'sidearm-schedule-game-home'})
+        away = game.find('span', {'class':'sidearm-schedule-game-away'})
+        score = game.find('div', {'class':'sidearm-schedule-game-result'})
+        opp_logo = game.find('img')
+        box_score_link = game.find('li', {'sidearm-schedule-game-links-boxscore'})
+
+        if opponent:
+            game_data['opponent'] = opponent.text.strip()
+        if date:
+            game_datetime = parse_game_date(date.text.strip())
+            game_data['date'] = game_datetime.date() if game_datetime else None
+            game_data['datetime'] = game_datetime
+        if away:
+            game_data['home'] = False
+        if home:
+            game_data['home'] = True
+        if opp_logo:
+            game_data['opp_logo'] = opp_logo['data-src']
+        if box_score_link:
+            game_data['box_score_link'] = box_score_link.find('a')['href']
+        if score:
+            score_text = score.text.strip()
+            if score_text == "Canceled":
+                game_data['win'] = None
+                game_data['claflin_score'] = None
+                game_data['opponent_score'] = None
+            else:
+                match = re.match(r'([WL]),\s*(\d+)-(\d+)', score_text)
+                if match:
+                    game_data['win'] = match.group(1) == 'W'
+                    game_data['claflin_score'] = int(match.group(2))
+                    game_data['opponent_score'] = int(match.group(3))
+        games.append(game_data)
+    return games
+
+
+def validate_schedule(games):
+    """ Raise ValueError if a parsed schedule is not fit to merge """
+    if not games:
+        raise ValueError("no games on the schedule")
+    if any(not game.get('opponent') or not game.get('date') for game in games):
+        raise ValueError("games without an opponent or a date")
+    keys = [game_key(game) for game in games]
+    if len(set(keys)) != len(keys):
+        raise ValueError("the same date and opponent more than once")
+
+
+def game_key(game):
+    """
+    Stable identity of a game across scrapes: its date and opponent. game_id is only the
+    row's number in this database, and box_score_link does not exist until the game is played
+    (sync_schedule matches on it too once it does).
+    """
+    return f"{game.get('date') or ''} {game.get('opponent') or ''}"
+
+
+def schedule_hash(values):
+    """
+    Hash of a game's SCHEDULE_FIELDS values, comparable between a scraped game and its stored row
+    (booleans are stored as 0/1, dates and datetimes as text).
+    """
+    values = [int(value) if isinstance(value, bool) else value for value in values]
+    return hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()
+
+
+def sync_schedule(games, db_path=DATABASE_PATH):
+    """
+    Merge a scraped schedule into the schedule table: new games are inserted, games whose
+    content changed are updated in place (keeping their game_id, which box_score rows refer to),
+    and unchanged games are not written. A game is matched on its game_key or, once it has one,
+    its box score link, so a played game whose date or opponent is corrected keeps its row.
+    Stored games that are no longer on the page, such as the old entry of a rescheduled game,
+    are deleted unless box scores refer to them. The data version is only bumped when a row changed.
+    The schema has to be current already (api.sql_alchemy_models.create_schema); this does not migrate.
+    Args:
+        games (list): Output of parse_schedule.
+        db_path (str, optional): Defaults to the BBTRACKER_DATABASE_URL database.
+    Returns:
+        dict: "new", "changed" and "removed" game_ids, and the number of "unchanged" games.
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(f'SELECT game_key, game_id, {", ".join(SCHEDULE_FIELDS)} FROM schedule')
+    existing = {}
+    links = {}
+    for key, game_id, *values in c.fetchall():
+        existing[key] = (game_id, schedule_hash(values))
+        link = values[SCHEDULE_FIELDS.index('box_score_link')]
+        if link:
+            links[link] = key
+    diff = {"new": [], "changed": [], "removed": [], "unchanged": 0}
+    seen = set()
+    for game in games:
+        key = game_key(game)
+        values = [game.get(field) for field in SCHEDULE_FIELDS]
+        content_hash = schedule_hash(values)
+        stored_key = key if key in existing else links.get(game.get('box_score_link'))
+        if stored_key is None:
+            c.execute(f'''
+                INSERT INTO schedule ({', '.join(SCHEDULE_FIELDS)}, game_key)
+                VALUES ({', '.join('?' * (len(SCHEDULE_FIELDS) + 1))})
+            ''', values + [key])
+            existing[key] = (c.lastrowid, content_hash)
+            seen.add(c.lastrowid)
+            diff["new"].append(c.lastrowid)
+            continue
+        game_id, stored_hash = existing[stored_key]
+        seen.add(game_id)
+        if stored_hash != content_hash or stored_key != key:
+            c.execute(f'''
+                UPDATE schedule SET {', '.join(f'{field} = ?' for field in SCHEDULE_FIELDS)}, game_key = ?
+                WHERE game_id = ?
+            ''', values + [key, game_id])
+            existing[key] = (game_id, content_hash)
+            diff["changed"].append(game_id)
+        else:
+            diff["unchanged"] += 1
+    stale = [game_id for game_id, _ in existing.values() if game_id not in seen]
+    if games and stale:
+        c.execute('''
+            SELECT game_id FROM schedule
+            WHERE game_id IN (SELECT value FROM json_each(?))
+              AND game_id NOT IN (SELECT game_id FROM box_score WHERE game_id IS NOT NULL)
+        ''', [json.dumps(stale)])
+        diff["removed"] = sorted(game_id for game_id, in c.fetchall())
+        c.executemany('DELETE FROM schedule WHERE game_id = ?', [(game_id,) for game_id in diff["removed"]])
+    if diff["new"] or diff["changed"] or diff["removed"]:
+        c.execute(BUMP_DATA_VERSION)
+    conn.commit()
+    conn.close()
+    return diff
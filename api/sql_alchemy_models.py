@@ -1,15 +1,20 @@
-from calendar import c
-from sqlalchemy import ForeignKey, create_engine, Column, Integer, String, Boolean, Date, DateTime, Text
+from sqlalchemy import ForeignKey, Index, create_engine, event, Column, Integer, String, Boolean, Date, DateTime, Text, Float, and_, case, cast, false, func, literal, select, text, union_all
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 # from scrape_box_score import main as scrape_box_score
 import asyncio
-from pprint import pprint
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+# The LangChain/OpenAI stack takes longer to import than the rest of the API together, so it is
+# imported in recommendation_chain, on the first recommendation that has to be generated
+import contextlib
+import functools
+import hashlib
+from collections import namedtuple
 import json
+import os
+import re
+import time
 from datetime import datetime
+from api.migrations import BUMP_DATA_VERSION, upgrade
 
 Base = declarative_base()
 
@@ -25,6 +30,10 @@ class Schedule(Base):
     opponent_score = Column(Integer)
     opp_logo = Column(Text)
     box_score_link = Column(Text)
+    # Stable across re-scrapes (game_id is not); see api.scrape_schedule.game_key
+    game_key = Column(Text, unique=True)
+    # Hash of the box score as last ingested, so an unchanged page is not rewritten
+    box_score_hash = Column(Text)
     def __repr__(self):
         return f"<Schedule(game_id={self.game_id}, opponent={self.opponent}, date={self.date}, datetime={self.datetime}, home={self.home}, win={self.win}, claflin_score={self.claflin_score}, opponent_score={self.opponent_score}, opp_logo={self.opp_logo}, box_score_link={self.box_score_link})>"
 
@@ -39,6 +48,7 @@ class Player(Base):
     class_ = Column("class", Text)  # 'class' is a reserved keyword in Python
     hometown = Column(Text)
     high_school = Column(Text)
+    __table_args__ = (Index("ix_player_name_lower", func.lower(name)),)
     def __repr__(self):
         return f"<Player(player_id={self.player_id}, name={self.name}, position={self.position}, jersey_number={self.jersey_number}, height={self.height}, class_={self.class_}, hometown={self.hometown}, high_school={self.high_school})>"
 
@@ -47,13 +57,22 @@ class BoxScore(Base):
     game_id = Column(Integer, primary_key=True)
     team_name = Column(Text, primary_key=True)
     player_number = Column(Integer, primary_key=True)
-    player = Column(Text)
+    player = Column(Text, index=True)
+    player_id = Column(Integer, ForeignKey(Player.player_id), index=True)  # Set for players on the roster, see link_players
     gs = Column(Boolean)
     min = Column(Integer)
     fg = Column(Text)
     pt3 = Column(Text)
     ft = Column(Text)
     orb_drb = Column(Text)
+    fgm = Column(Integer)  # made/attempted split out of fg, pt3, ft and orb_drb
+    fga = Column(Integer)
+    pt3m = Column(Integer)
+    pt3a = Column(Integer)
+    ftm = Column(Integer)
+    fta = Column(Integer)
+    orb = Column(Integer)
+    drb = Column(Integer)
     reb = Column(Integer)
     pf = Column(Integer)
     a = Column(Integer)
@@ -70,12 +89,21 @@ class BoxScore(Base):
             "team_name": self.team_name,
             "player_number": self.player_number,
             "player": self.player,
+            "player_id": self.player_id,
             "gs": self.gs,
             "min": self.min,
             "fg": self.fg,
             "pt3": self.pt3,
             "ft": self.ft,
             "orb_drb": self.orb_drb,
+            "fgm": self.fgm,
+            "fga": self.fga,
+            "pt3m": self.pt3m,
+            "pt3a": self.pt3a,
+            "ftm": self.ftm,
+            "fta": self.fta,
+            "orb": self.orb,
+            "drb": self.drb,
             "reb": self.reb,
             "pf": self.pf,
             "a": self.a,
@@ -125,60 +153,465 @@ class Workout(Base):
             "drill_name": self.drill,
             "scheduled_date": self.scheduled_date.isoformat()
         }
+class CachedRecommendation(Base):
+    """ get_ai_recommendations results, keyed by recommendation_fingerprint of the prompt inputs; the latest per player """
+    __tablename__ = 'recommendation_cache'
+    fingerprint = Column(Text, primary_key=True)
+    player = Column(Text, index=True)
+    result = Column(Text)  # Stored as JSON string
+    created_at = Column(DateTime)
+
+class PlayerSeasonStats(Base):
+    """ Season totals per player, kept up to date by refresh_snapshots when a game is ingested """
+    __tablename__ = 'player_season_stats'
+    player = Column(Text, primary_key=True)
+    games = Column(Integer)
+    fg_pct = Column(Float)  # Per-game percentages summed, see player_total_columns
+    pt3_pct = Column("3p_pct", Float)
+    ft_pct = Column(Float)
+    reb = Column(Integer)
+    assists = Column(Integer)
+    turnovers = Column(Integer)
+    points = Column(Integer)
+    minutes = Column(Integer)
+    offensive_rebounds = Column(Integer)
+    defensive_rebounds = Column(Integer)
+    personal_fouls = Column(Integer)
+    blocks = Column(Integer)
+    steals = Column(Integer)
+
+class PlayerRollingStats(Base):
+    """ get_rolling_averages results for the windows in ROLLING_SNAPSHOT_WINDOWS """
+    __tablename__ = 'player_rolling_stats'
+    player = Column(Text, primary_key=True)
+    last_games = Column(Integer, primary_key=True)
+    stats = Column(Text)  # Stored as JSON string
+
+class TeamSeasonStats(Base):
+    """ Season totals per team, kept up to date by refresh_snapshots when a game is ingested """
+    __tablename__ = 'team_season_stats'
+    team_name = Column(Text, primary_key=True)
+    games = Column(Integer)
+    fgm = Column(Integer)
+    fga = Column(Integer)
+    pt3m = Column(Integer)
+    pt3a = Column(Integer)
+    ftm = Column(Integer)
+    fta = Column(Integer)
+    reb = Column(Integer)
+    assists = Column(Integer)
+    turnovers = Column(Integer)
+    points = Column(Integer)
+    minutes = Column(Integer)
+    offensive_rebounds = Column(Integer)
+    defensive_rebounds = Column(Integer)
+    personal_fouls = Column(Integer)
+    blocks = Column(Integer)
+    steals = Column(Integer)
+
     # Example usage:    
     # player_name = "John Doe"
     # box_scores = get_box_scores_for_player(player_name)
     # for box_score in box_scores:
     #     print(f"Game Date: {box_score.game.date}, Points: {box_score.pts}, Rebounds: {box_score.reb}, Assists: {box_score.a}")
 # Database connection
-engine = create_engine('sqlite:///C:/Users/tr102/code/bbtracker/basketball_stats.db', pool_size=10)
-Base.metadata.create_all(engine)
+DATABASE_URL = os.environ.get("BBTRACKER_DATABASE_URL", 'sqlite:///C:/Users/tr102/code/bbtracker/basketball_stats.db')
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+def create_database_engine(url):
+    """
+    Create the engine. SQLite files are put in WAL mode so API readers are not blocked by
+    scraper writes, and pooled connections may be handed between FastAPI's worker threads.
+    Args:
+        url (str): SQLAlchemy database URL.
+    Returns:
+        Engine: The configured engine.
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_size=10, max_overflow=20, pool_pre_ping=True)
+    engine = create_engine(
+        url,
+        pool_size=10,
+        max_overflow=20,
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+engine = create_database_engine(DATABASE_URL)
+
+# The file behind the engine, for the raw sqlite3 writers (ingest, schedule, roster, stat tables), so they write where the API reads
+DATABASE_PATH = engine.url.database
+
+def create_schema(bind=engine):
+    """
+    Create missing tables and bring existing ones up to date (see api.migrations.upgrade).
+    Idempotent; run at startup rather than on import, so importing the models stays cheap.
+    Args:
+        bind (Engine, optional): Defaults to the engine for BBTRACKER_DATABASE_URL.
+    """
+    Base.metadata.create_all(bind)
+    raw_connection = bind.raw_connection()
+    try:
+        upgrade(raw_connection.driver_connection)
+    finally:
+        raw_connection.close()
 # Example JSON representing a workout to be inserted
 
 # Create a configured "Session" class
 Session = sessionmaker(bind=engine)
-# session = Session()
-def get_schedule_by_player(player_name, session=Session()):
+
+def with_session(function):
+    """
+    Let a helper be called without a session, e.g. from the scrapers: a short-lived one is
+    opened and closed around the call. The API passes its request-scoped session instead.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, session=None, **kwargs):
+        if session is not None:
+            return function(*args, session=session, **kwargs)
+        with Session() as session:
+            return function(*args, session=session, **kwargs)
+    return wrapper
+
+def escape_like(value):
+    """ value with LIKE's wildcards escaped, for a pattern with ESCAPE '\\' """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# A player name as it appears in box_score, with the roster id when the player is on the roster
+PlayerKey = namedtuple("PlayerKey", ["player_id", "name"])
+
+@with_session
+def resolve_player(player_name, session=None):
+    """
+    Map what the user typed to one player with the trigram index in player_search, so the
+    queries that follow can use indexed equality instead of a '%name%' scan of box_score.
+    An exact (case-insensitive) name wins, then roster players, then the shortest name
+    containing the input.
+    Args:
+        player_name (str or PlayerKey): The name to search for. A PlayerKey is returned as is,
+                                        so a request only resolves its player once.
+        session (Session, optional): The SQLAlchemy session to use for the query.
+    Returns:
+        PlayerKey or None: The matching player, or None if no name contains the input.
+    """
+    if player_name is None or isinstance(player_name, PlayerKey):
+        return player_name
+    escaped = escape_like(player_name)
+    # With an ESCAPE clause SQLite does not hand the LIKE to the trigram index, so it is only added when needed
+    escape = "ESCAPE '\\'" if escaped != player_name else ""
+    row = session.execute(text(f'''
+        SELECT player_id, name FROM player_search
+        WHERE name LIKE :pattern {escape}
+        ORDER BY lower(name) = lower(:name) DESC, player_id IS NULL, length(name), rowid
+        LIMIT 1
+    '''), {"pattern": f"%{escaped}%", "name": player_name}).first()
+    return PlayerKey(*row) if row else None
+
+@with_session
+def resolve_players(player_names, session=None):
+    """
+    resolve_player for a list of names. Names that match a player exactly are resolved
+    together in one query; only the rest go through the substring search one by one.
+    Args:
+        player_names (list[str] or str): Names to search for, or "all" for everyone on the roster.
+        session (Session, optional): The SQLAlchemy session to use for the queries.
+    Returns:
+        dict: Requested name (the player's name for "all") -> PlayerKey, or None when nothing matched.
+    """
+    if player_names == "all":
+        rows = session.execute(text("SELECT player_id, name FROM player_search WHERE player_id IS NOT NULL")).all()
+        return {name: PlayerKey(player_id, name) for player_id, name in rows}
+    lowered = sorted({name.lower() for name in player_names})
+    exact = {
+        name.lower(): PlayerKey(player_id, name)
+        for player_id, name in session.execute(
+            text("SELECT player_id, name FROM player_search WHERE lower(name) IN (SELECT value FROM json_each(:names))"),
+            {"names": json.dumps(lowered)},
+        )
+    }
+    return {name: exact.get(name.lower()) or resolve_player(name, session=session) for name in player_names}
+
+def box_score_player(player):
+    """ Filter for a resolved player's box score rows """
+    if player.player_id is not None:
+        return BoxScore.player_id == player.player_id
+    return BoxScore.player == player.name
+
+def get_roster_entry(player, session):
+    """ The Player row for a resolved player, or None if they are not on the roster """
+    if player.player_id is not None:
+        return session.get(Player, player.player_id)
+    return session.query(Player).filter(func.lower(Player.name) == player.name.lower()).first()
+
+# Counting stats summed by the aggregate queries, keyed by the name used in the
+# stat dictionaries. The scrapers store these as text, so they are cast first.
+COUNTING_STATS = {
+    "reb": "reb",
+    "assists": "a",
+    "turnovers": "trn",
+    "points": "pts",
+    "minutes": "min",
+    "offensive_rebounds": "orb",
+    "defensive_rebounds": "drb",
+    "personal_fouls": "pf",
+    "blocks": "blk",
+    "steals": "stl",
+}
+
+def sum_of(column):
+    return func.coalesce(func.sum(cast(column, Integer)), 0)
+
+def player_game_values(box):
+    """
+    Per-row values behind the player averages: each game's shooting percentages
+    (NULL when there was no attempt) and its counting stats.
+    Args:
+        box: BoxScore, or the columns (.c) of a subquery over it.
+    Returns:
+        dict: Label -> SQL expression evaluated per box score row.
+    """
+    values = {
+        "fg_pct": cast(box.fgm, Float) / case((box.fga > 0, box.fga)),
+        "3p_pct": cast(box.pt3m, Float) / case((box.pt3a > 0, box.pt3a)),
+        "ft_pct": cast(box.ftm, Float) / func.max(1, box.fta),  # Avoid division by zero
+    }
+    values.update({name: cast(getattr(box, column), Integer) for name, column in COUNTING_STATS.items()})
+    return values
+
+def player_total_columns(box):
+    """
+    Aggregate expressions for per-player averages over a set of box score rows.
+    Shooting percentages are summed per game (games without an attempt count as zero),
+    so dividing every value by "games" gives the averages the API has always returned.
+    Args:
+        box: BoxScore, or the columns (.c) of a subquery over it.
+    Returns:
+        dict: Label -> SQL aggregate expression.
+    """
+    columns = {"games": func.count()}
+    columns.update({label: func.coalesce(func.sum(value), 0) for label, value in player_game_values(box).items()})
+    return columns
+
+def team_total_columns(box):
+    """
+    Aggregate expressions for team averages: made/attempted totals plus counting stats,
+    averaged over the number of distinct games.
+    Args:
+        box: BoxScore, or the columns (.c) of a subquery over it.
+    Returns:
+        dict: Label -> SQL aggregate expression.
+    """
+    columns = {"games": func.count(func.distinct(box.game_id))}
+    for column in ("fgm", "fga", "pt3m", "pt3a", "ftm", "fta"):
+        columns[column] = sum_of(getattr(box, column))
+    columns.update({name: sum_of(getattr(box, column)) for name, column in COUNTING_STATS.items()})
+    return columns
+
+# The team's player rows: box scores also carry a "TEAM" line per game
+TEAM_PLAYER_ROWS = (BoxScore.team_name == "Claflin", BoxScore.player != "TEAM")
+
+# Built once: constructing the expressions costs about as much as running a small query
+PLAYER_TOTAL_COLUMNS = player_total_columns(BoxScore)
+TEAM_TOTAL_COLUMNS = team_total_columns(BoxScore)
+
+@with_session
+def aggregate_stats(columns, *criteria, session=None):
+    """
+    Compute a whole stat dictionary in one aggregate query.
+    Args:
+        columns (dict): Label -> aggregate expression, e.g. from player_total_columns.
+        *criteria: Filters applied to the rows being aggregated.
+        session (Session, optional): The SQLAlchemy session to use for the query.
+    Returns:
+        dict: The single result row keyed by label.
+    """
+    query = session.query(*[expression.label(label) for label, expression in columns.items()])
+    return query.filter(*criteria).one()._asdict()
+
+@with_session
+def windowed_totals(total_columns, windows, *criteria, rank=func.row_number, partition_by=None, session=None):
+    """
+    Totals over the most recent games for several window sizes in one query.
+    Rows are numbered newest first with a window function, joined to the list of
+    window sizes and grouped, so every window size comes back as one row of totals.
+    Args:
+        total_columns: player_total_columns or team_total_columns.
+        windows (list[int]): Window sizes, in games.
+        *criteria: Filters applied to the box score rows.
+        rank: func.row_number when every row is a game, func.dense_rank when a game has several rows.
+        partition_by (Column, optional): Number the rows separately per value, e.g. BoxScore.player.
+    Returns:
+        list[dict]: Totals per window, with the window size under "last_games"
+                    (and the partition value under its column name).
+    """
+    if not windows:
+        return []
+    recency = rank().over(partition_by=partition_by, order_by=BoxScore.game_id.desc())
+    ranked = select(BoxScore.__table__, recency.label("recency")).where(*criteria)
+    if partition_by is None:
+        # Only the newest max(windows) games can fall inside a window, so rank just those
+        recent_games = select(BoxScore.game_id).where(*criteria).distinct().order_by(BoxScore.game_id.desc()).limit(max(windows))
+        ranked = ranked.where(BoxScore.game_id.in_(recent_games))
+    ranked = ranked.subquery()
+    sizes = union_all(*[select(literal(x, Integer).label("last_games")) for x in windows]).subquery("windows")
+    group = [sizes.c.last_games] + ([ranked.c[partition_by.key]] if partition_by is not None else [])
+    query = (
+        session.query(*group, *[expression.label(label) for label, expression in total_columns(ranked.c).items()])
+        .select_from(ranked)
+        .join(sizes, ranked.c.recency <= sizes.c.last_games)
+        .group_by(*group)
+    )
+    return [row._asdict() for row in query.all()]
+
+def rolling_averages(totals):
+    total_games = totals["games"]
+    avg_stats = {
+        "fg_pct": totals["fg_pct"] / total_games,
+        "3p_pct": totals["3p_pct"] / total_games,
+        "ft_pct": totals["ft_pct"] / total_games,
+        "reb": totals["reb"] / total_games,
+        "assists": totals["assists"] / total_games,
+        "turnovers": totals["turnovers"] / total_games,
+        "points": totals["points"] / total_games
+    }
+    return avg_stats
+
+def team_rolling_averages(totals):
+    total_games = totals["games"]
+    avg_stats = {
+        "fg_pct": percentage(totals["fgm"], totals["fga"]),
+        "3p_pct": percentage(totals["pt3m"], totals["pt3a"]),
+        "ft_pct": percentage(totals["ftm"], totals["fta"]),
+        "reb": round(totals["reb"] / total_games, 2),
+        "assists": round(totals["assists"] / total_games, 2),
+        "turnovers": round(totals["turnovers"] / total_games, 2),
+        "points": round(totals["points"] / total_games, 2),
+        "minutes": round(totals["minutes"] / total_games, 2),
+        "offensive_rebounds": round(totals["offensive_rebounds"] / total_games, 2),
+        "defensive_rebounds": round(totals["defensive_rebounds"] / total_games, 2),
+        "personal_fouls": round(totals["personal_fouls"] / total_games, 2),
+        "blocks": round(totals["blocks"] / total_games, 2),
+        "steals": round(totals["steals"] / total_games, 2)
+    }
+    return avg_stats
+
+def percentage(made, attempted):
+    return round(made / attempted * 100, 2) if attempted else 0.0
+
+# Rolling windows precomputed per player; other window sizes are computed on request
+ROLLING_SNAPSHOT_WINDOWS = (5, 10)
+# Snapshot rows hold the same totals the box score aggregates produce. The read path
+# sums them so a player with no snapshot row comes back as zero games
+PLAYER_SNAPSHOT_COLUMNS = {label: func.coalesce(func.sum(PlayerSeasonStats.__table__.c[label]), 0) for label in PLAYER_TOTAL_COLUMNS}
+TEAM_SNAPSHOT_COLUMNS = {label: func.coalesce(func.sum(TeamSeasonStats.__table__.c[label]), 0) for label in TEAM_TOTAL_COLUMNS}
+
+@with_session
+def refresh_snapshots(game_id=None, session=None):
+    """
+    Recompute the season and rolling snapshots for every player and team in a game.
+    Only the entities that appear in the game are touched, and each is recomputed from
+    box_score, so re-ingesting a corrected box score never double counts.
+    Args:
+        game_id (int, optional): The game that was just ingested. Rebuilds every snapshot when None.
+        session (Session, optional): The SQLAlchemy session to use for the queries.
+    """
+    entities = session.query(BoxScore.player, BoxScore.team_name)
+    if game_id is not None:
+        entities = entities.filter(BoxScore.game_id == game_id)
+    entities = entities.distinct().all()
+    players = {player for player, _ in entities}
+    team_names = {team_name for _, team_name in entities}
+
+    player_totals = (
+        session.query(BoxScore.player.label("player"), *[expression.label(label) for label, expression in PLAYER_TOTAL_COLUMNS.items()])
+        .filter(BoxScore.player.in_(players))
+        .group_by(BoxScore.player)
+        .all()
+    )
+    team_totals = (
+        session.query(BoxScore.team_name.label("team_name"), *[expression.label(label) for label, expression in TEAM_TOTAL_COLUMNS.items()])
+        .filter(BoxScore.team_name.in_(team_names))
+        .group_by(BoxScore.team_name)
+        .all()
+    )
+    rolling_stats = [
+        {"player": totals["player"], "last_games": totals["last_games"], "stats": json.dumps(rolling_averages(totals))}
+        for totals in windowed_totals(
+            player_total_columns, ROLLING_SNAPSHOT_WINDOWS, BoxScore.player.in_(players),
+            partition_by=BoxScore.player, session=session
+        )
+    ]
+
+    session.query(PlayerSeasonStats).filter(PlayerSeasonStats.player.in_(players)).delete()
+    session.query(PlayerRollingStats).filter(PlayerRollingStats.player.in_(players)).delete()
+    session.query(TeamSeasonStats).filter(TeamSeasonStats.team_name.in_(team_names)).delete()
+    if player_totals:
+        session.execute(PlayerSeasonStats.__table__.insert(), [row._asdict() for row in player_totals])
+        session.execute(PlayerRollingStats.__table__.insert(), rolling_stats)
+    if team_totals:
+        session.execute(TeamSeasonStats.__table__.insert(), [row._asdict() for row in team_totals])
+    session.execute(text(BUMP_DATA_VERSION))
+    session.commit()
+
+@with_session
+def get_data_version(session=None):
+    """ The counter ingest bumps after every change, see api.cache """
+    return session.execute(text("SELECT version FROM data_version")).scalar()
+
+@with_session
+def ensure_snapshots(session=None):
+    """ Build the snapshots for a database that has box scores but has never been snapshotted """
+    if session.query(PlayerSeasonStats).first() is None and session.query(BoxScore).first() is not None:
+        refresh_snapshots(session=session)
+
+@with_session
+def get_schedule_by_player(player_name, session=None):
     """
     Retrieve the workout schedule for a player by their name.
     Args:
         player_name (str): The name of the player to search for.
-        session (Session, optional): The SQLAlchemy session to use for the query. Defaults to a new Session instance.
+        session (Session, optional): The SQLAlchemy session to use for the query. Opens a short-lived session when omitted.
     Returns:
         list[dict] or None: A list of dictionaries representing the player's workout schedule if the player is found,
                             otherwise None.
     """
     
-    player = session.query(Player).filter(Player.name.ilike(f"%{player_name}%")).first()
+    player = resolve_player(player_name, session=session)
+    player = player and get_roster_entry(player, session)
     if not player:
         return None
     schedule = session.query(Workout).filter(Workout.player == player.name).all()
     return [item.to_dict() for item in schedule]
 
-def get_schedule_by_player_for_day(player_name, scheduled_date,hour, session=Session()):
+@with_session
+def get_schedule_by_player_for_day(player_name, scheduled_date,hour, session=None):
     """
     Retrieve the workout schedule for a specific player on a given day and hour.
     Args:
         player_name (str): The name of the player to search for.
         scheduled_date (date): The date for which the schedule is being retrieved.
         hour (int): The hour of the day for which the schedule is being retrieved.
-        session (Session, optional): The SQLAlchemy session to use for the query. Defaults to a new session.
+        session (Session, optional): The SQLAlchemy session to use for the query. Opens a short-lived session when omitted.
     Returns:
         list: A list of dictionaries representing the workout schedule for the player at the specified date and hour.
                 Returns None if the player is not found.
     """
     
-    player = session.query(Player).filter(Player.name.ilike(f"%{player_name}%")).first()
-    print(player)
-    print(scheduled_date)
-    print(hour)
+    player = resolve_player(player_name, session=session)
+    player = player and get_roster_entry(player, session)
     if not player:
         return None
     schedule = session.query(Workout).filter(Workout.player == player.name).where(Workout.scheduled_date <= scheduled_date).where(Workout.hour == hour).all()
-    print(schedule)
     return [item.to_dict() for item in schedule]
 
-def add_drill_to_player_schedule(player_name, drill, scheduled_date, hour, session=Session()):
+@with_session
+def add_drill_to_player_schedule(player_name, drill, scheduled_date, hour, session=None):
     """
     Adds a drill to a player's schedule.
     Args:
@@ -186,12 +619,13 @@ def add_drill_to_player_schedule(player_name, drill, scheduled_date, hour, sessi
         drill (str): The name of the drill to be added.
         scheduled_date (str): The date when the drill is scheduled, in ISO format.
         hour (int): The hour of the day when the drill is scheduled.
-        session (Session, optional): The SQLAlchemy session to use for the database operations. Defaults to a new session.
+        session (Session, optional): The SQLAlchemy session to use for the database operations. Opens a short-lived session when omitted.
     Returns:
         dict: A dictionary representation of the newly created schedule if the player is found, otherwise None.
     """
     
-    player = session.query(Player).filter(Player.name.ilike(f"%{player_name}%")).first()
+    player = resolve_player(player_name, session=session)
+    player = player and get_roster_entry(player, session)
     if not player:
         return None
 
@@ -208,8 +642,10 @@ def add_drill_to_player_schedule(player_name, drill, scheduled_date, hour, sessi
     return new_schedule.to_dict()
 
 
-def remove_drill_from_player_schedule(player_name, drill, scheduled_date, hour, session=Session()):
-    player = session.query(Player).filter(Player.name.ilike(f"%{player_name}%")).first()
+@with_session
+def remove_drill_from_player_schedule(player_name, drill, scheduled_date, hour, session=None):
+    player = resolve_player(player_name, session=session)
+    player = player and get_roster_entry(player, session)
     if not player:
         return None
 
@@ -228,27 +664,38 @@ def remove_drill_from_player_schedule(player_name, drill, scheduled_date, hour,
     return schedule_item.to_dict()
 
 
-def get_drills(session=Session()):
+@with_session
+def get_drills(session=None):
     drills = session.query(Drill).all()
     return [drill.to_dict() for drill in drills]
 
-def get_drills_by_category(category, session=Session()):
+@with_session
+def get_drills_by_category(category, session=None):
     drills = session.query(Drill).filter(Drill.category.ilike(f"%{category}%")).all()
     return [drill.to_dict() for drill in drills]
 
-def get_drill_by_name(drill_name, session=Session()):
+@with_session
+def get_drill_by_name(drill_name, session=None):
     drill = session.query(Drill).filter(Drill.name.ilike(f"%{drill_name}%")).first()
     if drill:
         return drill.to_dict()
     return None
 
-def get_box_score_by_player(player_name, session=Session()):
-    return session.query(BoxScore).filter(BoxScore.player.ilike(f"%{player_name}%")).all()
+@with_session
+def get_box_score_by_player(player_name, session=None):
+    player = resolve_player(player_name, session=session)
+    if not player:
+        return []
+    return session.query(BoxScore).filter(box_score_player(player)).all()
 
-def get_last_x_games(player_name, x=5, session=Session()):
+@with_session
+def get_last_x_games(player_name, x=5, session=None):
+    player = resolve_player(player_name, session=session)
+    if not player:
+        return []
     last_games = (
         session.query(BoxScore)
-        .filter(BoxScore.player.ilike(f"%{player_name}%"))
+        .filter(box_score_player(player))
         .order_by(BoxScore.game_id.desc())  # Latest games first
         .limit(x)
         .all()
@@ -257,25 +704,78 @@ def get_last_x_games(player_name, x=5, session=Session()):
     [u.pop('_sa_instance_state', None) for u in result ]
     return last_games
     
-def get_rolling_averages(player_name, x=5, session=Session()):
-    games = get_last_x_games(player_name, x)
-    if not games:
-        return None
+@with_session
+def get_rolling_averages(player_name, x=5, session=None):
+    return get_rolling_averages_for_windows(player_name, [x], session=session).get(x)
 
-    total_games = len(games)
-    avg_stats = {
-        "fg_pct": sum(int(g.fg.split('-')[0]) / int(g.fg.split('-')[1]) for g in games if int(g.fg.split('-')[1]) > 0) / total_games,
-        "3p_pct": sum(int(g.pt3.split('-')[0]) / int(g.pt3.split('-')[1]) for g in games if int(g.pt3.split('-')[1]) > 0) / total_games,
-        "ft_pct": sum(int(g.ft.split('-')[0]) / max(1, int(g.ft.split('-')[1])) for g in games) / total_games,  # Avoid division by zero
-        "reb": sum(int(g.reb) for g in games) / total_games,
-        "assists": sum(int(g.a) for g in games) / total_games,
-        "turnovers": sum(int(g.trn) for g in games) / total_games,
-        "points": sum(int(g.pts) for g in games) / total_games
+@with_session
+def get_rolling_averages_for_windows(player_name, windows=ROLLING_SNAPSHOT_WINDOWS, session=None):
+    """
+    Rolling averages over the player's last x games for several values of x at once.
+    Served from the snapshot when every window is precomputed, otherwise computed in a
+    single window-function query.
+    Args:
+        player_name (str or PlayerKey): The name of the player to search for.
+        windows (list[int], optional): Window sizes, in games. Defaults to ROLLING_SNAPSHOT_WINDOWS.
+        session (Session, optional): The SQLAlchemy session to use for the query.
+    Returns:
+        dict: Window size -> averages. Window sizes with no games are left out.
+    """
+    player = resolve_player(player_name, session=session)
+    if not player:
+        return {}
+    windows = sorted(set(windows))
+    if set(windows) <= set(ROLLING_SNAPSHOT_WINDOWS):
+        snapshots = (
+            session.query(PlayerRollingStats)
+            .filter(PlayerRollingStats.player == player.name)
+            .filter(PlayerRollingStats.last_games.in_(windows))
+            .all()
+        )
+        if len(snapshots) == len(windows):
+            return {snapshot.last_games: json.loads(snapshot.stats) for snapshot in snapshots}
+    return {
+        totals["last_games"]: rolling_averages(totals)
+        for totals in windowed_totals(player_total_columns, windows, box_score_player(player), session=session)
     }
-    return avg_stats
 
-def get_player(player_name, session=Session()):
-    player = session.query(Player).filter(Player.name.ilike(f"%{player_name}%")).first()
+@with_session
+def get_rolling_series(player_name, x=5, session=None):
+    """
+    Per-game rolling averages over the trailing x games, oldest game first, for trend charts.
+    Args:
+        player_name (str): The name of the player to search for.
+        x (int, optional): Window size, in games. Defaults to 5.
+        session (Session, optional): The SQLAlchemy session to use for the query.
+    Returns:
+        list[dict]: One entry per game with its game_id, date, opponent and rolling averages.
+    """
+    player = resolve_player(player_name, session=session)
+    if not player:
+        return []
+    frame = {"partition_by": BoxScore.player, "order_by": BoxScore.game_id, "rows": (-(x - 1), 0)}
+    columns = {"games": func.count().over(**frame)}
+    columns.update({label: func.coalesce(func.sum(value).over(**frame), 0) for label, value in player_game_values(BoxScore).items()})
+    series = (
+        select(BoxScore.game_id, BoxScore.player, *[expression.label(label) for label, expression in columns.items()])
+        .where(box_score_player(player))
+        .subquery()
+    )
+    results = (
+        session.query(series, Schedule.date, Schedule.opponent)
+        .outerjoin(Schedule, Schedule.game_id == series.c.game_id)
+        .order_by(series.c.game_id, series.c.player)
+        .all()
+    )
+    return [
+        {"game_id": row.game_id, "player": row.player, "date": row.date, "opponent": row.opponent, **rolling_averages(row._asdict())}
+        for row in results
+    ]
+
+@with_session
+def get_player(player_name, session=None):
+    player = resolve_player(player_name, session=session)
+    player = player and get_roster_entry(player, session)
     if player:
         return {
             "name": player.name,
@@ -289,49 +789,93 @@ def get_player(player_name, session=Session()):
         }
     return None
 
-def get_season_averages(player_name, session=Session()):
-    games = get_box_score_by_player(player_name)
-    if not games:
+@with_session
+def get_season_averages(player_name, session=None):
+    player = resolve_player(player_name, session=session)
+    if not player:
+        return None
+    return season_averages(aggregate_stats(PLAYER_SNAPSHOT_COLUMNS, PlayerSeasonStats.player == player.name, session=session))
+
+@with_session
+def get_season_averages_for_players(player_names, session=None):
+    """
+    get_season_averages for many players with one grouped query over the season snapshots.
+    Args:
+        player_names (list[str] or str): Names to search for, or "all" for everyone on the roster.
+        session (Session, optional): The SQLAlchemy session to use for the queries.
+    Returns:
+        dict: Requested name (the player's name for "all") -> averages, or None when there is no data.
+    """
+    players = resolve_players(player_names, session=session)
+    names = {player.name for player in players.values() if player}
+    totals = (
+        session.query(PlayerSeasonStats.player.label("player"), *[expression.label(label) for label, expression in PLAYER_SNAPSHOT_COLUMNS.items()])
+        .filter(PlayerSeasonStats.player.in_(names))
+        .group_by(PlayerSeasonStats.player)
+        .all()
+    )
+    averages = {row.player: season_averages(row._asdict()) for row in totals}
+    return {name: averages.get(player.name) if player else None for name, player in players.items()}
+
+def season_averages(totals):
+    total_games = totals["games"]
+    if not total_games:
         return None
 
-    total_games = len(games)
     avg_stats = {
-        "fg_pct": round(sum(int(g.fg.split('-')[0]) / int(g.fg.split('-')[1]) for g in games if int(g.fg.split('-')[1]) > 0) / total_games * 100, 2),
-        "3p_pct": round(sum(int(g.pt3.split('-')[0]) / int(g.pt3.split('-')[1]) for g in games if int(g.pt3.split('-')[1]) > 0) / total_games * 100, 2),
-        "ft_pct": round(sum(int(g.ft.split('-')[0]) / max(1, int(g.ft.split('-')[1])) for g in games) / total_games * 100, 2),  
-        "reb": round(sum(int(g.reb) for g in games) / total_games, 2),
-        "assists": round(sum(int(g.a) for g in games) / total_games, 2),
-        "turnovers": round(sum(int(g.trn) for g in games) / total_games, 2),
-        "points": round(sum(int(g.pts) for g in games) / total_games, 2),
-        "minutes": round(sum(int(g.min) for g in games) / total_games, 2),
-        "offensive_rebounds": round(sum(int(g.orb_drb.split('-')[0]) for g in games) / total_games, 2),
-        "defensive_rebounds": round(sum(int(g.orb_drb.split('-')[1]) for g in games) / total_games, 2),
-        "personal_fouls": round(sum(int(g.pf) for g in games) / total_games, 2),
-        "blocks": round(sum(int(g.blk) for g in games) / total_games, 2),
-        "steals": round(sum(int(g.stl) for g in games) / total_games, 2)
+        "fg_pct": round(totals["fg_pct"] / total_games * 100, 2),
+        "3p_pct": round(totals["3p_pct"] / total_games * 100, 2),
+        "ft_pct": round(totals["ft_pct"] / total_games * 100, 2),
+        "reb": round(totals["reb"] / total_games, 2),
+        "assists": round(totals["assists"] / total_games, 2),
+        "turnovers": round(totals["turnovers"] / total_games, 2),
+        "points": round(totals["points"] / total_games, 2),
+        "minutes": round(totals["minutes"] / total_games, 2),
+        "offensive_rebounds": round(totals["offensive_rebounds"] / total_games, 2),
+        "defensive_rebounds": round(totals["defensive_rebounds"] / total_games, 2),
+        "personal_fouls": round(totals["personal_fouls"] / total_games, 2),
+        "blocks": round(totals["blocks"] / total_games, 2),
+        "steals": round(totals["steals"] / total_games, 2)
     }
     return avg_stats
-def get_best_scoring_game(player_name, session=Session()):
-    return session.query(BoxScore).filter(BoxScore.player == player_name).order_by(BoxScore.pts.desc()).first()
-
-def get_worst_scoring_game(player_name, session=Session()):
-    return session.query(BoxScore).filter(BoxScore.player == player_name).order_by(BoxScore.pts.asc()).first()
-
-def get_high_turnover_games(player_name, threshold=3, session=Session()):
-    return session.query(BoxScore).filter(BoxScore.player == player_name, BoxScore.trn >= threshold).all()
-
-def get_high_3pt_games(player_name, threshold=0.4, session=Session()):
-    high_3pt_games = []
-    all_games = session.query(BoxScore).filter(BoxScore.player == player_name).all()
-    for game in all_games:
-        if int(game.pt3.split('-')[1]) > 0:  # Ensure there were 3-point attempts
-            three_pt_percentage = int(game.pt3.split('-')[0]) / int(game.pt3.split('-')[1])
-            if three_pt_percentage >= threshold:
-                high_3pt_games.append(game)
-    return high_3pt_games
+
+@with_session
+def get_best_scoring_game(player_name, session=None):
+    player = resolve_player(player_name, session=session)
+    if not player:
+        return None
+    return session.query(BoxScore).filter(box_score_player(player)).order_by(cast(BoxScore.pts, Integer).desc(), BoxScore.game_id).first()
+
+@with_session
+def get_worst_scoring_game(player_name, session=None):
+    player = resolve_player(player_name, session=session)
+    if not player:
+        return None
+    return session.query(BoxScore).filter(box_score_player(player)).order_by(cast(BoxScore.pts, Integer).asc(), BoxScore.game_id).first()
+
+@with_session
+def get_high_turnover_games(player_name, threshold=3, session=None):
+    player = resolve_player(player_name, session=session)
+    if not player:
+        return []
+    return session.query(BoxScore).filter(box_score_player(player), cast(BoxScore.trn, Integer) >= threshold).all()
+
+@with_session
+def get_high_3pt_games(player_name, threshold=0.4, session=None):
+    player = resolve_player(player_name, session=session)
+    if not player:
+        return []
+    return (
+        session.query(BoxScore)
+        .filter(box_score_player(player))
+        .filter(BoxScore.pt3a > 0)  # Ensure there were 3-point attempts
+        .filter(BoxScore.pt3m * 1.0 / BoxScore.pt3a >= threshold)
+        .all()
+    )
     
-def generate_training_recommendations(player_name):
-    stats = get_season_averages(player_name)
+@with_session
+def generate_training_recommendations(player_name, session=None):
+    stats = get_season_averages(player_name, session=session)
     if not stats:
         return "No data available for training recommendations."
 
@@ -362,14 +906,11 @@ def generate_training_recommendations(player_name):
 
 
 
-def get_ai_recommendations(player_name):
-    # Initialize the OpenAI LLM with your
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
-
-    # Define a prompt template
-    prompt_template = PromptTemplate(
-        input_variables=["player_name", "season_averages", "rolling_averages", "best_game", "worst_game", "high_turnover_games", "high_3pt_games"],
-        template="""
+# Changing any of these changes every recommendation fingerprint, so stale answers are not reused
+RECOMMENDATION_MODEL = "gpt-4o"
+# Size the formatted prompt is kept under, in tokens; older games are summarized past it (see api.prompt_format)
+RECOMMENDATION_TOKEN_BUDGET = int(os.environ.get("BBTRACKER_PROMPT_TOKEN_BUDGET", 3000))
+RECOMMENDATION_PROMPT = """
         Based on the following statistics for the player {player_name} and the team stats, provide training recommendations:
         Your training recommendations should include the exact drills and exercises to be performed, the number of repetitions, and the duration of each drill and your rationale for each recommendation.
         try to keep the recommendations to 3 drills or less. focus on the most important areas of improvement. Give a general perfomance summary first
@@ -380,7 +921,7 @@ def get_ai_recommendations(player_name):
         Player Information:
         {player_data}
         
-        Player Stats by game:
+        Player Stats by game (oldest first; gs * = started, o-d = offensive-defensive rebounds):
         {player_stats}
         
         Season Averages:
@@ -413,75 +954,298 @@ def get_ai_recommendations(player_name):
         team rolling averages last 10 games:
         {team_rolling_averages_10}
 
-        Training Recommendations:
+        Answer with a JSON object: "summary" is the general performance summary, and "drills" lists the
+        recommended drills, each with the "drill_id" it has in the list above (#id), the "reps" (sets and
+        repetitions), the "duration" and the "rationale" for recommending it.
         """
+
+# Sent as the response_format, so the model's answer is guaranteed to parse into this shape
+RECOMMENDATION_SCHEMA = {
+    "name": "training_recommendations",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "summary": {"type": "string"},
+            "drills": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "drill_id": {"type": "integer"},
+                        "reps": {"type": "string"},
+                        "duration": {"type": "string"},
+                        "rationale": {"type": "string"},
+                    },
+                    "required": ["drill_id", "reps", "duration", "rationale"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["summary", "drills"],
+        "additionalProperties": False,
+    },
+}
+
+@functools.cache
+def recommendation_chain():
+    """
+    The inputs -> compact prompt -> ChatGPT -> JSON chain that writes the training recommendations, built once.
+    The answer is a RECOMMENDATION_SCHEMA dict; streamed, each chunk is the answer parsed so far.
+    """
+    from langchain_core.output_parsers import JsonOutputParser
+    from langchain_core.prompts import PromptTemplate
+    from langchain_core.runnables import RunnableLambda
+    from langchain_openai import ChatOpenAI
+
+    from api.prompt_format import compact_prompt_inputs
+    llm = ChatOpenAI(model=RECOMMENDATION_MODEL, temperature=0).bind(response_format={"type": "json_schema", "json_schema": RECOMMENDATION_SCHEMA})
+    prompt_template = PromptTemplate(
+        input_variables=["player_name", "season_averages", "rolling_averages", "best_game", "worst_game", "high_turnover_games", "high_3pt_games"],
+        template=RECOMMENDATION_PROMPT,
     )
+    return RunnableLambda(compact_prompt_inputs) | prompt_template | llm | JsonOutputParser()
 
-    # Fetch data from the database
-
-    player_data = get_player(player_name)
-    player_stats=get_games_played(player_name)
-    season_averages = get_season_averages(player_name)
-    rolling_averages_5 = get_rolling_averages(player_name)
-    rolling_averages_10 = get_rolling_averages(player_name, 10)
-    best_game = get_best_scoring_game(player_name).__dict__
-    worst_game = get_worst_scoring_game(player_name).__dict__
-    high_turnover_games = [game.__dict__ for game in get_high_turnover_games(player_name)]
-    high_3pt_games = [game.__dict__ for game in get_high_3pt_games(player_name)]
-    drills = get_drills()
-    team_stats = get_team_stats()
-    team_rolling_averages_5 = get_team_rolling_averages()
-    team_rolling_averages_10 = get_team_rolling_averages(10)
-
-    # # Format the prompt
-    # prompt = prompt_template.format(
-    #     player_name=player_name,
-    #     season_averages=season_averages,
-    #     rolling_averages=rolling_averages,
-    #     best_game=best_game,
-    #     worst_game=worst_game,
-    #     high_turnover_games=high_turnover_games,
-    #     high_3pt_games=high_3pt_games
-    # )
-
-    # Get the training recommendations from ChatGPT
-    chain = prompt_template | llm | StrOutputParser()
-    recommendations = chain.invoke({
-        "player_name": player_name,
-        "player_stats": player_stats,
-        "player_data": player_data,
-        "season_averages": season_averages,
-        "rolling_averages_5": rolling_averages_5,
-        "rolling_averages_10": rolling_averages_10,
-        "best_game": best_game,
-        "worst_game": worst_game,
-        "high_turnover_games": high_turnover_games,
-        "high_3pt_games": high_3pt_games,
-        "drills": drills,
-        "team_stats": team_stats,
-        "team_rolling_averages_5": team_rolling_averages_5,
-        "team_rolling_averages_10": team_rolling_averages_10
-    })
-
-    # print("\nTraining Recommendations from ChatGPT:")
-    recommendations_list = recommendations.split("Training Recommendations")[1].strip().split("\n")
-    drill_names = []
-    
-    for line in recommendations_list:
-        if any(drill["name"] in line for drill in drills):
-            drill_names.append(line.strip())
-            cleaned_drill_names = [drill.split("**")[1] for drill in drill_names]
-    result ={"recommendations": recommendations, "recommended_drills": cleaned_drill_names}
+def recommendation_fingerprint(inputs):
+    """
+    Hash of the model, the prompt and its inputs. The chain runs at temperature 0, so two calls
+    with the same fingerprint would get the same answer and the stored one can be reused.
+    """
+    payload = json.dumps([RECOMMENDATION_MODEL, RECOMMENDATION_PROMPT, RECOMMENDATION_SCHEMA, RECOMMENDATION_TOKEN_BUDGET, inputs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+@with_session
+def get_cached_recommendations(fingerprint, session=None):
+    cached = session.get(CachedRecommendation, fingerprint)
+    return json.loads(cached.result) if cached else None
+
+@with_session
+def store_recommendations(fingerprint, player_name, result, session=None):
+    """
+    Store a player's answer. Every ingest changes the team stats in every player's prompt, so older
+    answers would never be looked up again: only the latest one per player is kept.
+    Args:
+        player_name (str): The resolved name (inputs["player_name"]), so a player has one row whatever was typed.
+    """
+    session.query(CachedRecommendation).filter(CachedRecommendation.player == player_name, CachedRecommendation.fingerprint != fingerprint).delete()
+    session.merge(CachedRecommendation(fingerprint=fingerprint, player=player_name, result=json.dumps(result), created_at=datetime.now()))
+    session.commit()
+
+# Window sizes in the recommendation prompt, and the thresholds its game lists use
+RECOMMENDATION_WINDOWS = (5, 10)
+HIGH_TURNOVER_THRESHOLD = 3
+HIGH_3PT_THRESHOLD = 0.4
+LEADING_INTEGER = re.compile(r"\s*[+-]?\d+")
+
+def as_int(value):
+    """ CAST(value AS INTEGER) in Python: the leading integer of a text value ("0+" -> 0), else 0 """
+    if value is None or isinstance(value, int):
+        return value or 0
+    if value.isdigit():
+        return int(value)
+    match = LEADING_INTEGER.match(value)
+    return int(match.group()) if match else 0
+
+def player_totals_in_memory(box_scores):
+    """ player_total_columns over box score rows (as dicts) that are already loaded """
+    totals = {"games": len(box_scores), "fg_pct": 0.0, "3p_pct": 0.0, "ft_pct": 0.0}
+    totals.update({name: 0 for name in COUNTING_STATS})
+    for box in box_scores:
+        if box["fga"]:
+            totals["fg_pct"] += (box["fgm"] or 0) / box["fga"]
+        if box["pt3a"]:
+            totals["3p_pct"] += (box["pt3m"] or 0) / box["pt3a"]
+        totals["ft_pct"] += (box["ftm"] or 0) / max(1, box["fta"] or 0)
+        for name, column in COUNTING_STATS.items():
+            totals[name] += as_int(box[column])
+    return totals
+
+def team_totals_in_memory(box_scores):
+    """ team_total_columns over box score rows (as dicts) that are already loaded """
+    totals = {"games": len({box["game_id"] for box in box_scores})}
+    for column in ("fgm", "fga", "pt3m", "pt3a", "ftm", "fta"):
+        totals[column] = sum(box[column] or 0 for box in box_scores)
+    totals.update({name: sum(as_int(box[column]) for box in box_scores) for name, column in COUNTING_STATS.items()})
+    return totals
+
+# Loaded as plain rows rather than ORM objects: the context builder reads every attribute of
+# every row, and going through the instrumented attributes cost more than the queries
+BOX_SCORE_COLUMNS = list(BoxScore.__table__.columns)
+BOX_SCORE_KEYS = [column.key for column in BOX_SCORE_COLUMNS]
+SCHEDULE_COLUMNS = [column.label(f"schedule_{column.key}") for column in Schedule.__table__.columns]
+SCHEDULE_KEYS = [column.key for column in Schedule.__table__.columns]
+
+class StageTimer:
+    """ Wall time and number of SQL statements per stage of a multi-query helper """
+    def __init__(self, session):
+        self.connection = session.connection()
+        self.queries = 0
+        self.stages = []
+        event.listen(self.connection, "before_cursor_execute", self.count_query)
+
+    def count_query(self, *args):
+        self.queries += 1
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start, queries = time.perf_counter(), self.queries
+        yield
+        self.stages.append({"stage": name, "ms": (time.perf_counter() - start) * 1000, "queries": self.queries - queries})
+
+    def close(self):
+        event.remove(self.connection, "before_cursor_execute", self.count_query)
+
+@with_session
+def get_recommendation_inputs(player_name, timings=None, session=None):
+    """
+    Fetch everything the recommendation prompt needs. The player's box scores and the team's
+    most recent games are each loaded once; the game list, season and rolling averages,
+    best/worst games and the high turnover/3-point games are all derived from those rows.
+    Args:
+        player_name (str or PlayerKey): The name of the player to search for.
+        timings (list, optional): If given, a {"stage", "ms", "queries"} dict is appended per stage.
+        session (Session, optional): The SQLAlchemy session to use for the queries.
+    Returns:
+        dict: The prompt's input variables, or None if no player matches player_name.
+    """
+    timer = StageTimer(session)
+    try:
+        with timer.stage("player"):
+            player = resolve_player(player_name, session=session)
+            if player is None:
+                return None
+            player_data = get_player(player, session=session)
+        with timer.stage("player_box_scores"):
+            games = []
+            for row in session.execute(
+                select(*BOX_SCORE_COLUMNS, *SCHEDULE_COLUMNS)
+                .outerjoin(Schedule, BoxScore.game_id == Schedule.game_id)
+                .where(box_score_player(player))
+                .order_by(BoxScore.game_id)
+            ):
+                box = dict(zip(BOX_SCORE_KEYS, row[:len(BOX_SCORE_KEYS)]))
+                schedule = dict(zip(SCHEDULE_KEYS, row[len(BOX_SCORE_KEYS):]))
+                games.append((box, schedule if schedule["game_id"] is not None else None))
+        with timer.stage("team_box_scores"):
+            recent_games = (
+                select(BoxScore.game_id).where(*TEAM_PLAYER_ROWS).distinct()
+                .order_by(BoxScore.game_id.desc()).limit(max(RECOMMENDATION_WINDOWS))
+            )
+            team_box_scores = [
+                dict(zip(BOX_SCORE_KEYS, row))
+                for row in session.execute(select(*BOX_SCORE_COLUMNS).where(*TEAM_PLAYER_ROWS, BoxScore.game_id.in_(recent_games)))
+            ]
+            team_stats = get_team_stats(session=session)
+        with timer.stage("drills"):
+            drills = get_drills(session=session)
+        with timer.stage("derive"):
+            box_scores = [box for box, _ in games]  # Oldest first
+            newest_first = box_scores[::-1]
+            played = sorted(
+                ((box, schedule) for box, schedule in games if schedule is not None),
+                key=lambda game: (game[1]["date"] is not None, game[1]["date"] or datetime.min.date(), game[0]["game_id"]),
+            )
+            team_game_ids = sorted({box["game_id"] for box in team_box_scores}, reverse=True)
+            team_rolling = {
+                x: team_rolling_averages(team_totals_in_memory([box for box in team_box_scores if box["game_id"] in team_game_ids[:x]]))
+                for x in RECOMMENDATION_WINDOWS if team_game_ids
+            }
+            # max/min keep the earliest game on ties, like the ORDER BY ..., game_id in the helpers
+            best_game = max(box_scores, key=lambda box: as_int(box["pts"]), default=None)
+            worst_game = min(box_scores, key=lambda box: as_int(box["pts"]), default=None)
+            inputs = {
+                "player_name": player.name,
+                "player_stats": [{"BoxScore": box, "Schedule": schedule} for box, schedule in played],
+                "player_data": player_data,
+                "season_averages": season_averages(player_totals_in_memory(box_scores)),
+                "rolling_averages_5": rolling_averages(player_totals_in_memory(newest_first[:5])) if box_scores else None,
+                "rolling_averages_10": rolling_averages(player_totals_in_memory(newest_first[:10])) if box_scores else None,
+                "best_game": best_game,
+                "worst_game": worst_game,
+                "high_turnover_games": [box for box in box_scores if as_int(box["trn"]) >= HIGH_TURNOVER_THRESHOLD],
+                "high_3pt_games": [box for box in box_scores if box["pt3a"] and (box["pt3m"] or 0) / box["pt3a"] >= HIGH_3PT_THRESHOLD],
+                "drills": drills,
+                "team_stats": team_stats,
+                "team_rolling_averages_5": team_rolling.get(5),
+                "team_rolling_averages_10": team_rolling.get(10),
+            }
+    finally:
+        timer.close()
+    if timings is not None:
+        timings.extend(timer.stages)
+    return inputs
+
+def index_drills(drills):
+    """ {drill id: drill} and {lower-case drill name: drill}, so each recommended drill is one lookup """
+    return {drill["id"]: drill for drill in drills}, {drill["name"].lower(): drill for drill in drills}
+
+MARKDOWN_BOLD = re.compile(r"\*\*(.+?)\*\*")
+
+def parse_recommendations(recommendations, drills):
+    """
+    Turn the model's answer (see RECOMMENDATION_SCHEMA) into the endpoint's payload.
+    Drills are matched by id, or by name for an answer without ids; unknown ones are dropped
+    rather than failing, so a malformed answer still returns its text instead of being re-requested.
+    Args:
+        recommendations (dict or str): The answer as recommendation_chain parses it, or the model's text.
+                                       Anything else (None for no answer) is taken as text without drills.
+        drills (list): The drills offered in the prompt, as get_drills returns them.
+    Returns:
+        dict: "recommendations" (markdown for display), "recommended_drills" (drill names) and
+              "drills" ({"id", "name", "reps", "duration", "rationale"} per recommended drill).
+    """
+    by_id, by_name = index_drills(drills)
+    answer = recommendations
+    if not isinstance(recommendations, (dict, str)):
+        recommendations = "" if recommendations is None else str(recommendations)
+    if isinstance(recommendations, str):
+        try:
+            answer = json.loads(recommendations)
+        except ValueError:
+            answer = None
+    if not isinstance(answer, dict):
+        # Free-text answer (e.g. from a model without structured output): the drills are the **bold** names
+        matched = [by_name.get(name.strip().lower()) for name in MARKDOWN_BOLD.findall(recommendations)]
+        recommended = [{"id": drill["id"], "name": drill["name"], "reps": drill["sets_reps"], "duration": None, "rationale": None} for drill in matched if drill]
+        return {"recommendations": recommendations, "recommended_drills": [drill["name"] for drill in recommended], "drills": recommended}
+
+    recommended = []
+    for item in answer.get("drills") or []:
+        if not isinstance(item, dict):
+            continue
+        drill = by_id.get(item.get("drill_id")) or by_name.get(str(item.get("name", "")).lower())
+        if drill:
+            recommended.append({"id": drill["id"], "name": drill["name"], "reps": item.get("reps"), "duration": item.get("duration"), "rationale": item.get("rationale")})
+    lines = [answer.get("summary") or "", "", "Training Recommendations:"]
+    for number, drill in enumerate(recommended, 1):
+        lines.append(f"{number}. **{drill['name']}** - {drill['reps']}, {drill['duration']}. {drill['rationale']}")
+    return {"recommendations": "\n".join(lines), "recommended_drills": [drill["name"] for drill in recommended], "drills": recommended}
+
+@with_session
+def get_ai_recommendations(player_name, session=None):
+    inputs = get_recommendation_inputs(player_name, session=session)
+    if inputs is None:
+        return None
+    fingerprint = recommendation_fingerprint(inputs)
+    result = get_cached_recommendations(fingerprint, session=session)
+    if result is None:
+        # Get the training recommendations from ChatGPT
+        recommendations = recommendation_chain().invoke(inputs)
+        result = parse_recommendations(recommendations, inputs["drills"])
+        store_recommendations(fingerprint, inputs["player_name"], result, session=session)
     return result
 
 # print(get_ai_recommendations("Gregory Spurlock"))
 
-def get_games_played(player_name, session=Session()):
-    # return
+@with_session
+def get_games_played(player_name, session=None):
+    player = resolve_player(player_name, session=session)
+    if not player:
+        return []
     results = (
         session.query(BoxScore, Schedule)
         .join(Schedule, BoxScore.game_id == Schedule.game_id)
-        .filter(BoxScore.player == player_name)
+        .filter(box_score_player(player))
         .order_by(Schedule.date)
         .all()
     )
@@ -493,70 +1257,93 @@ def get_games_played(player_name, session=Session()):
         result["Schedule"].pop('_sa_instance_state', None)
     return results
 
-def schedule_with_box_score(player_name, session=Session()):
-    results = (
-        session.query(Schedule)
-        .order_by(Schedule.date)
+@with_session
+def schedule_with_box_score(player_name, session=None):
+    """
+    The full schedule, with the player's box score rows attached to each game that has one.
+    Schedule and box scores come back from a single outer join and are grouped per game here.
+    Args:
+        player_name (str or PlayerKey): The name of the player to search for.
+        session (Session, optional): The SQLAlchemy session to use for the query.
+    Returns:
+        list[dict]: Schedule rows ordered by date, with a "BoxScore" list on games the player played.
+    """
+    player = resolve_player(player_name, session=session)
+    played = and_(
+        BoxScore.game_id == Schedule.game_id,
+        func.coalesce(Schedule.box_score_link, "") != "",
+        box_score_player(player) if player else false(),
+    )
+    rows = (
+        session.query(Schedule, BoxScore)
+        .outerjoin(BoxScore, played)
+        .order_by(Schedule.date, Schedule.game_id)
         .all()
     )
-    results = [u.__dict__ for u in results]
-    for result in results:
+    results = {}
+    for schedule, box_score in rows:
+        result = results.setdefault(schedule.game_id, schedule.__dict__)
         result.pop('_sa_instance_state', None)
-        if result["box_score_link"]:
-            box_score = session.query(BoxScore).filter(BoxScore.game_id == result["game_id"], BoxScore.player == player_name).all()
-            if box_score:
-                result["BoxScore"] = [bs.__dict__ for bs in box_score]
-                for bs in result["BoxScore"]:
-                    bs.pop('_sa_instance_state', None)
-    return results
+        if box_score is not None:
+            box_score = box_score.__dict__
+            box_score.pop('_sa_instance_state', None)
+            result.setdefault("BoxScore", []).append(box_score)
+    return list(results.values())
 
-def get_all_players(session=Session()):
+@with_session
+def get_all_players(session=None):
     players = session.query(Player).all()
     return [player.name for player in players]
 
-def get_team_stats(session=Session()):
-    games = session.query(BoxScore).filter(BoxScore.team_name == "Claflin").all()
-    if not games:
+@with_session
+def get_team_stats(session=None):
+    totals = aggregate_stats(TEAM_SNAPSHOT_COLUMNS, TeamSeasonStats.team_name == "Claflin", session=session)
+    total_games = totals["games"]
+    if not total_games:
         return None
-    total_games = len(set(game.game_id for game in games))
     team_stats = {
-        "fg_pct": round(sum(int(g.fg.split('-')[0]) for g in games) / sum(int(g.fg.split('-')[1]) for g in games) * 100, 2),
-        "3p_pct": round(sum(int(g.pt3.split('-')[0]) for g in games) / sum(int(g.pt3.split('-')[1]) for g in games) * 100, 2),
-        "ft_pct": round(sum(int(g.ft.split('-')[0]) for g in games) / sum(int(g.ft.split('-')[1]) for g in games) * 100, 2),
-        "reb": round(sum(int(g.reb) for g in games) / total_games, 2),
-        "assists": round(sum(int(g.a) for g in games) / total_games, 2),
-        "turnovers": round(sum(int(g.trn) for g in games) / total_games, 2),
-        "points": round(sum(int(g.pts) for g in games) / total_games, 2),
-        "offensive_rebounds": round(sum(int(g.orb_drb.split('-')[0]) for g in games) / total_games, 2),
-        "defensive_rebounds": round(sum(int(g.orb_drb.split('-')[1]) for g in games) / total_games, 2),
-        "personal_fouls": round(sum(int(g.pf) for g in games) / total_games, 2),
-        "blocks": round(sum(int(g.blk) for g in games) / total_games, 2),
-        "steals": round(sum(int(g.stl) for g in games) / total_games, 2)
+        "fg_pct": percentage(totals["fgm"], totals["fga"]),
+        "3p_pct": percentage(totals["pt3m"], totals["pt3a"]),
+        "ft_pct": percentage(totals["ftm"], totals["fta"]),
+        "reb": round(totals["reb"] / total_games, 2),
+        "assists": round(totals["assists"] / total_games, 2),
+        "turnovers": round(totals["turnovers"] / total_games, 2),
+        "points": round(totals["points"] / total_games, 2),
+        "offensive_rebounds": round(totals["offensive_rebounds"] / total_games, 2),
+        "defensive_rebounds": round(totals["defensive_rebounds"] / total_games, 2),
+        "personal_fouls": round(totals["personal_fouls"] / total_games, 2),
+        "blocks": round(totals["blocks"] / total_games, 2),
+        "steals": round(totals["steals"] / total_games, 2)
     }
     return team_stats
 
-def get_team_rolling_averages(x=5, session=Session()):
-    games = session.query(BoxScore).filter(BoxScore.team_name == "Claflin").filter(BoxScore.player != "TEAM").order_by(BoxScore.game_id.desc()).limit(x).all()
-    if not games:
-        return None
+@with_session
+def get_team_rolling_averages(x=5, session=None):
+    return get_team_rolling_averages_for_windows([x], session=session).get(x)
 
-    total_games = len(set(game.game_id for game in games))
-    avg_stats = {
-        "fg_pct": round(sum(int(g.fg.split('-')[0]) for g in games) / sum(int(g.fg.split('-')[1]) for g in games) * 100, 2),
-        "3p_pct": round(sum(int(g.pt3.split('-')[0]) for g in games) / sum(int(g.pt3.split('-')[1]) for g in games) * 100, 2),
-        "ft_pct": round(sum(int(g.ft.split('-')[0]) for g in games) / sum(int(g.ft.split('-')[1]) for g in games) * 100, 2),
-        "reb": round(sum(int(g.reb) for g in games) / total_games, 2),
-        "assists": round(sum(int(g.a) for g in games) / total_games, 2),
-        "turnovers": round(sum(int(g.trn) for g in games) / total_games, 2),
-        "points": round(sum(int(g.pts) for g in games) / total_games, 2),
-        "minutes": round(sum(int(g.min) for g in games) / total_games, 2),
-        "offensive_rebounds": round(sum(int(g.orb_drb.split('-')[0]) for g in games) / total_games, 2),
-        "defensive_rebounds": round(sum(int(g.orb_drb.split('-')[1]) for g in games) / total_games, 2),
-        "personal_fouls": round(sum(int(g.pf) for g in games) / total_games, 2),
-        "blocks": round(sum(int(g.blk) for g in games) / total_games, 2),
-        "steals": round(sum(int(g.stl) for g in games) / total_games, 2)
+@with_session
+def get_team_rolling_averages_for_windows(windows=ROLLING_SNAPSHOT_WINDOWS, session=None):
+    """
+    Team averages over the last x games for several values of x, in one window-function query.
+    Args:
+        windows (list[int], optional): Window sizes, in games. Defaults to ROLLING_SNAPSHOT_WINDOWS.
+        session (Session, optional): The SQLAlchemy session to use for the query.
+    Returns:
+        dict: Window size -> averages. Window sizes with no games are left out.
+    """
+    return {
+        totals["last_games"]: team_rolling_averages(totals)
+        for totals in windowed_totals(
+            team_total_columns, sorted(set(windows)), *TEAM_PLAYER_ROWS,
+            rank=func.dense_rank, session=session
+        )
     }
-    return avg_stats
-    return avg_stats
 
+def init_database():
+    """ The startup step for the API and the migrate command: the schema, then any missing snapshots """
+    create_schema()
+    ensure_snapshots()
 
+if __name__ == '__main__':
+    init_database()
+    print(f"{DATABASE_URL} is up to date")
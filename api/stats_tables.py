@@ -0,0 +1,119 @@
+"""
+The season stat tables scraper.getTable reads off the stats pages (team statistics, category
+leaders, ...), kept in a stat_table table of the database instead of table_data.json. Each table
+is stored once under a digest of its content, so a re-scrape only appends the tables that changed.
+
+    python -m api.stats_tables --import table_data.json    # bring over what the JSON file had
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+
+from api.parse_html import make_soup
+from api.sql_alchemy_models import DATABASE_PATH
+
+STATS_URL = 'https://athletics.claflin.edu/sports/mens-basketball/stats/2024-25'
+
+CREATE_STAT_TABLE = '''
+    CREATE TABLE IF NOT EXISTS stat_table (
+        digest TEXT PRIMARY KEY,
+        caption TEXT,
+        headers TEXT,
+        rows TEXT
+    )
+'''
+
+
+def stats_ready(content):
+    """ Whether a fetched page already has the tables parse_stat_tables reads """
+    return '<table' in content
+
+
+def parse_stat_tables(content):
+    """
+    Read every table on a stats page.
+    Returns:
+        list: A dict per table: "caption", "headers", and "rows" of [{data-label: text}] per cell.
+    """
+    soup = make_soup(content, 'table')
+    all_tables_data = []
+    for table in soup.find_all('table'):
+        caption = table.find('caption').text.strip() if table.find('caption') else None
+        headers = [header.text.strip() for header in table.find('thead').find_all('th')]
+        rows = [
+            [{f"{cell.attrs.get('data-label')}":cell.text.strip()} for cell in row.find_all(['td'])]
+            for row in table.find_all('tr')[1:]
+        ]
+        all_tables_data.append({'caption': caption, 'headers': headers, 'rows': rows})
+    return all_tables_data
+
+
+def validate_stat_tables(tables):
+    """ Raise ValueError if a stats page parsed to nothing """
+    if not tables:
+        raise ValueError("no stat tables")
+
+
+def table_digest(table):
+    """ sha1 of a table's caption, headers and rows; equal tables have equal digests """
+    return hashlib.sha1(json.dumps([table['caption'], table['headers'], table['rows']]).encode()).hexdigest()
+
+
+def save_stat_tables(tables, db_path=DATABASE_PATH):
+    """
+    Append the tables not stored yet. Finding a duplicate is a primary key lookup, however many
+    tables earlier scrapes stored.
+    Args:
+        tables (list): Dicts with "caption", "headers" and "rows", as built by getTable.
+        db_path (str, optional): Defaults to the BBTRACKER_DATABASE_URL database.
+    Returns:
+        int: Number of tables that were new.
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(CREATE_STAT_TABLE)
+    c.execute('CREATE INDEX IF NOT EXISTS ix_stat_table_caption ON stat_table (caption)')
+    before = conn.total_changes
+    c.executemany('''
+        INSERT OR IGNORE INTO stat_table (digest, caption, headers, rows) VALUES (?, ?, ?, ?)
+    ''', [(table_digest(table), table['caption'], json.dumps(table['headers']), json.dumps(table['rows'])) for table in tables])
+    added = conn.total_changes - before
+    conn.commit()
+    conn.close()
+    return added
+
+
+def load_stat_tables(db_path=DATABASE_PATH, caption=None):
+    """
+    Args:
+        caption (str, optional): Only the tables with this caption.
+    Returns:
+        list: The stored tables, oldest first, as dicts like the ones saved.
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(CREATE_STAT_TABLE)
+    if caption is None:
+        c.execute('SELECT caption, headers, rows FROM stat_table ORDER BY rowid')
+    else:
+        c.execute('SELECT caption, headers, rows FROM stat_table WHERE caption = ? ORDER BY rowid', [caption])
+    tables = [{'caption': caption, 'headers': json.loads(headers), 'rows': json.loads(rows)} for caption, headers, rows in c.fetchall()]
+    conn.close()
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--import", dest="json_path", required=True, help="A table_data.json to load into the database")
+    parser.add_argument("--database", default=DATABASE_PATH)
+    args = parser.parse_args()
+
+    with open(args.json_path) as f:
+        tables = json.load(f)
+    added = save_stat_tables(tables, args.database)
+    print(f"{added} of {len(tables)} tables imported into {args.database}")
+
+
+if __name__ == '__main__':
+    main()
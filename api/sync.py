@@ -0,0 +1,215 @@
+"""
+bbtracker-sync: scrape the schedule, roster, season stats and box scores in one pipeline of
+fetch -> parse -> validate -> load stages (see api.pipeline), so box score pages are fetched
+while the ones before them are parsed and stored.
+
+    python -m api.sync --concurrency 4                       # or: pipenv run bbtracker-sync
+    python -m api.sync --base-url http://127.0.0.1:8765      # benchmarks.fixture_server
+    python -m api.sync --dry-run --fixtures fixtures/        # saved pages, nothing written
+    python -m api.sync --replay                              # re-parse the season from the page cache
+    python -m api.sync --page schedule --page box_score
+
+The schedule is merged by game_key and only the box scores of games that are new, changed on
+the schedule, or not ingested yet are fetched; one that parses to what is already stored
+(schedule.box_score_hash) is not rewritten. Box scores are stored in batches, each in one
+transaction on one connection. Pages go through the page cache (api.page_cache), so unchanged
+ones are revalidated rather than downloaded; --replay serves every page from the cache instead,
+without the site or a browser, and re-parses every game. --dry-run loads into a throwaway copy
+of the database.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import urljoin, urlparse
+
+from api.crawl_box_scores import BASE_URL, DATABASE_PATH, scheduled_games
+from api.fetch import FixtureFetcher, open_fetcher
+from api.page_cache import PAGE_CACHE_DIR, PageCache, ReplayFetcher
+from api.ingest import box_score_hash, connect, ingest_box_scores
+from api.pipeline import Pipeline, Stage, print_metrics
+from api.pregenerate_recommendations import pregenerate_recommendations
+from api.scrape_box_score import box_score_ready, parse_box_score, refresh_box_score_snapshots, validate_box_score
+from api.scrape_roster import ROSTER_URL, parse_roster, roster_ready, save_roster, validate_roster
+from api.scrape_schedule import SCHEDULE_URL, parse_schedule, schedule_ready, sync_schedule, validate_schedule
+from api.sql_alchemy_models import create_database_engine, create_schema
+from api.stats_tables import STATS_URL, parse_stat_tables, save_stat_tables, stats_ready, validate_stat_tables
+
+# Per kind of page: where it is, the fetch ready check, parser and validator
+PAGE_KINDS = {
+    'schedule': {"url": SCHEDULE_URL, "ready": schedule_ready, "parse": parse_schedule, "validate": validate_schedule},
+    'roster': {"url": ROSTER_URL, "ready": roster_ready, "parse": parse_roster, "validate": validate_roster},
+    'stats': {"url": STATS_URL, "ready": stats_ready, "parse": parse_stat_tables, "validate": validate_stat_tables},
+    # One job per game, queued once the schedule is loaded
+    'box_score': {"url": None, "ready": box_score_ready, "parse": parse_box_score, "validate": validate_box_score},
+}
+
+
+def sync_pipeline(fetcher, conn, base_url=BASE_URL, db_path=DATABASE_PATH, pages=tuple(PAGE_KINDS), concurrency=4, batch=50, every_game=False):
+    """
+    Build the pipeline. Its jobs are {"kind", "url"} dicts; box score jobs also carry
+    "game_id" and "stored_hash".
+    Args:
+        fetcher: An api.fetch Fetcher or FixtureFetcher.
+        conn (sqlite3.Connection): Box scores are ingested on it; see api.ingest.connect.
+        pages (tuple): The kinds of PAGE_KINDS to sync.
+        concurrency (int): Pages fetching at once.
+        batch (int): Box scores stored per transaction, at most.
+        every_game (bool): Queue every game with a box score link, not only new and changed ones.
+    Returns:
+        Pipeline: Also has "ingested" game_ids and the "replaced" ones among them.
+    """
+    pipeline = None
+
+    async def fetch(job):
+        job["content"] = await fetcher.fetch(job["url"], ready=PAGE_KINDS[job["kind"]]["ready"])
+        job["via"] = fetcher.served_by.get(job["url"])
+        return job
+
+    def parse(job):
+        job["parsed"] = PAGE_KINDS[job["kind"]]["parse"](job.pop("content"))
+        if job["kind"] == 'box_score' and box_score_hash(job["parsed"]) == job["stored_hash"]:
+            job["status"] = "unchanged"
+            return None
+        return job
+
+    def validate(job):
+        PAGE_KINDS[job["kind"]]["validate"](job["parsed"])
+        return job
+
+    def load(jobs):
+        box_scores = [job for job in jobs if job["kind"] == 'box_score']
+        if box_scores:
+            stats = ingest_box_scores(conn, [(job["game_id"], job["parsed"]) for job in box_scores])
+            pipeline.ingested.extend(job["game_id"] for job in box_scores)
+            pipeline.replaced.extend(stats["replaced"])
+        for job in jobs:
+            if job["kind"] == 'schedule':
+                diff = sync_schedule(job["parsed"], db_path)
+                job["diff"] = diff
+                # Games whose schedule entry moved (a result or a box score link appeared), plus any
+                # game with a link that has no box score rows yet, e.g. after a failed run
+                games = {game[0]: game for game in scheduled_games(db_path, diff["new"] + diff["changed"])}
+                games.update({game[0]: game for game in scheduled_games(db_path, include_ingested=every_game)})
+                if 'box_score' in pages:
+                    for game_id, link, stored_hash in sorted(games.values()):
+                        pipeline.submit({"kind": 'box_score', "url": urljoin(base_url, link), "game_id": game_id, "stored_hash": stored_hash})
+            elif job["kind"] == 'roster':
+                job["diff"] = save_roster(job["parsed"], db_path)
+            elif job["kind"] == 'stats':
+                job["added"] = save_stat_tables(job["parsed"], db_path)
+        return jobs
+
+    pipeline = Pipeline([
+        Stage('fetch', fetch, workers=concurrency),
+        Stage('parse', parse, thread=True),
+        Stage('validate', validate),
+        Stage('load', load, batch=batch),
+    ])
+    pipeline.ingested = []
+    pipeline.replaced = []
+    return pipeline
+
+
+def print_jobs(jobs):
+    for kind in PAGE_KINDS:
+        of_kind = [job for job in jobs if job["kind"] == kind]
+        if of_kind:
+            counts = {status: sum(job["status"] == status for job in of_kind) for status in ("ok", "unchanged", "failed")}
+            via = Counter(job.get("via") for job in of_kind if job.get("via"))
+            served = ", ".join(f"{count} {source}" for source, count in sorted(via.items()))
+            print(f"{kind}: {len(of_kind)} pages ({served or 'none fetched'}), {counts['ok']} loaded, {counts['unchanged']} unchanged, {counts['failed']} failed")
+        for job in of_kind:
+            if job.get("diff"):
+                rows = "players" if kind == 'roster' else "games"
+                print(f"  {len(job['diff']['new'])} new {rows}, {len(job['diff']['changed'])} changed, {len(job['diff']['removed'])} removed, {job['diff']['unchanged']} unchanged")
+            if job["status"] == "failed":
+                print(f"  {job['url']}: {job['error']}")
+
+
+async def sync(concurrency=4, base_url=BASE_URL, db_path=DATABASE_PATH, pregenerate=True, backend='auto', pages=tuple(PAGE_KINDS), fixtures=None, dry_run=False, batch=50, verbose=True, cache=None, replay=False, as_of=None):
+    """
+    Args:
+        pages (tuple): The kinds of PAGE_KINDS to sync; box scores follow from the schedule.
+        fixtures (str, optional): Read pages from this directory of saved pages instead of the site.
+        dry_run (bool): Load into a temporary copy of the database, and skip snapshots and recommendations.
+        cache (PageCache, optional): Revalidate pages against it and store them in it.
+        replay (bool): Serve every page from cache instead, as of the day as_of ("YYYY-MM-DD", default latest).
+    Returns:
+        dict: "jobs" (every finished job, without page content) and "metrics" per stage.
+    """
+    start = time.perf_counter()
+    if dry_run:
+        dry_run_dir = tempfile.mkdtemp()
+        copy_path = os.path.join(dry_run_dir, os.path.basename(db_path))
+        shutil.copyfile(db_path, copy_path)
+        db_path = copy_path
+    schema_engine = create_database_engine(f"sqlite:///{db_path}")
+    create_schema(schema_engine)
+    schema_engine.dispose()
+    conn = connect(db_path)
+    if fixtures:
+        fetcher = FixtureFetcher(fixtures)
+    elif replay:
+        fetcher = ReplayFetcher(cache, as_of)
+    else:
+        fetcher = open_fetcher(backend, concurrency, cache)
+    try:
+        async with fetcher:
+            pipeline = sync_pipeline(fetcher, conn, base_url, db_path, pages, concurrency, batch, every_game=replay)
+            first = [kind for kind in pages if PAGE_KINDS[kind]["url"]]
+            if 'box_score' in pages and 'schedule' not in pages:
+                first.append('schedule')  # Box scores come from the schedule
+            jobs = await pipeline.run([{"kind": kind, "url": urljoin(base_url, urlparse(PAGE_KINDS[kind]["url"]).path)} for kind in first])
+    finally:
+        conn.close()
+        if dry_run:
+            shutil.rmtree(dry_run_dir)
+    for job in jobs:
+        job.pop("content", None)
+        job.pop("parsed", None)
+
+    if pipeline.ingested and not dry_run:
+        refresh_box_score_snapshots(pipeline.ingested, pipeline.replaced)
+    if verbose:
+        print_jobs(jobs)
+        print_metrics(pipeline)
+        print(f"synced in {time.perf_counter() - start:.2f}s{' (dry run: nothing was written)' if dry_run else ''}")
+    if pregenerate and pipeline.ingested and not dry_run:
+        await pregenerate_recommendations()
+    return {"jobs": jobs, "metrics": [stage.metrics.as_dict() for stage in pipeline.stages]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4, help="Pages fetching at once")
+    parser.add_argument("--backend", choices=["auto", "http", "browser"], default="auto", help="auto: HTTP, with the browser as fallback")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--page", choices=list(PAGE_KINDS), action="append", help="Sync only these kinds of page (repeatable); default: all")
+    parser.add_argument("--batch", type=int, default=50, help="Box scores stored per transaction, at most")
+    parser.add_argument("--fixtures", help="Directory of saved pages to read instead of the site")
+    parser.add_argument("--cache", default=PAGE_CACHE_DIR, help="Page cache directory")
+    parser.add_argument("--max-age", type=float, default=0, help="Seconds a cached page is used without revalidating it")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the page cache")
+    parser.add_argument("--replay", nargs="?", const="latest", metavar="YYYY-MM-DD", help="Serve pages from the cache only (as of this day) and re-parse every game")
+    parser.add_argument("--dry-run", action="store_true", help="Write nothing to the database; needs --fixtures or --replay")
+    parser.add_argument("--no-pregenerate", action="store_true", help="Skip pre-generating recommendations afterwards")
+    args = parser.parse_args()
+    if args.dry_run and not (args.fixtures or args.replay):
+        parser.error("--dry-run needs --fixtures or --replay")
+    if args.replay and (args.no_cache or not args.cache):
+        parser.error("--replay needs the page cache")
+    cache = None if args.no_cache or not args.cache or args.fixtures else PageCache(args.cache, args.max_age)
+
+    asyncio.run(sync(
+        args.concurrency, args.base_url, pregenerate=not args.no_pregenerate, backend=args.backend,
+        pages=tuple(args.page or PAGE_KINDS), fixtures=args.fixtures, dry_run=args.dry_run, batch=args.batch,
+        cache=cache, replay=bool(args.replay), as_of=None if args.replay in (None, "latest") else args.replay,
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Compare get_season_averages (for one player and for the whole roster), get_team_stats and the rolling averages (served from
+the stat snapshots and single aggregate / window-function queries) with the
+previous load-every-row Python implementations on a synthetic multi-season database.
+
+    python -m benchmarks.bench_aggregates --seasons 10 --repeat 20
+"""
+import argparse
+import math
+import os
+import tempfile
+import time
+
+
+def legacy_season_averages(session, BoxScore, player_name):
+    games = session.query(BoxScore).filter(BoxScore.player.ilike(f"%{player_name}%")).all()
+    if not games:
+        return None
+    total_games = len(games)
+    return {
+        "fg_pct": round(sum(int(g.fg.split('-')[0]) / int(g.fg.split('-')[1]) for g in games if int(g.fg.split('-')[1]) > 0) / total_games * 100, 2),
+        "3p_pct": round(sum(int(g.pt3.split('-')[0]) / int(g.pt3.split('-')[1]) for g in games if int(g.pt3.split('-')[1]) > 0) / total_games * 100, 2),
+        "ft_pct": round(sum(int(g.ft.split('-')[0]) / max(1, int(g.ft.split('-')[1])) for g in games) / total_games * 100, 2),
+        "reb": round(sum(int(g.reb) for g in games) / total_games, 2),
+        "assists": round(sum(int(g.a) for g in games) / total_games, 2),
+        "turnovers": round(sum(int(g.trn) for g in games) / total_games, 2),
+        "points": round(sum(int(g.pts) for g in games) / total_games, 2),
+        "minutes": round(sum(int(g.min) for g in games) / total_games, 2),
+        "offensive_rebounds": round(sum(int(g.orb_drb.split('-')[0]) for g in games) / total_games, 2),
+        "defensive_rebounds": round(sum(int(g.orb_drb.split('-')[1]) for g in games) / total_games, 2),
+        "personal_fouls": round(sum(int(g.pf) for g in games) / total_games, 2),
+        "blocks": round(sum(int(g.blk) for g in games) / total_games, 2),
+        "steals": round(sum(int(g.stl) for g in games) / total_games, 2)
+    }
+
+
+def legacy_team_stats(session, BoxScore):
+    games = session.query(BoxScore).filter(BoxScore.team_name == "Claflin").all()
+    if not games:
+        return None
+    total_games = len(set(game.game_id for game in games))
+    return {
+        "fg_pct": round(sum(int(g.fg.split('-')[0]) for g in games) / sum(int(g.fg.split('-')[1]) for g in games) * 100, 2),
+        "3p_pct": round(sum(int(g.pt3.split('-')[0]) for g in games) / sum(int(g.pt3.split('-')[1]) for g in games) * 100, 2),
+        "ft_pct": round(sum(int(g.ft.split('-')[0]) for g in games) / sum(int(g.ft.split('-')[1]) for g in games) * 100, 2),
+        "reb": round(sum(int(g.reb) for g in games) / total_games, 2),
+        "assists": round(sum(int(g.a) for g in games) / total_games, 2),
+        "turnovers": round(sum(int(g.trn) for g in games) / total_games, 2),
+        "points": round(sum(int(g.pts) for g in games) / total_games, 2),
+        "offensive_rebounds": round(sum(int(g.orb_drb.split('-')[0]) for g in games) / total_games, 2),
+        "defensive_rebounds": round(sum(int(g.orb_drb.split('-')[1]) for g in games) / total_games, 2),
+        "personal_fouls": round(sum(int(g.pf) for g in games) / total_games, 2),
+        "blocks": round(sum(int(g.blk) for g in games) / total_games, 2),
+        "steals": round(sum(int(g.stl) for g in games) / total_games, 2)
+    }
+
+
+def legacy_rolling_averages(session, BoxScore, player_name, x):
+    games = session.query(BoxScore).filter(BoxScore.player.ilike(f"%{player_name}%")).order_by(BoxScore.game_id.desc()).limit(x).all()
+    if not games:
+        return None
+    total_games = len(games)
+    return {
+        "fg_pct": sum(int(g.fg.split('-')[0]) / int(g.fg.split('-')[1]) for g in games if int(g.fg.split('-')[1]) > 0) / total_games,
+        "3p_pct": sum(int(g.pt3.split('-')[0]) / int(g.pt3.split('-')[1]) for g in games if int(g.pt3.split('-')[1]) > 0) / total_games,
+        "ft_pct": sum(int(g.ft.split('-')[0]) / max(1, int(g.ft.split('-')[1])) for g in games) / total_games,
+        "reb": sum(int(g.reb) for g in games) / total_games,
+        "assists": sum(int(g.a) for g in games) / total_games,
+        "turnovers": sum(int(g.trn) for g in games) / total_games,
+        "points": sum(int(g.pts) for g in games) / total_games
+    }
+
+
+def legacy_team_rolling_averages(session, BoxScore, x):
+    # The old query limited to x player rows; compare against the last x games, which the window query returns
+    recent_games = session.query(BoxScore.game_id).filter(BoxScore.team_name == "Claflin").distinct().order_by(BoxScore.game_id.desc()).limit(x)
+    games = session.query(BoxScore).filter(BoxScore.team_name == "Claflin").filter(BoxScore.player != "TEAM").filter(BoxScore.game_id.in_(recent_games)).all()
+    if not games:
+        return None
+    total_games = len(set(game.game_id for game in games))
+    return {
+        "fg_pct": round(sum(int(g.fg.split('-')[0]) for g in games) / sum(int(g.fg.split('-')[1]) for g in games) * 100, 2),
+        "3p_pct": round(sum(int(g.pt3.split('-')[0]) for g in games) / sum(int(g.pt3.split('-')[1]) for g in games) * 100, 2),
+        "ft_pct": round(sum(int(g.ft.split('-')[0]) for g in games) / sum(int(g.ft.split('-')[1]) for g in games) * 100, 2),
+        "reb": round(sum(int(g.reb) for g in games) / total_games, 2),
+        "assists": round(sum(int(g.a) for g in games) / total_games, 2),
+        "turnovers": round(sum(int(g.trn) for g in games) / total_games, 2),
+        "points": round(sum(int(g.pts) for g in games) / total_games, 2),
+        "minutes": round(sum(int(g.min) for g in games) / total_games, 2),
+        "offensive_rebounds": round(sum(int(g.orb_drb.split('-')[0]) for g in games) / total_games, 2),
+        "defensive_rebounds": round(sum(int(g.orb_drb.split('-')[1]) for g in games) / total_games, 2),
+        "personal_fouls": round(sum(int(g.pf) for g in games) / total_games, 2),
+        "blocks": round(sum(int(g.blk) for g in games) / total_games, 2),
+        "steals": round(sum(int(g.stl) for g in games) / total_games, 2)
+    }
+
+
+def legacy_recommendation_rolling(session, BoxScore, player_name):
+    """ The four rolling scans get_ai_recommendations used to run """
+    return (
+        {5: legacy_rolling_averages(session, BoxScore, player_name, 5), 10: legacy_rolling_averages(session, BoxScore, player_name, 10)},
+        {5: legacy_team_rolling_averages(session, BoxScore, 5), 10: legacy_team_rolling_averages(session, BoxScore, 10)},
+    )
+
+
+def legacy_roster_season_averages(session, BoxScore, player_names):
+    """ One legacy_season_averages call per player, as the roster screen used to do """
+    return {player_name: legacy_season_averages(session, BoxScore, player_name) for player_name in player_names}
+
+
+def same_result(legacy, current):
+    """ Compare results, allowing for float summation order in the unrounded rolling averages """
+    if isinstance(legacy, dict) and isinstance(current, dict):
+        return legacy.keys() == current.keys() and all(same_result(legacy[key], current[key]) for key in legacy)
+    if isinstance(legacy, (tuple, list)):
+        return len(legacy) == len(current) and all(same_result(a, b) for a, b in zip(legacy, current))
+    if isinstance(legacy, float):
+        return math.isclose(legacy, current, rel_tol=1e-9)
+    return legacy == current
+
+
+def in_session(Session, function):
+    with Session() as session:
+        return function(session)
+
+
+def time_call(function, repeat):
+    """ Run function repeat times and return (mean seconds per call, last result) """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seasons", type=int, default=10)
+    parser.add_argument("--games-per-season", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "synthetic.db")
+    os.environ["BBTRACKER_DATABASE_URL"] = f"sqlite:///{path}"
+    from benchmarks.synthetic_db import PLAYER_NAMES, build_database
+    build_database(path, args.seasons, args.games_per_season)
+    from api.sql_alchemy_models import (
+        BoxScore, Session, get_rolling_averages_for_windows, get_season_averages, get_season_averages_for_players, get_team_rolling_averages,
+        get_team_rolling_averages_for_windows, get_team_stats
+    )
+
+    player_name = PLAYER_NAMES[0]
+    rows = in_session(Session, lambda session: session.query(BoxScore).count())
+    print(f"{args.seasons} seasons, {rows} box score rows, {args.repeat} calls each\n")
+    print(f"{'function':<28}{'python (ms)':>14}{'current (ms)':>14}{'speedup':>10}")
+
+    cases = [
+        ("get_season_averages",
+         lambda: in_session(Session, lambda session: legacy_season_averages(session, BoxScore, player_name)),
+         lambda: in_session(Session, lambda session: get_season_averages(player_name, session=session))),
+        ("season averages, roster",
+         lambda: in_session(Session, lambda session: legacy_roster_season_averages(session, BoxScore, PLAYER_NAMES)),
+         lambda: in_session(Session, lambda session: get_season_averages_for_players(PLAYER_NAMES, session=session))),
+        ("get_team_stats",
+         lambda: in_session(Session, lambda session: legacy_team_stats(session, BoxScore)),
+         lambda: in_session(Session, lambda session: get_team_stats(session=session))),
+        ("get_team_rolling_averages",
+         lambda: in_session(Session, lambda session: legacy_team_rolling_averages(session, BoxScore, 10)),
+         lambda: in_session(Session, lambda session: get_team_rolling_averages(10, session=session))),
+        ("rolling 5/10, player+team",
+         lambda: in_session(Session, lambda session: legacy_recommendation_rolling(session, BoxScore, player_name)),
+         lambda: in_session(Session, lambda session: (
+             get_rolling_averages_for_windows(player_name, [5, 10], session=session),
+             get_team_rolling_averages_for_windows([5, 10], session=session),
+         ))),
+    ]
+    for name, legacy, current in cases:
+        legacy_time, legacy_result = time_call(legacy, args.repeat)
+        current_time, current_result = time_call(current, args.repeat)
+        assert same_result(legacy_result, current_result), f"{name} results differ:\n{legacy_result}\n{current_result}"
+        print(f"{name:<28}{legacy_time * 1000:>14.2f}{current_time * 1000:>14.2f}{legacy_time / current_time:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
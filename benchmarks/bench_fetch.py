@@ -0,0 +1,60 @@
+"""
+Fetch every page of benchmarks.fixture_server with each api.fetch backend and compare wall time
+and peak memory. The browser backend's memory is mostly in the Chromium processes, so peak RSS
+is reported for this process and its children separately.
+
+    python -m benchmarks.bench_fetch --database basketball_stats.db --backend http --backend browser
+    python -m benchmarks.bench_fetch --concurrency 8 --latency 0.1
+
+Run each backend in a fresh process for a clean peak: ru_maxrss never goes down.
+"""
+import argparse
+import asyncio
+import resource
+import time
+from urllib.parse import urljoin
+
+from api.fetch import open_fetcher
+from benchmarks.fixture_server import load_pages, serve
+
+
+async def fetch_all(urls, backend, concurrency):
+    async with open_fetcher(backend, concurrency) as fetcher:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(url):
+            async with semaphore:
+                return await fetcher.fetch(url)
+
+        pages = await asyncio.gather(*(fetch(url) for url in urls))
+    return sum(len(page) for page in pages)
+
+
+def peak_rss_mb(who):
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="basketball_stats.db")
+    parser.add_argument("--backend", choices=["http", "browser"], action="append", help="Repeatable; default: http")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="Fixture server delay per request, seconds")
+    args = parser.parse_args()
+
+    server = serve(args.database, latency=args.latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [urljoin(base_url, path) for path in load_pages(args.database)]
+    print(f"{len(urls)} pages, concurrency {args.concurrency}, {args.latency:.2f}s latency\n")
+    print(f"{'backend':<10}{'seconds':>9}{'KB':>8}{'self MB':>9}{'children MB':>13}")
+    for backend in args.backend or ["http"]:
+        start = time.perf_counter()
+        size = asyncio.run(fetch_all(urls, backend, args.concurrency))
+        elapsed = time.perf_counter() - start
+        print(f"{backend:<10}{elapsed:>9.2f}{size / 1024:>8.0f}{peak_rss_mb(resource.RUSAGE_SELF):>9.1f}{peak_rss_mb(resource.RUSAGE_CHILDREN):>13.1f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
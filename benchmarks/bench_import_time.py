@@ -0,0 +1,83 @@
+"""
+Cold-start check: import the API (and the sync entry point) in a fresh interpreter under
+`python -X importtime` and fail if an import is over its time budget, pulls in a module that
+should only load on first use (the LangChain/OpenAI stack, tiktoken), or touches the database.
+
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time --module api.main --budget-ms 800 --repeat 5
+
+The database URL points at a directory that does not exist, so an import that connects fails.
+Exits 1 when a check fails, so it can gate CI. The slowest imports are listed either way.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+# Module -> cumulative import time budget in milliseconds. Generous for a slow CI machine:
+# before the LLM stack was made lazy, importing api.main took over 2.5 s where it now takes under 1 s.
+BUDGETS_MS = {"api.main": 1500, "api.sync": 1500}
+
+# Loaded on first use only; importing any of these at startup is a regression
+LAZY_MODULES = ("langchain", "langchain_core", "langchain_openai", "openai", "tiktoken", "playwright")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module):
+    """
+    Import module in a new interpreter.
+    Returns:
+        list: (name, cumulative microseconds, depth) per imported module, in -X importtime order.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT, BBTRACKER_DATABASE_URL=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'missing-dir', 'never.db')}")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode:
+        error = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"import {module} failed: {error[-1] if error else result.returncode}")
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(cumulative), (len(name) - len(name.lstrip())) // 2))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="Module to import (repeatable); default: " + ", ".join(BUDGETS_MS))
+    parser.add_argument("--budget-ms", type=float, help="Budget for every --module, instead of BUDGETS_MS")
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per module; the fastest counts")
+    parser.add_argument("--top", type=int, default=8, help="Slowest direct imports to list")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.module or BUDGETS_MS:
+        budget = args.budget_ms or BUDGETS_MS.get(module, 1500)
+        try:
+            runs = [import_times(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            failures.append(str(e))
+            continue
+        times = min(runs, key=lambda run: dict((name, cumulative) for name, cumulative, _ in run)[module])
+        total = dict((name, cumulative) for name, cumulative, _ in times)[module] / 1000
+        lazy = sorted({name for name, _, _ in times if name.split(".")[0] in LAZY_MODULES})
+
+        print(f"{module}: {total:.0f} ms (budget {budget:.0f} ms)")
+        direct = sorted(((cumulative, name) for name, cumulative, depth in times if depth == 1), reverse=True)
+        for cumulative, name in direct[:args.top]:
+            print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+        if total > budget:
+            failures.append(f"{module} took {total:.0f} ms, over its {budget:.0f} ms budget")
+        if lazy:
+            failures.append(f"{module} imports {', '.join(lazy[:5])}{' ...' if len(lazy) > 5 else ''} at startup")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
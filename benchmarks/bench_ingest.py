@@ -0,0 +1,96 @@
+"""
+Ingest thousands of synthetic box scores into an empty database and report rows/sec for the
+way the scrapers used to store them (a connection per team table, one INSERT per row) against
+api.ingest (executemany upserts, one transaction per batch, one connection), then re-ingest
+them all to time the upsert path that updates existing rows.
+
+    python -m benchmarks.bench_ingest --games 2000 --batch 500
+
+Snapshots are left out: they are refreshed once per run either way.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from api.ingest import BOX_SCORE_COLUMNS, connect, ingest_box_scores
+from api.migrations import link_players, split_made_attempted
+from benchmarks.synthetic_db import OPPONENTS, PLAYER_NAMES, box_score_row, build_database
+
+
+def synthetic_games(count, seed=0):
+    """ (game_id, tables) pairs shaped like parse_box_score's output """
+    rng = random.Random(seed)
+    games = []
+    for game_id in range(1, count + 1):
+        opponent = rng.choice(OPPONENTS)
+        tables = [
+            (team_name, [list(box_score_row(rng, game_id, team_name, f"{number:02d}", player)[2:17]) for number, player in enumerate(players)])
+            for team_name, players in (("Claflin", PLAYER_NAMES), (opponent, [f"{opponent} Player {number}" for number in range(len(PLAYER_NAMES))]))
+        ]
+        games.append((game_id, tables))
+    return games
+
+
+def ingest_per_row(db_path, games):
+    """ The old scrape_box_score storage loop """
+    for game_id, tables in games:
+        for team_name, rows in tables:
+            conn = sqlite3.connect(db_path)
+            c = conn.cursor()
+            for row in rows:
+                split_stats = [value for column in row[4:8] for value in split_made_attempted(column)]
+                c.execute(f'''
+                    INSERT INTO box_score ({', '.join(BOX_SCORE_COLUMNS)})
+                    VALUES ({', '.join('?' * len(BOX_SCORE_COLUMNS))})
+                ''', [game_id] + [team_name] + row + split_stats)
+            link_players(c, game_id)
+            conn.commit()
+            conn.close()
+
+
+def ingest_bulk(db_path, games, batch):
+    conn = connect(db_path)
+    for start in range(0, len(games), batch):
+        ingest_box_scores(conn, games[start:start + batch])
+    conn.close()
+
+
+def empty_database():
+    path = os.path.join(tempfile.mkdtemp(), "ingest.db")
+    os.environ["BBTRACKER_DATABASE_URL"] = f"sqlite:///{path}"
+    build_database(path, seasons=0)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=500, help="Games per ingest_box_scores transaction")
+    parser.add_argument("--skip-per-row", action="store_true", help="Only time api.ingest")
+    args = parser.parse_args()
+
+    games = synthetic_games(args.games)
+    rows = sum(len(table_rows) for _, tables in games for _, table_rows in tables)
+    print(f"{args.games} games, {rows} rows\n")
+    print(f"{'method':<34}{'seconds':>9}{'rows/s':>10}")
+    runs = [(f"bulk upsert, batch {args.batch}", lambda path: ingest_bulk(path, games, args.batch))]
+    if not args.skip_per_row:
+        runs.insert(0, ("per-row INSERT (before)", lambda path: ingest_per_row(path, games)))
+    for label, run in runs:
+        path = empty_database()
+        start = time.perf_counter()
+        run(path)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<34}{elapsed:>9.2f}{rows / elapsed:>10.0f}")
+    # The last database already has every game, so this time each row is an update
+    start = time.perf_counter()
+    ingest_bulk(path, games, args.batch)
+    elapsed = time.perf_counter() - start
+    print(f"{'bulk upsert, re-ingest':<34}{elapsed:>9.2f}{rows / elapsed:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
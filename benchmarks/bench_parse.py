@@ -0,0 +1,102 @@
+"""
+Time and measure parsing schedule and box score pages the way the scrapers used to
+(html.parser over the whole page) against api.parse_html (lxml, only the section that is read).
+
+    python -m benchmarks.bench_parse --pages saved_pages/
+    python -m benchmarks.bench_parse --database basketball_stats.db --padding 400
+
+With --pages, every *.html file in the directory is used; otherwise the benchmarks.fixture_server
+pages are rendered from the database. Those carry only the parsed markup, while a real Sidearm page
+is a few hundred KB of navigation and scripts around it, so --padding adds that much (in KB) of
+such markup before the content. Peak memory is the tracemalloc peak while building one tree.
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+import tracemalloc
+
+from api.parse_html import PARSER, make_soup
+from api.scrape_box_score import box_score_ready
+from api.scrape_schedule import schedule_ready
+from benchmarks.fixture_server import load_pages
+
+# What each kind of page is strained down to, as in parse_box_score and parse_schedule
+TARGETS = {
+    'box score': ('section', {'id': 'box-score'}),
+    'schedule': ('ul', {'class': 'sidearm-schedule-games-container'}),
+}
+
+VARIANTS = [
+    ('html.parser, whole page', lambda content, target: make_soup(content, parser='html.parser')),
+    (f'{PARSER}, whole page', lambda content, target: make_soup(content, parser=PARSER)),
+    (f'{PARSER}, strained', lambda content, target: make_soup(content, *target)),
+]
+
+
+def page_kind(content):
+    if box_score_ready(content):
+        return 'box score'
+    if schedule_ready(content):
+        return 'schedule'
+    return None
+
+
+def padding(kilobytes):
+    """ Navigation and script markup standing in for the rest of a Sidearm page """
+    item = '<li class="main-nav-item"><a href="/sports/mens-basketball/roster">Roster</a><ul><li><a href="/news">News</a></li></ul></li>'
+    script = '<script>window.sidearmComponents = window.sidearmComponents || []; sidearmComponents.push({"type": "ad", "id": 1});</script>'
+    block = f'<nav><ul>{item * 8}</ul></nav>{script * 4}'
+    return block * max(1, kilobytes * 1024 // len(block)) if kilobytes else ''
+
+
+def saved_pages(pages_dir, database, padding_kb):
+    if pages_dir:
+        pages = {}
+        for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+            with open(path, encoding='utf-8') as f:
+                pages[os.path.basename(path)] = f.read()
+        return pages
+    filler = padding(padding_kb)
+    return {path: page.replace('<body>', f'<body>{filler}', 1) for path, page in load_pages(database).items()}
+
+
+def measure(build, content, target, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(content, target)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    build(content, target)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", help="Directory of saved *.html pages")
+    parser.add_argument("--database", default="basketball_stats.db")
+    parser.add_argument("--padding", type=int, default=300, help="KB of page chrome added to fixture pages")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = {name: content for name, content in saved_pages(args.pages, args.database, args.padding).items() if page_kind(content)}
+    print(f"{len(pages)} pages, median of {args.repeat} parses, tracemalloc peak\n")
+    print(f"{'variant':<26}{'kind':<11}{'pages':>6}{'KB/page':>9}{'ms/page':>9}{'peak MB':>9}")
+    for label, build in VARIANTS:
+        for kind, target in TARGETS.items():
+            contents = [content for content in pages.values() if page_kind(content) == kind]
+            if not contents:
+                continue
+            results = [measure(build, content, target, args.repeat) for content in contents]
+            size = statistics.mean(len(content) for content in contents) / 1024
+            seconds = statistics.mean(seconds for seconds, _ in results)
+            peak = max(peak for _, peak in results) / 2 ** 20
+            print(f"{label:<26}{kind:<11}{len(contents):>6}{size:>9.0f}{seconds * 1000:>9.2f}{peak:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
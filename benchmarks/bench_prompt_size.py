@@ -0,0 +1,55 @@
+"""
+Compare the size of the recommendation prompt as it used to be sent (every input as a Python repr)
+with the compact, token-budgeted format of api.prompt_format, per player, and time building each.
+Model latency and cost grow with the prompt's token count, so the tokens columns are the ones to watch.
+
+    python -m benchmarks.bench_prompt_size --seasons 10 --budget 3000
+    python -m benchmarks.bench_prompt_size --database basketball_stats.db
+
+Tokens are counted with tiktoken when its encoding is available, else estimated at 4 characters a token.
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.bench_aggregates import in_session, time_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seasons", type=int, default=10)
+    parser.add_argument("--database", help="Use this database instead of building a synthetic one")
+    parser.add_argument("--budget", type=int, default=None, help="Token budget (default: RECOMMENDATION_TOKEN_BUDGET)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ["BBTRACKER_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.database)}"
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.db")
+        os.environ["BBTRACKER_DATABASE_URL"] = f"sqlite:///{path}"
+        from benchmarks.synthetic_db import build_database
+        build_database(path, args.seasons)
+    from api import sql_alchemy_models as models
+    models.init_database()
+    from api.prompt_format import estimate_tokens, format_recommendation_prompt, token_encoding
+
+    budget = args.budget or models.RECOMMENDATION_TOKEN_BUDGET
+    counter = "tiktoken" if token_encoding(models.RECOMMENDATION_MODEL) else "4 chars/token estimate"
+    print(f"token budget {budget}, counted with {counter}\n")
+    print(f"{'player':<26}{'games':>6}{'raw tokens':>12}{'compact':>9}{'saved':>8}{'inputs ms':>11}{'format ms':>11}")
+    totals = [0, 0]
+    for player_name in in_session(models.Session, lambda session: models.get_all_players(session=session)):
+        inputs_time, inputs = time_call(lambda: in_session(models.Session, lambda session: models.get_recommendation_inputs(player_name, session=session)), args.repeat)
+        format_time, prompt = time_call(lambda: format_recommendation_prompt(inputs, budget), args.repeat)
+        raw_tokens = estimate_tokens(models.RECOMMENDATION_PROMPT.format(**inputs))
+        compact_tokens = estimate_tokens(prompt)
+        totals[0] += raw_tokens
+        totals[1] += compact_tokens
+        print(f"{player_name[:25]:<26}{len(inputs['player_stats']):>6}{raw_tokens:>12}{compact_tokens:>9}{1 - compact_tokens / raw_tokens:>8.0%}{inputs_time * 1000:>11.2f}{format_time * 1000:>11.2f}")
+    if totals[0]:
+        print(f"\n{'all players':<26}{'':>6}{totals[0]:>12}{totals[1]:>9}{1 - totals[1] / totals[0]:>8.0%}")
+
+
+if __name__ == '__main__':
+    main()
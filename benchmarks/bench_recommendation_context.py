@@ -0,0 +1,74 @@
+"""
+Compare get_recommendation_inputs, which loads the player's and team's box scores once,
+with the previous one-helper-per-view assembly, and print the time and query count of
+each stage on a synthetic multi-season database.
+
+    python -m benchmarks.bench_recommendation_context --seasons 10 --repeat 20
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.bench_aggregates import in_session, same_result, time_call
+from benchmarks.query_counts import count_queries
+
+
+def legacy_recommendation_inputs(models, player_name, session):
+    """ The prompt inputs as they were assembled before: one helper, and its own queries, per view """
+    player = models.resolve_player(player_name, session=session)
+    player_rolling_averages = models.get_rolling_averages_for_windows(player, [5, 10], session=session)
+    team_rolling_averages = models.get_team_rolling_averages_for_windows([5, 10], session=session)
+    return {
+        "player_name": player.name,
+        "player_stats": models.get_games_played(player, session=session),
+        "player_data": models.get_player(player, session=session),
+        "season_averages": models.get_season_averages(player, session=session),
+        "rolling_averages_5": player_rolling_averages.get(5),
+        "rolling_averages_10": player_rolling_averages.get(10),
+        "best_game": models.get_best_scoring_game(player, session=session).to_dict(),
+        "worst_game": models.get_worst_scoring_game(player, session=session).to_dict(),
+        "high_turnover_games": [game.to_dict() for game in models.get_high_turnover_games(player, session=session)],
+        "high_3pt_games": [game.to_dict() for game in models.get_high_3pt_games(player, session=session)],
+        "drills": models.get_drills(session=session),
+        "team_stats": models.get_team_stats(session=session),
+        "team_rolling_averages_5": team_rolling_averages.get(5),
+        "team_rolling_averages_10": team_rolling_averages.get(10),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seasons", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "synthetic.db")
+    os.environ["BBTRACKER_DATABASE_URL"] = f"sqlite:///{path}"
+    from benchmarks.synthetic_db import PLAYER_NAMES, build_database
+    build_database(path, args.seasons)
+    from api import sql_alchemy_models as models
+
+    player_name = PLAYER_NAMES[0]
+    with count_queries(models.engine) as legacy_queries:
+        legacy = in_session(models.Session, lambda session: legacy_recommendation_inputs(models, player_name, session))
+    with count_queries(models.engine) as current_queries:
+        current = in_session(models.Session, lambda session: models.get_recommendation_inputs(player_name, session=session))
+    for key in legacy:
+        assert same_result(legacy[key], current[key]), f"{key} differs:\n{legacy[key]}\n{current[key]}"
+
+    legacy_time, _ = time_call(lambda: in_session(models.Session, lambda session: legacy_recommendation_inputs(models, player_name, session)), args.repeat)
+    current_time, _ = time_call(lambda: in_session(models.Session, lambda session: models.get_recommendation_inputs(player_name, session=session)), args.repeat)
+    print(f"{args.seasons} seasons, {args.repeat} calls each\n")
+    print(f"{'':<22}{'ms':>10}{'queries':>10}")
+    print(f"{'one helper per view':<22}{legacy_time * 1000:>10.2f}{len(legacy_queries):>10}")
+    print(f"{'load once':<22}{current_time * 1000:>10.2f}{len(current_queries):>10}")
+
+    timings = []
+    in_session(models.Session, lambda session: models.get_recommendation_inputs(player_name, timings=timings, session=session))
+    print(f"\n{'stage':<22}{'ms':>10}{'queries':>10}")
+    for stage in timings:
+        print(f"{stage['stage']:<22}{stage['ms']:>10.2f}{stage['queries']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+Serve Sidearm-style schedule, roster, stats and box score pages rendered from a database, at the
+same paths as on the real site, so the scrapers can be run without touching athletics.claflin.edu.
+
+    python -m benchmarks.fixture_server --database basketball_stats.db --port 8765 --latency 0.2
+    python -m benchmarks.fixture_server --database basketball_stats.db --save fixtures/
+
+then point a crawler at http://127.0.0.1:8765 instead of the real site, or a dry run of api.sync
+at the saved pages. The pages carry only what the parsers read.
+"""
+import argparse
+import hashlib
+import html
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from api.fetch import fixture_path
+from api.scrape_roster import ROSTER_URL
+from api.scrape_schedule import SCHEDULE_URL
+from api.stats_tables import STATS_URL, load_stat_tables
+
+# Where the schedule, roster and stats pages are served, as on the real site
+SCHEDULE_PATH = urlparse(SCHEDULE_URL).path
+ROSTER_PATH = urlparse(ROSTER_URL).path
+STATS_PATH = urlparse(STATS_URL).path
+
+# The box_score columns parse_box_score reads back, in page order
+PAGE_COLUMNS = ['player_number', 'player', 'gs', 'min', 'fg', 'pt3', 'ft', 'orb_drb', 'reb', 'pf', 'a', 'trn', 'blk', 'stl', 'pts']
+
+
+def player_cell(number, name):
+    """ The page shows "number Last First"; parse_box_score drops the number and reverses the words back """
+    return f"{number} {' '.join(reversed(name.split(' ')))}"
+
+
+def render_box_score(teams):
+    """
+    Args:
+        teams (dict): Team name -> box_score rows (tuples in PAGE_COLUMNS order).
+    Returns:
+        str: The page.
+    """
+    tables = []
+    for team_name, rows in teams.items():
+        body = "".join(
+            "<tr>" + "".join(f"<td>{html.escape(player_cell(row[0], row[1]) if index == 1 else str(value if value is not None else ''))}</td>" for index, value in enumerate(row)) + "</tr>"
+            for row in rows
+        )
+        header = "".join(f"<th>{column}</th>" for column in PAGE_COLUMNS)
+        tables.append(f'<table class="sidearm-table overall-stats"><caption>{html.escape(team_name)} - Box Score</caption><thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>')
+    return f'<!DOCTYPE html><html><head><title>Box Score</title></head><body><section id="box-score">{"".join(tables)}</section></body></html>'
+
+
+def format_game_date(date, game_datetime):
+    """ The schedule page's "Nov 9 (Sat) 5:00 p.m." """
+    day = datetime.strptime(date, '%Y-%m-%d')
+    label = f"{day:%b} {day.day} ({day:%a})"
+    if not game_datetime:
+        return f"{label} TBA"
+    # Stored by sqlite3 as "2024-11-09 17:00:00", by SQLAlchemy with microseconds
+    time_of_day = datetime.fromisoformat(game_datetime)
+    return f"{label} {time_of_day.hour % 12 or 12}:{time_of_day:%M} {'p.m.' if time_of_day.hour >= 12 else 'a.m.'}"
+
+
+def render_schedule(games):
+    """
+    Args:
+        games (list): Schedule rows as dicts.
+    Returns:
+        str: The page, with what parse_schedule reads.
+    """
+    items = []
+    for game in games:
+        parts = [f'<div class="sidearm-schedule-game-opponent-name">{html.escape(game["opponent"] or "")}</div>']
+        if game["date"]:
+            parts.append(f'<div class="sidearm-schedule-game-opponent-date">{format_game_date(game["date"], game["datetime"])}</div>')
+        parts.append('<span class="sidearm-schedule-game-home">vs</span>' if game["home"] else '<span class="sidearm-schedule-game-away">at</span>')
+        if game["win"] is not None:
+            parts.append(f'<div class="sidearm-schedule-game-result">{"W" if game["win"] else "L"}, {game["claflin_score"]}-{game["opponent_score"]}</div>')
+        if game["opp_logo"]:
+            parts.append(f'<img data-src="{html.escape(game["opp_logo"])}">')
+        if game["box_score_link"]:
+            parts.append(f'<ul><li class="sidearm-schedule-game-links-boxscore"><a href="{html.escape(game["box_score_link"])}">Box Score</a></li></ul>')
+        items.append(f'<li class="sidearm-schedule-game">{"".join(parts)}</li>')
+    return f'<!DOCTYPE html><html><body><ul class="sidearm-schedule-games-container">{"".join(items)}</ul></body></html>'
+
+
+def render_roster(players):
+    """
+    Args:
+        players (list): player rows as dicts.
+    Returns:
+        str: The page, with what parse_roster reads.
+    """
+    items = []
+    for player in players:
+        parts = [f'<h3>{html.escape(player["name"] or "")}</h3>']
+        if player["position"]:
+            parts.append(f'<div class="sidearm-roster-player-position"><span class="text-bold">{html.escape(player["position"])}</span></div>')
+        if player["image"]:
+            parts.append(f'<img data-src="{html.escape(player["image"])}">')
+        for field, span_class in (("jersey_number", "jersey-number"), ("height", "height"), ("class", "academic-year"), ("hometown", "hometown"), ("high_school", "highschool")):
+            if player[field]:
+                parts.append(f'<span class="sidearm-roster-player-{span_class}">{html.escape(player[field])}</span>')
+        items.append(f'<li class="sidearm-roster-player">{"".join(parts)}</li>')
+    return f'<!DOCTYPE html><html><body><section aria-label="Men&#39;s Player Roster"><ul>{"".join(items)}</ul></section></body></html>'
+
+
+def render_stats(tables):
+    """
+    Args:
+        tables (list): Stat tables as returned by load_stat_tables.
+    Returns:
+        str: The page, with what parse_stat_tables reads.
+    """
+    def cell(label, text):
+        # A cell without a data-label was stored under the label "None"
+        attribute = '' if label == 'None' else f' data-label="{html.escape(label)}"'
+        return f'<td{attribute}>{html.escape(text)}</td>'
+
+    rendered = []
+    for table in tables:
+        caption = f'<caption>{html.escape(table["caption"])}</caption>' if table["caption"] is not None else ''
+        header = "".join(f"<th>{html.escape(header)}</th>" for header in table["headers"])
+        body = "".join("<tr>" + "".join(cell(label, text) for row_cell in row for label, text in row_cell.items()) + "</tr>" for row in table["rows"])
+        rendered.append(f'<table class="sidearm-table">{caption}<thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>')
+    return f'<!DOCTYPE html><html><body>{"".join(rendered)}</body></html>'
+
+
+def load_pages(db_path):
+    """
+    Path -> rendered page: the schedule, the roster, the latest stat table of each caption, and
+    every scheduled game that has box score rows
+    """
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute("SELECT * FROM schedule ORDER BY date, game_id")
+    schedule = render_schedule([dict(row) for row in c.fetchall()])
+    c.execute("SELECT game_id, box_score_link FROM schedule WHERE box_score_link IS NOT NULL AND box_score_link != ''")
+    links = {game_id: link for game_id, link in c.fetchall()}
+    c.execute(f"SELECT game_id, team_name, {', '.join(PAGE_COLUMNS)} FROM box_score ORDER BY game_id, team_name != 'Claflin', rowid")
+    games = {}
+    for game_id, team_name, *row in c.fetchall():
+        games.setdefault(game_id, {}).setdefault(team_name, []).append(row)
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name = 'player'")
+    players = []
+    if c.fetchone():
+        c.execute("SELECT * FROM player ORDER BY player_id")
+        players = [dict(row) for row in c.fetchall()]
+    conn.close()
+    pages = {link: render_box_score(games[game_id]) for game_id, link in links.items() if game_id in games}
+    pages[SCHEDULE_PATH] = schedule
+    pages[ROSTER_PATH] = render_roster(players)
+    pages[STATS_PATH] = render_stats(list({table["caption"]: table for table in load_stat_tables(db_path)}.values()))
+    return pages
+
+
+def save_pages(db_path, directory):
+    """ Write the pages as fixtures for api.sync --dry-run (see api.fetch.fixture_path) """
+    pages = load_pages(db_path)
+    for path, page in pages.items():
+        destination = fixture_path(directory, path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with open(destination, 'w', encoding='utf-8') as f:
+            f.write(page)
+    return len(pages)
+
+
+def serve(db_path, port=0, latency=0.0):
+    """
+    Start the fixture server on a background thread.
+    Args:
+        db_path (str): Database to render the pages from.
+        port (int): Port to listen on; 0 picks a free one.
+        latency (float): Seconds to wait before answering each request, to stand in for the network.
+    Returns:
+        ThreadingHTTPServer: Call shutdown() to stop it; server_address has the port.
+    """
+    pages = load_pages(db_path)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            page = pages.get(self.path.split('?')[0])
+            body = (page or "<html><body>Not found</body></html>").encode()
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if page and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200 if page else 404)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="basketball_stats.db")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--save", metavar="DIRECTORY", help="Write the pages here as fixtures instead of serving them")
+    args = parser.parse_args()
+
+    if args.save:
+        print(f"Saved {save_pages(args.database, args.save)} pages to {args.save}")
+        return
+
+    server = serve(args.database, args.port, args.latency)
+    print(f"Serving box score fixtures on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
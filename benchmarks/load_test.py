@@ -0,0 +1,124 @@
+"""
+Load test the API with concurrent clients and report throughput and latency.
+
+Starts uvicorn on a synthetic database (or targets --url) and has each client
+thread replay a mix of read requests over a keep-alive connection:
+
+    python -m benchmarks.load_test --clients 1 8 32 --duration 10
+
+Run it on two checkouts to compare before and after a change.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+PLAYER = "Gregory Spurlock"
+REQUESTS = [
+    ("get", "/players", None),
+    ("get", "/drills", None),
+    ("post", "/player", {"player_name": PLAYER}),
+    ("post", "/player/season_averages", {"player_name": PLAYER}),
+    ("post", "/player/rolling_averages", {"player_name": PLAYER, "x": 5}),
+    ("post", "/player/get_games", {"player_name": PLAYER}),
+    ("post", "/player/get_schedule", {"player_name": PLAYER}),
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(database_url, workers):
+    port = free_port()
+    env = dict(os.environ, BBTRACKER_DATABASE_URL=database_url)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            requests.get(url, timeout=1)
+            return server, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("uvicorn did not start")
+
+
+def client(url, deadline, latencies, errors):
+    http = requests.Session()
+    i = 0
+    while time.perf_counter() < deadline:
+        method, path, body = REQUESTS[i % len(REQUESTS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = http.request(method, url + path, json=body, timeout=30)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except requests.RequestException as e:
+            errors.append(e)
+        latencies.append(time.perf_counter() - start)
+
+
+def run(url, clients, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client, args=(url, deadline, latencies, errors)) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "rps": len(latencies) / duration,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Target an already running server instead of starting one")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--seasons", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.db")
+        os.environ["BBTRACKER_DATABASE_URL"] = f"sqlite:///{path}"
+        from benchmarks.synthetic_db import build_database
+        server, url = start_server(build_database(path, args.seasons), args.workers)
+
+    try:
+        print(f"{'clients':>8}{'requests':>10}{'req/s':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'errors':>8}")
+        for clients in args.clients:
+            result = run(url, clients, args.duration)
+            print(f"{result['clients']:>8}{result['requests']:>10}{result['rps']:>10.1f}{result['p50']:>10.1f}{result['p95']:>10.1f}{result['errors']:>8}")
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Count the SQL statements the API helpers issue and fail if any goes over its budget,
+so N+1 patterns (one query per game, per player, ...) cannot creep back in.
+
+    python -m benchmarks.query_counts --seasons 3
+
+The budgets do not depend on the number of games or players; that is the point.
+tests/test_query_counts.py checks the same budgets under pytest.
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+
+from sqlalchemy import event
+
+from benchmarks.synthetic_db import PLAYER_NAMES, build_database
+
+# helper name -> (call on the models module and a session, maximum number of statements, including resolving the player)
+QUERY_BUDGETS = {
+    "schedule_with_box_score": (lambda models, session: models.schedule_with_box_score(PLAYER_NAMES[0], session=session), 2),
+    "get_games_played": (lambda models, session: models.get_games_played(PLAYER_NAMES[0], session=session), 2),
+    "get_season_averages": (lambda models, session: models.get_season_averages(PLAYER_NAMES[0], session=session), 2),
+    "get_season_averages_for_players": (lambda models, session: models.get_season_averages_for_players(PLAYER_NAMES, session=session), 2),
+    "get_rolling_averages": (lambda models, session: models.get_rolling_averages(PLAYER_NAMES[0], 5, session=session), 2),
+    "get_team_stats": (lambda models, session: models.get_team_stats(session=session), 1),
+}
+
+
+@contextlib.contextmanager
+def count_queries(engine):
+    """
+    Count the statements executed on engine inside the with block.
+    Yields:
+        list: Filled with the SQL of every statement, so len() is the query count.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seasons", type=int, default=3)
+    parser.add_argument("--verbose", action="store_true", help="Print every statement")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "synthetic.db")
+    os.environ["BBTRACKER_DATABASE_URL"] = f"sqlite:///{path}"
+    build_database(path, args.seasons)
+    from api import sql_alchemy_models as models
+
+    failed = False
+    print(f"{'helper':<34}{'queries':>8}{'budget':>8}")
+    for name, (call, budget) in QUERY_BUDGETS.items():
+        with models.Session() as session, count_queries(models.engine) as statements:
+            call(models, session)
+        failed |= len(statements) > budget
+        print(f"{name:<34}{len(statements):>8}{budget:>8}{'  OVER BUDGET' if len(statements) > budget else ''}")
+        if args.verbose:
+            for statement in statements:
+                print("    " + " ".join(statement.split()))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
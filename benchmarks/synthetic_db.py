@@ -0,0 +1,113 @@
+"""
+Build a synthetic multi-season basketball_stats.db for benchmarks.
+
+    python -m benchmarks.synthetic_db /tmp/synthetic.db --seasons 10
+"""
+import argparse
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PLAYER_NAMES = [
+    "Gregory Spurlock", "Zion Obanla", "Michael Shuler", "Marlon Pratt, Jr.", "Jailen Williams",
+    "Guy Fauntleroy", "David Onyekonwu", "Camden Easley", "Bray Greer", "Trajon Pate",
+    "Cristian Sanon", "HowVante Hutcherson", "Jaylen Green", "Amari Lowe", "Tariq Banks",
+]
+OPPONENTS = ["Millersville", "Mansfield", "Lincoln", "Tampa", "Voorhees", "Lee", "USCA", "Bowie", "Shaw", "Benedict"]
+
+
+def made_attempted(rng, attempts, pct):
+    attempted = rng.randint(0, attempts)
+    made = sum(rng.random() < pct for _ in range(attempted))
+    return made, attempted
+
+
+def box_score_row(rng, game_id, team_name, player_number, player):
+    fgm, fga = made_attempted(rng, 15, 0.45)
+    pt3m, pt3a = made_attempted(rng, 7, 0.35)
+    ftm, fta = made_attempted(rng, 6, 0.7)
+    orb, drb = rng.randint(0, 4), rng.randint(0, 7)
+    pts = 2 * fgm + pt3m + ftm
+    return (
+        game_id, team_name, player_number, player, rng.choice(["*", ""]), str(rng.randint(0, 38)),
+        f"{fgm}-{fga}", f"{pt3m}-{pt3a}", f"{ftm}-{fta}", f"{orb}-{drb}", str(orb + drb),
+        str(rng.randint(0, 5)), str(rng.randint(0, 8)), str(rng.randint(0, 5)), str(rng.randint(0, 3)),
+        str(rng.randint(0, 4)), str(pts),
+        fgm, fga, pt3m, pt3a, ftm, fta, orb, drb,
+    )
+
+
+def build_database(path, seasons=5, games_per_season=30, seed=0):
+    """
+    Create a database with the app's schema and fill it with random seasons.
+    Args:
+        path (str): Path of the SQLite file to create. It should not exist yet.
+        seasons (int): Number of seasons to generate.
+        games_per_season (int): Games per season.
+        seed (int): Random seed so runs are comparable.
+    Returns:
+        str: The SQLAlchemy URL of the new database.
+    """
+    from api.migrations import upgrade
+    from api.sql_alchemy_models import Base, refresh_snapshots
+
+    url = f"sqlite:///{path}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+
+    rng = random.Random(seed)
+    schedule, box_scores = [], []
+    game_id = 0
+    for season in range(seasons):
+        start = date(2010 + season, 11, 1)
+        for game in range(games_per_season):
+            game_id += 1
+            opponent = rng.choice(OPPONENTS)
+            game_date = start + timedelta(days=3 * game)
+            claflin_score, opponent_score = rng.randint(50, 100), rng.randint(50, 100)
+            schedule.append((
+                game_id, f"{opponent} University", game_date.isoformat(), f"{game_date.isoformat()} 19:00:00.000000",
+                rng.random() < 0.5, claflin_score > opponent_score, claflin_score, opponent_score, None,
+                f"/sports/mens-basketball/stats/{2010 + season}/{opponent.lower()}/boxscore/{game_id}",
+            ))
+            for number, player in enumerate(PLAYER_NAMES):
+                box_scores.append(box_score_row(rng, game_id, "Claflin", f"{number:02d}", player))
+            for number in range(len(PLAYER_NAMES)):
+                box_scores.append(box_score_row(rng, game_id, opponent, f"{number:02d}", f"{opponent} Player {number}"))
+
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.executemany('''
+        INSERT INTO schedule (game_id, opponent, date, datetime, home, win, claflin_score, opponent_score, opp_logo, box_score_link)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', schedule)
+    c.executemany('''
+        INSERT INTO player (name, position, jersey_number) VALUES (?, ?, ?)
+    ''', [(player, "G", f"{number:02d}") for number, player in enumerate(PLAYER_NAMES)])
+    c.executemany('''
+        INSERT INTO box_score (
+            game_id, team_name, player_number, player, gs, min, fg, pt3, ft, orb_drb, reb, pf, a, trn, blk, stl, pts,
+            fgm, fga, pt3m, pt3a, ftm, fta, orb, drb
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', box_scores)
+    upgrade(conn)
+    conn.close()
+
+    with sessionmaker(bind=engine)() as session:
+        refresh_snapshots(session=session)
+    engine.dispose()
+    return url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path")
+    parser.add_argument("--seasons", type=int, default=5)
+    parser.add_argument("--games-per-season", type=int, default=30)
+    args = parser.parse_args()
+    os.environ.setdefault("BBTRACKER_DATABASE_URL", f"sqlite:///{args.path}")
+    print(build_database(args.path, args.seasons, args.games_per_season))
@@ -0,0 +1,30 @@
+"""
+The API modules create their engines from BBTRACKER_DATABASE_URL when they are imported, so the
+tests point it at a synthetic database (benchmarks.synthetic_db) before any test module imports
+them. Tests that write get a copy of their own.
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+DATABASE_DIR = tempfile.mkdtemp(prefix="bbtracker-tests-")
+DATABASE_PATH = os.path.join(DATABASE_DIR, "basketball_stats.db")
+os.environ["BBTRACKER_DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+
+from benchmarks.synthetic_db import build_database  # noqa: E402  (after the URL is set)
+
+build_database(DATABASE_PATH, seasons=1)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(DATABASE_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """ A copy of the synthetic database, for tests that write to it """
+    path = tmp_path / "basketball_stats.db"
+    shutil.copyfile(DATABASE_PATH, path)
+    return str(path)
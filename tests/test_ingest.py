@@ -0,0 +1,60 @@
+"""
+ingest_box_scores upserts a game's rows on their key, deletes the rows a corrected box score
+no longer has, and links the rest to the roster.
+"""
+import sqlite3
+
+from api.ingest import box_score_hash, connect, ingest_box_scores
+
+
+def row(number, player, pts):
+    return [number, player, '1', '30', '5-10', '1-3', '2-2', '1-4', '5', '2', '3', '1', '0', '1', pts]
+
+
+def stored_rows(db_path, game_id):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+        SELECT team_name, player_number, player, pts, fgm, fga, player_id IS NOT NULL FROM box_score
+        WHERE game_id = ? ORDER BY team_name, player_number
+    ''', [game_id]).fetchall()
+    conn.close()
+    return rows
+
+
+def test_upsert_and_stale_rows(db_path):
+    conn = connect(db_path)
+    tables = [('Claflin', [row('0', 'Gregory Spurlock', '14'), row('1', 'Zion Obanla', '8')]), ('USCA', [row('0', 'Opponent One', '20')])]
+    stats = ingest_box_scores(conn, [(1, tables)])
+    # Game 1 already had the synthetic database's 30 rows, of which the three kept are updated
+    assert stats == {"games": 1, "rows": 3, "removed": 27, "replaced": [1]}
+    assert stored_rows(db_path, 1) == [
+        ('Claflin', 0, 'Gregory Spurlock', 14, 5, 10, 1),
+        ('Claflin', 1, 'Zion Obanla', 8, 5, 10, 1),
+        ('USCA', 0, 'Opponent One', 20, 5, 10, 0),
+    ]
+
+    # A corrected box score: one player's points change and another is taken off it
+    corrected = [('Claflin', [row('0', 'Gregory Spurlock', '16')]), ('USCA', [row('0', 'Opponent One', '20')])]
+    stats = ingest_box_scores(conn, [(1, corrected)])
+    assert stats == {"games": 1, "rows": 2, "removed": 1, "replaced": [1]}
+    assert stored_rows(db_path, 1) == [
+        ('Claflin', 0, 'Gregory Spurlock', 16, 5, 10, 1),
+        ('USCA', 0, 'Opponent One', 20, 5, 10, 0),
+    ]
+    assert conn.execute('SELECT box_score_hash FROM schedule WHERE game_id = 1').fetchone() == (box_score_hash(corrected),)
+    conn.close()
+
+
+def test_failed_batch_writes_nothing(db_path):
+    conn = connect(db_path)
+    before = stored_rows(db_path, 2)
+    # The second game's row is one column short, so the whole batch is rolled back
+    games = [(2, [('Claflin', [row('0', 'Gregory Spurlock', '30')])]), (3, [('Claflin', [row('0', 'Gregory Spurlock', '30')[:-1]])])]
+    try:
+        ingest_box_scores(conn, games)
+    except sqlite3.Error:
+        pass
+    else:
+        raise AssertionError("the short row was written")
+    assert stored_rows(db_path, 2) == before
+    conn.close()
@@ -0,0 +1,71 @@
+"""
+With a PageCache, the Fetcher revalidates a page with its ETag instead of downloading it again,
+serves a fresh enough page without asking the site, and ReplayFetcher serves cached pages alone.
+Pages come from benchmarks.fixture_server, which answers If-None-Match with a 304.
+"""
+import asyncio
+
+import pytest
+
+from api.fetch import Fetcher
+from api.page_cache import PageCache, ReplayFetcher
+from api.scrape_roster import roster_ready
+from api.sql_alchemy_models import DATABASE_PATH
+from benchmarks.fixture_server import ROSTER_PATH, serve
+
+
+@pytest.fixture
+def site():
+    server = serve(DATABASE_PATH)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def fetch_twice(cache, url):
+    async def run():
+        async with Fetcher('http', cache=cache) as fetcher:
+            first = await fetcher.fetch(url, ready=roster_ready)
+            first_via = fetcher.served_by[url]
+            second = await fetcher.fetch(url, ready=roster_ready)
+            return first, first_via, second, fetcher.served_by[url]
+    return asyncio.run(run())
+
+
+def test_revalidation(site, tmp_path):
+    url = site + ROSTER_PATH
+    first, first_via, second, second_via = fetch_twice(PageCache(str(tmp_path)), url)
+    assert (first_via, second_via) == ('http', 'cache')
+    assert second == first
+
+    # The 304 was recorded with the site's ETag, and the page stored once
+    cache = PageCache(str(tmp_path))
+    entry = cache.latest(url)
+    assert entry['etag'] and cache.read(entry) == first
+    assert len(list((tmp_path / 'objects').rglob('*.html.gz'))) == 1
+    cache.close()
+
+
+def test_fresh_page_is_not_revalidated(site, tmp_path):
+    url = site + ROSTER_PATH
+    fetch_twice(PageCache(str(tmp_path)), url)
+    # Within max_age the cached page is used even when the site is gone
+    unreachable = url.replace(site, "http://127.0.0.1:9")
+    cache = PageCache(str(tmp_path), max_age=3600)
+    cache.store(unreachable, cache.read(cache.latest(url)))
+    _, first_via, _, second_via = fetch_twice(cache, unreachable)
+    assert (first_via, second_via) == ('cache', 'cache')
+
+
+def test_replay(site, tmp_path):
+    url = site + ROSTER_PATH
+    first, *_ = fetch_twice(PageCache(str(tmp_path)), url)
+
+    async def replay(page_url, as_of=None):
+        async with ReplayFetcher(PageCache(str(tmp_path)), as_of) as fetcher:
+            return await fetcher.fetch(page_url)
+
+    assert asyncio.run(replay(url)) == first
+    with pytest.raises(ValueError):
+        asyncio.run(replay(url, as_of="2000-01-01"))
+    with pytest.raises(ValueError):
+        asyncio.run(replay(site + "/not-cached"))
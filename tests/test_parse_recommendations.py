@@ -0,0 +1,44 @@
+"""
+parse_recommendations turns whatever the model answered into the endpoint's payload without raising,
+so a malformed answer is shown rather than failing the request or being asked for again.
+"""
+import json
+
+import pytest
+
+from api.sql_alchemy_models import parse_recommendations
+
+DRILLS = [
+    {"id": 1, "name": "Spot Shooting", "sets_reps": "5 x 10"},
+    {"id": 2, "name": "Mikan Drill", "sets_reps": "3 x 20"},
+]
+
+
+def test_structured_answer():
+    answer = {"summary": "Solid.", "drills": [{"drill_id": 2, "reps": "3 x 20", "duration": "10 minutes", "rationale": "Finishing."}]}
+    result = parse_recommendations(answer, DRILLS)
+    assert result["recommended_drills"] == ["Mikan Drill"]
+    assert result["drills"] == [{"id": 2, "name": "Mikan Drill", "reps": "3 x 20", "duration": "10 minutes", "rationale": "Finishing."}]
+    assert result["recommendations"].startswith("Solid.")
+    assert parse_recommendations(json.dumps(answer), DRILLS) == result
+
+
+def test_unknown_drills_are_dropped():
+    answer = {"summary": "Solid.", "drills": [{"drill_id": 99}, "not a drill", {"name": "spot shooting"}]}
+    assert parse_recommendations(answer, DRILLS)["recommended_drills"] == ["Spot Shooting"]
+
+
+def test_free_text_without_drills():
+    # The old line-by-line parser raised UnboundLocalError (cleaned_drill_names) when no line named a drill
+    text = "Training Recommendations:\n1. Run more.\n2. Rest."
+    assert parse_recommendations(text, DRILLS) == {"recommendations": text, "recommended_drills": [], "drills": []}
+
+
+def test_free_text_with_bold_drill_names():
+    result = parse_recommendations("Do **Spot Shooting** and **Unknown Drill**.", DRILLS)
+    assert result["recommended_drills"] == ["Spot Shooting"]
+
+
+@pytest.mark.parametrize("answer, text", [(None, ""), ([1, 2], "[1, 2]"), (42, "42")])
+def test_no_structured_answer(answer, text):
+    assert parse_recommendations(answer, DRILLS) == {"recommendations": text, "recommended_drills": [], "drills": []}
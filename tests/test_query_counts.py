@@ -0,0 +1,37 @@
+"""
+The API helpers stay within their statement budgets (benchmarks.query_counts) on a synthetic
+multi-season database, so an N+1 query pattern fails the tests instead of slowing the API down.
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from api import sql_alchemy_models as models
+from benchmarks.query_counts import QUERY_BUDGETS, count_queries
+from benchmarks.synthetic_db import build_database
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    path = tmp_path_factory.mktemp("query_counts") / "synthetic.db"
+    engine = create_engine(build_database(str(path), seasons=3))
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("helper", list(QUERY_BUDGETS))
+def test_query_budget(engine, helper):
+    call, budget = QUERY_BUDGETS[helper]
+    with sessionmaker(bind=engine)() as session, count_queries(engine) as statements:
+        result = call(models, session)
+    assert result
+    assert len(statements) <= budget, "\n".join(statements)
+
+
+def test_schedule_with_box_score_is_one_join(engine):
+    with sessionmaker(bind=engine)() as session, count_queries(engine) as statements:
+        schedule = models.schedule_with_box_score("Gregory Spurlock", session=session)
+    # Resolving the player, then schedule and box scores together
+    assert len(statements) <= 2
+    assert len(schedule) == 90
+    assert all(len(game["BoxScore"]) == 1 for game in schedule)
@@ -0,0 +1,132 @@
+"""
+Concurrent requests for the same recommendation inputs share one model call (Generation), streaming
+followers see the summary as it grows, and the pre-generation job retries failed calls with backoff.
+The model is api.pregenerate_recommendations' fake one, or a stand-in chain streaming partial answers.
+"""
+import asyncio
+import json
+
+import pytest
+
+from api import async_db
+from api.async_db import Generation, RecommendationError, get_ai_recommendations_async, stream_ai_recommendations
+from api.pregenerate_recommendations import fake_recommendation_chain, with_retries
+from api.sql_alchemy_models import get_cached_recommendations, get_recommendation_inputs, recommendation_fingerprint
+from benchmarks.synthetic_db import PLAYER_NAMES
+
+
+class PartialAnswers:
+    """ Streams the answers given, as recommendation_chain streams the answer parsed so far """
+
+    def __init__(self, *answers, error=None):
+        self.answers = answers
+        self.error = error
+
+    async def astream(self, inputs):
+        for answer in self.answers:
+            await asyncio.sleep(0.01)
+            yield answer
+        if self.error:
+            raise self.error
+
+
+@pytest.fixture
+def model_calls(monkeypatch):
+    calls = []
+
+    def chain():
+        calls.append(1)
+        return fake_recommendation_chain(latency=0.05)
+
+    monkeypatch.setattr(async_db, "recommendation_chain", chain)
+    return calls
+
+
+def test_concurrent_requests_share_one_call(model_calls):
+    player = PLAYER_NAMES[1]
+
+    async def stream():
+        events = [event async for event in stream_ai_recommendations(player)]
+        return json.loads(events[-1].split("data: ", 1)[1])
+
+    async def run():
+        return await asyncio.gather(get_ai_recommendations_async(player), get_ai_recommendations_async(player), stream())
+
+    first, second, streamed = asyncio.run(run())
+    assert len(model_calls) == 1
+    assert first == second == streamed
+    assert first["recommendations"].startswith(f"Performance summary for {player}.")
+    # Stored under the inputs' fingerprint, so the next request does not call the model
+    assert asyncio.run(get_ai_recommendations_async(player)) == first
+    assert len(model_calls) == 1
+    assert asyncio.run(get_ai_recommendations_async("Nobody Here")) is None
+
+
+def test_followers_get_the_summary_as_it_grows():
+    inputs = get_recommendation_inputs(PLAYER_NAMES[2])
+    chain = PartialAnswers({"summary": "Sol"}, {"summary": "Solid"}, {"summary": "Solid.", "drills": []})
+
+    async def run():
+        generation = Generation(inputs, recommendation_fingerprint(inputs), chain)
+
+        async def follow():
+            return [chunk async for chunk in generation.follow()]
+        return await asyncio.gather(follow(), follow(), generation.task)
+
+    first, second, result = asyncio.run(run())
+    assert first == second == ["Sol", "id", "."]
+    assert result["recommendations"].startswith("Solid.")
+
+
+def test_failed_call_is_not_stored():
+    inputs = get_recommendation_inputs(PLAYER_NAMES[3])
+    fingerprint = recommendation_fingerprint(inputs)
+    chain = PartialAnswers({"summary": "Half"}, error=RuntimeError("connection reset"))
+
+    async def run():
+        generation = Generation(inputs, fingerprint, chain)
+        chunks = [chunk async for chunk in generation.follow()]
+        with pytest.raises(RecommendationError):
+            await generation.task
+        return chunks
+
+    assert asyncio.run(run()) == ["Half"]
+    assert get_cached_recommendations(fingerprint) is None
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    monkeypatch.setattr("random.random", lambda: 0.0)
+    return delays
+
+
+def flaky(failures):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise RuntimeError(f"failure {len(calls)}")
+        return "answer"
+    return call, calls
+
+
+def test_with_retries_backs_off(sleeps):
+    call, calls = flaky(2)
+    assert asyncio.run(with_retries(call, attempts=4, backoff=1.0)) == "answer"
+    assert len(calls) == 3
+    assert sleeps == [1.0, 2.0]
+
+
+def test_with_retries_gives_up(sleeps):
+    call, calls = flaky(10)
+    with pytest.raises(RuntimeError, match="failure 3"):
+        asyncio.run(with_retries(call, attempts=3, backoff=0.5))
+    assert len(calls) == 3
+    assert sleeps == [0.5, 1.0]
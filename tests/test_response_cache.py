@@ -0,0 +1,75 @@
+"""
+ResponseCache serves a read endpoint's body from the cache until the data version is bumped,
+and answers 304 when the client's If-None-Match already has the body.
+"""
+import asyncio
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+from api.async_db import AsyncSessionLocal
+from api.cache import ResponseCache, etag_matches
+from api.main import app
+from api.migrations import BUMP_DATA_VERSION
+from api.sql_alchemy_models import DATABASE_PATH
+
+
+class FakeRequest:
+    def __init__(self, if_none_match=None):
+        self.headers = {"if-none-match": if_none_match} if if_none_match else {}
+
+
+def bump_data_version():
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.execute(BUMP_DATA_VERSION)
+    conn.commit()
+    conn.close()
+
+
+def test_hit_miss_304_and_invalidation():
+    cache = ResponseCache(version_check_interval=0)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return {"payload": len(loads)}
+
+    async def respond(if_none_match=None):
+        async with AsyncSessionLocal() as session:
+            return await cache.respond(FakeRequest(if_none_match), session, ("players",), load)
+
+    first = asyncio.run(respond())
+    assert first.status_code == 200 and first.body == b'{"payload": 1}'
+    etag = first.headers["ETag"]
+
+    # Same version: served from the cache, and a client that has the body gets an empty 304
+    assert asyncio.run(respond()).body == first.body
+    not_modified = asyncio.run(respond(etag))
+    assert not_modified.status_code == 304 and not not_modified.body
+    assert len(loads) == 1
+
+    # An ingest bumps the version: the next request loads again, and the old ETag no longer matches
+    bump_data_version()
+    second = asyncio.run(respond(etag))
+    assert second.status_code == 200 and second.body == b'{"payload": 2}'
+    assert second.headers["ETag"] != etag
+    assert len(loads) == 2
+
+
+def test_etag_matches():
+    etag = 'W/"abc"'
+    assert etag_matches(etag, 'W/"abc"')
+    assert etag_matches(etag, '"abc"')
+    assert etag_matches(etag, 'W/"xyz", W/"abc"')
+    assert etag_matches(etag, '*')
+    assert not etag_matches(etag, '')
+    assert not etag_matches(etag, 'W/"ab"')
+    assert not etag_matches(etag, 'W/"abcd"')
+
+
+def test_endpoint_revalidation():
+    with TestClient(app) as client:
+        response = client.get("/players")
+        assert response.status_code == 200
+        assert client.get("/players", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+        assert client.get("/players", headers={"If-None-Match": 'W/"stale"'}).status_code == 200
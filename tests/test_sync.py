@@ -0,0 +1,94 @@
+"""
+The staged pipeline behind bbtracker-sync: per-stage metrics, failures and follow-up jobs, a dry run
+over saved pages (benchmarks.fixture_server) that leaves the database alone, and box scores that
+parse to what is already stored not being ingested again.
+"""
+import asyncio
+import hashlib
+
+import pytest
+
+from api.fetch import FixtureFetcher
+from api.ingest import connect
+from api.pipeline import Pipeline, Stage
+from api.sync import sync, sync_pipeline
+from benchmarks.fixture_server import save_pages
+
+
+def test_stage_metrics():
+    loaded = []
+
+    async def fetch(job):
+        await asyncio.sleep(0)
+        if job["n"] == 3:
+            raise ValueError("not found")
+        return job
+
+    def parse(job):
+        if job["n"] == 1:
+            job["status"] = "unchanged"
+            return None
+        if job["n"] == 0:
+            pipeline.submit({"n": 10})
+        return job
+
+    def load(jobs):
+        loaded.extend(job["n"] for job in jobs)
+        return jobs
+
+    pipeline = Pipeline([Stage('fetch', fetch, workers=2), Stage('parse', parse, thread=True), Stage('load', load, batch=10)])
+    jobs = asyncio.run(pipeline.run([{"n": n} for n in range(5)]))
+
+    assert sorted(loaded) == [0, 2, 4, 10]
+    assert {job["n"]: job["status"] for job in jobs} == {0: "ok", 1: "unchanged", 2: "ok", 3: "failed", 4: "ok", 10: "ok"}
+    assert next(job for job in jobs if job["n"] == 3)["error"] == "fetch: not found"
+    metrics = {stage.name: stage.metrics.as_dict() for stage in pipeline.stages}
+    assert [(metrics[name]["jobs"], metrics[name]["failed"]) for name in ('fetch', 'parse', 'load')] == [(6, 1), (5, 0), (4, 0)]
+    assert metrics['fetch']["workers"] == 2
+    assert all(metrics[name]["jobs_per_second"] > 0 for name in metrics)
+
+
+@pytest.fixture
+def fixtures(db_path, tmp_path):
+    directory = tmp_path / "fixtures"
+    save_pages(db_path, str(directory))
+    return str(directory)
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def test_dry_run(db_path, fixtures):
+    before = file_digest(db_path)
+    result = asyncio.run(sync(db_path=db_path, fixtures=fixtures, dry_run=True, pregenerate=False, verbose=False, pages=('schedule', 'roster', 'box_score')))
+    jobs = result["jobs"]
+    assert all(job["status"] == "ok" for job in jobs), [job["error"] for job in jobs if job["error"]]
+    assert sum(job["kind"] == 'box_score' for job in jobs) == 30
+    assert next(job for job in jobs if job["kind"] == 'roster')["diff"]["unchanged"] == 15
+    assert {metrics["stage"]: metrics["jobs"] for metrics in result["metrics"]} == {"fetch": 32, "parse": 32, "validate": 32, "load": 32}
+    # Everything was loaded into a copy
+    assert file_digest(db_path) == before
+
+
+def test_unchanged_box_scores_are_skipped(db_path, fixtures):
+    def run():
+        conn = connect(db_path)
+
+        async def go():
+            async with FixtureFetcher(fixtures) as fetcher:
+                pipeline = sync_pipeline(fetcher, conn, db_path=db_path, pages=('schedule', 'box_score'), every_game=True)
+                jobs = await pipeline.run([{"kind": 'schedule', "url": "https://athletics.claflin.edu/sports/mens-basketball/schedule/2024-25"}])
+                return pipeline, jobs
+        try:
+            return asyncio.run(go())
+        finally:
+            conn.close()
+
+    pipeline, jobs = run()
+    assert len(pipeline.ingested) == 30
+    # Same pages again: every box score hashes to what was stored, so none is parsed into the database
+    pipeline, jobs = run()
+    assert not pipeline.ingested
+    assert [job["status"] for job in jobs if job["kind"] == 'box_score'] == ["unchanged"] * 30
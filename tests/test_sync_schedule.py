@@ -0,0 +1,69 @@
+"""
+sync_schedule merges a scraped schedule by game key: new games are inserted, changed ones updated
+in place, unchanged ones not written, and stale ones without box scores deleted. The data version
+only moves when something changed.
+"""
+import sqlite3
+from datetime import date, datetime
+
+from api.scrape_schedule import SCHEDULE_FIELDS, sync_schedule
+
+
+def scraped_schedule(db_path):
+    """ The stored schedule as parse_schedule would return it """
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(f'SELECT {", ".join(SCHEDULE_FIELDS)} FROM schedule ORDER BY game_id').fetchall()
+    conn.close()
+    games = [dict(zip(SCHEDULE_FIELDS, row)) for row in rows]
+    for game in games:
+        game.update(date=date.fromisoformat(game['date']), datetime=datetime.fromisoformat(game['datetime']), home=bool(game['home']), win=bool(game['win']))
+    return games
+
+
+def data_version(db_path):
+    conn = sqlite3.connect(db_path)
+    version, = conn.execute('SELECT version FROM data_version').fetchone()
+    conn.close()
+    return version
+
+
+def test_insert_update_delete(db_path):
+    games = scraped_schedule(db_path)
+    # The synthetic rows' datetimes are stored with microseconds, so the first sync rewrites them
+    assert len(sync_schedule(games, db_path)["changed"]) == len(games)
+
+    version = data_version(db_path)
+    assert sync_schedule(games, db_path) == {"new": [], "changed": [], "removed": [], "unchanged": len(games)}
+    assert data_version(db_path) == version
+
+    # A result comes in, and a game is added
+    games[0]['claflin_score'] += 1
+    added = dict(games[-1], date=date(2011, 3, 1), datetime=datetime(2011, 3, 1, 19), opponent="Voorhees University", box_score_link=None)
+    diff = sync_schedule(games + [added], db_path)
+    assert diff["changed"] == [1] and len(diff["new"]) == 1 and not diff["removed"]
+    assert diff["unchanged"] == len(games) - 1
+    assert data_version(db_path) > version
+
+    # Off the page again: the new game goes, but game 2 stays because box scores refer to it
+    diff = sync_schedule([game for game in games if game is not games[1]], db_path)
+    assert diff["removed"] == [len(games) + 1]
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT count(*) FROM schedule WHERE game_id = 2').fetchone() == (1,)
+    conn.close()
+
+
+def test_played_game_matched_by_link(db_path):
+    games = scraped_schedule(db_path)
+    sync_schedule(games, db_path)
+    # The date of a played game is corrected: it keeps its game_id, which its box scores refer to
+    games[0]['date'] = date(2010, 11, 2)
+    diff = sync_schedule(games, db_path)
+    assert diff["changed"] == [1] and not diff["new"] and not diff["removed"]
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT game_key FROM schedule WHERE game_id = 1').fetchone() == (f"2010-11-02 {games[0]['opponent']}",)
+    conn.close()
+
+
+def test_empty_schedule_removes_nothing(db_path):
+    diff = sync_schedule([], db_path)
+    assert diff == {"new": [], "changed": [], "removed": [], "unchanged": 0}